@@ -3,15 +3,21 @@ Flask API Server for Listant Backend
 Integrates engagement monitoring, audio transcription, MCQ generation, and AI-powered analysis
 """
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
+import hashlib
 import json
+import math
 import os
+import re
 import uuid
 from pathlib import Path
 from datetime import datetime
 import tempfile
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
 
 # Import backend modules
 # EngagementMonitor and AudioRecorder are in engagement_monitor.py
@@ -30,16 +36,96 @@ except ImportError:
         EngagementMonitor = None
         AudioRecorder = None
 
-from audiotranscription import get_large_audio_transcription_fixed_interval, create_summary
+from audiotranscription import audio_to_json as transcribe_audio_file, create_summary
 from pose_question import pose_questions, parse_transcript
 from convert_to_mcq_data import convert_questions_to_mcq
-from modules.utils import init_anthropic_client, send_message, extract_json_from_claude_response
+from modules.utils import (
+    init_anthropic_client,
+    send_message,
+    send_message_json,
+    extract_json_from_claude_response,
+    format_lecture_context,
+    LECTURE_CONTEXT_SYSTEM
+)
+from modules.timeline import SessionAlignment, timestamps_to_epoch
+from modules.engagement_store import EngagementArchive, read_engagement
+from modules.downsample import DOWNSAMPLE_METHODS, downsample_columns
+from modules.resilience import llm_caller
+from modules.jobs import Job, JobManager, as_completed as jobs_as_completed, job_manager
+from modules.session_store import open_session_store
+from modules.live_stream import LiveScoreHub
+from modules import payloads
+from modules.payloads import (
+    COMPRESS_MIN_BYTES,
+    CompressedBodyCache,
+    FastJSONProvider,
+    compress,
+    negotiate_encoding,
+)
+from modules.session_lifecycle import reaper_from_env, release_live_objects
+from modules.inference import decode_face, inference_from_env
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)  # orjson (when installed) for every jsonify
 CORS(app)  # Enable CORS for frontend
 
-# In-memory session storage (in production, use Redis or database)
-sessions = {}
+# Live score channels, fed by each session's EngagementMonitor
+live_hub = LiveScoreHub(
+    backlog=int(os.getenv('LIVE_STREAM_BACKLOG', '256')),
+    coalesce_after=int(os.getenv('LIVE_STREAM_COALESCE_AFTER', '32')),
+)
+# Seconds between SSE keep-alive comments (also how often a stream notices it should end)
+LIVE_STREAM_HEARTBEAT = float(os.getenv('LIVE_STREAM_HEARTBEAT', '15'))
+
+# Compressed bytes of ETagged bodies (immutable per session data version)
+compressed_bodies = CompressedBodyCache(int(os.getenv('COMPRESSED_CACHE_ENTRIES', '256')))
+
+# Emotion inference for frames posted by clients, batched across all sessions
+frame_inference = inference_from_env().start()
+# Seconds a frame request waits for its batch before answering 202
+FRAME_RESULT_WAIT = float(os.getenv('FRAME_RESULT_WAIT', '2'))
+# Larger frame uploads are refused with 413
+FRAME_MAX_BYTES = int(os.getenv('FRAME_MAX_BYTES', str(2 * 1024 * 1024)))
+
+
+@app.after_request
+def compress_response(response):
+    """
+    gzip/brotli-encode JSON responses above COMPRESS_MIN_BYTES, per Accept-Encoding.
+    
+    Bodies with a strong ETag (cached session views) are compressed once and
+    served from compressed_bodies afterwards; their ETag becomes weak, as the
+    encoded bytes differ from the identity representation.
+    """
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype != 'application/json'):
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        data = compressed_bodies.get_or_compress(etag, encoding, body)
+        response.set_etag(etag, weak=True)
+    else:
+        data = compress(body, encoding)
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+# Session storage: SQLite (WAL) shared by all worker processes, with an
+# in-process hot cache; monitors/recorders stay in the process that owns them
+sessions = open_session_store()
+# Expire idle/old sessions, spill idle ones out of memory, release abandoned recorders
+session_reaper = reaper_from_env(
+    sessions,
+    is_busy=lambda session_id: bool(job_manager.active(sessionId=session_id) or llm_jobs.active(sessionId=session_id)),
+    on_release=live_hub.close,
+).start()
 
 # Ensure directories exist
 os.makedirs('data/sessions', exist_ok=True)
@@ -48,57 +134,374 @@ os.makedirs('data/transcripts', exist_ok=True)
 os.makedirs('output', exist_ok=True)
 
 
-def audio_to_json(audio_path):
+def invalidate_session_artifacts(session):
+    """
+    Mark a session's data as changed.
+    
+    Bumps the session's data version and drops everything derived from the
+    old data (LLM context, alignment, cached responses); each is rebuilt
+    from the new data on first use.
+    """
+    session.update({
+        'data_version': session.get('data_version', 0) + 1,
+        'llm_context': None,
+        'alignment': None,
+        'response_cache': {},
+    })
+
+
+def cached_response_body(session, key, build):
+    """
+    Return the serialised JSON body for a derived view of a session, building it once.
+    
+    The body and its ETag are cached per session data version, so repeated
+    requests (e.g. dashboard polls) neither recompute nor re-serialise it.
+    
+    Args:
+        session: Session dict
+        key: Cache key naming the view (include any query parameters)
+        build: Zero-argument callable returning the JSON-serialisable view
+        
+    Returns:
+        Tuple of (body bytes, etag string)
+    """
+    version = session.get('data_version', 0)
+    cache = session.setdefault('response_cache', {})
+    entry = cache.get(key)
+    if entry is None or entry[0] != version:
+        body = payloads.dumps(build())
+        entry = (version, body, hashlib.sha1(body).hexdigest())
+        cache[key] = entry
+    return entry[1], entry[2]
+
+
+def cached_view(session, key, build):
+    """
+    Return a derived view of a session's data, building it once per data version.
+    
+    Like cached_response_body, but caches the Python object, for views that are
+    embedded in a larger response.
+    """
+    version = session.get('data_version', 0)
+    cache = session.setdefault('response_cache', {})
+    entry = cache.get(('view', key))
+    if entry is None or entry[0] != version:
+        entry = (version, build())
+        cache[('view', key)] = entry
+    return entry[1]
+
+
+def parse_timeline_query(args, available_fields):
+    """
+    Read the downsampling parameters of a timeline request.
+    
+    Args:
+        args: request.args
+        available_fields: Score fields the endpoint can return
+        
+    Returns:
+        Tuple of (points or None, method, fields)
+        
+    Raises:
+        ValueError: If a parameter is invalid
+    """
+    points = args.get('points')
+    if points is not None:
+        try:
+            points = int(points)
+        except ValueError:
+            raise ValueError("'points' must be an integer")
+        if points < 3:
+            raise ValueError("'points' must be at least 3")
+    method = args.get('method', 'lttb')
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"'method' must be one of: {', '.join(DOWNSAMPLE_METHODS)}")
+    fields = list(available_fields)
+    if args.get('fields'):
+        fields = [f.strip() for f in args['fields'].split(',') if f.strip()]
+        unknown = [f for f in fields if f not in available_fields]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}; available: {', '.join(available_fields)}")
+    return points, method, fields
+
+
+# Query parameters that select part of a timeline instead of returning all of it
+TIMELINE_QUERY_ARGS = ('points', 'method', 'fields', 'from', 'to', 'cursor', 'limit')
+DEFAULT_PAGE_SIZE = 1000
+
+
+def parse_time_bound(value, epochs):
+    """
+    Convert a from/to bound to epoch seconds.
+    
+    Numbers are seconds elapsed since the first sample; anything else is
+    parsed as an ISO timestamp (naive times read as UTC, like the samples).
+    """
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = None
+    if seconds is not None:
+        if not math.isfinite(seconds):
+            raise ValueError(f"Invalid time bound {value!r}; elapsed seconds must be finite")
+        return (epochs[0] if len(epochs) else 0.0) + seconds
+    try:
+        return timestamps_to_epoch([value])[0]
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid time bound {value!r}; use elapsed seconds or an ISO timestamp")
+
+
+def resolve_timeline_window(session, alignment, args):
+    """
+    Resolve from/to/cursor/limit query parameters to a range of sample rows.
+    
+    from/to are found by binary search over the sample times. A cursor
+    continues a previous page; it embeds the session data version, so a
+    cursor from before the data changed is rejected instead of silently
+    pointing at different samples.
+    
+    Args:
+        session: Session dict
+        alignment: The session's SessionAlignment
+        args: request.args
+        
+    Returns:
+        Tuple of (start_row, stop_row, next_cursor or None)
+        
+    Raises:
+        ValueError: If a parameter is invalid or the cursor is stale
+    """
+    epochs = alignment.epochs
+    start, stop = 0, len(epochs)
+    if args.get('from'):
+        start = int(np.searchsorted(epochs, parse_time_bound(args['from'], epochs), side='left'))
+    if args.get('to'):
+        stop = int(np.searchsorted(epochs, parse_time_bound(args['to'], epochs), side='right'))
+    
+    version = session.get('data_version', 0)
+    if args.get('cursor'):
+        try:
+            cursor_version, cursor_row = (int(part) for part in args['cursor'].split('.'))
+        except ValueError:
+            raise ValueError("Invalid cursor")
+        if cursor_version != version:
+            raise ValueError("Cursor is stale: the session data has changed since it was issued")
+        start = max(start, cursor_row)
+    
+    limit = args.get('limit')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError("'limit' must be an integer")
+        if limit < 1:
+            raise ValueError("'limit' must be at least 1")
+    elif args.get('cursor'):
+        limit = DEFAULT_PAGE_SIZE
+    
+    end = min(stop, start + limit) if limit else stop
+    end = max(end, start)
+    next_cursor = f"{version}.{end}" if end < stop else None
+    return start, end, next_cursor
+
+
+def columns_to_records(columns):
+    """Turn a dict of equal-length columns into a list of row dicts."""
+    names = list(columns)
+    values = [np.asarray(column).tolist() for column in columns.values()]
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+
+def conditional_json_response(body, etag):
+    """
+    Build a JSON response carrying an ETag.
+    
+    Clients must revalidate (Cache-Control: no-cache); a request whose
+    If-None-Match matches gets 304 Not Modified with no body.
+    """
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def get_lecture_context(session):
+    """
+    Return the shared LLM context prefix for a session, building it once.
+    
+    Summary, MCQ, report and plan requests all send this exact text as a
+    cached system block, so after the first request the provider serves the
+    transcript and engagement prefix from its prompt cache.
+    """
+    context = session.get('llm_context')
+    if context is None:
+        alignment = get_alignment(session)
+        context = format_lecture_context(
+            session.get('transcript_data') or [],
+            session.get('engagement_data'),
+            lecture_name=session.get('lecture_name'),
+            segment_engagement=alignment.segment_summary() if alignment else None
+        )
+        session['llm_context'] = context
+    return context
+
+
+def get_engagement_timeline(session):
+    """
+    Return a session's engagement samples for analysis, and their count.
+    
+    Sessions recorded in the columnar format hand out the memory-mapped
+    columns of their archive (accepted by engagement_frame and pose_questions);
+    otherwise the JSON timeline records are returned.
+    """
+    archive = session.get('engagement_archive')
+    engagement_file = session.get('engagement_file')
+    if archive is None and engagement_file and Path(engagement_file).suffix == '.npy' and Path(engagement_file).exists():
+        # Archives are per-process handles; reopen it in processes that didn't record the session
+        archive = EngagementArchive(engagement_file)
+        session['engagement_archive'] = archive
+    if archive is not None:
+        return archive.columns(), len(archive)
+    timeline = (session.get('engagement_data') or {}).get('engagement_timeline', [])
+    return timeline, len(timeline)
+
+
+def get_alignment(session):
+    """
+    Return the session's engagement-to-transcript alignment, building it once.
+    
+    stop_engagement builds it as soon as both timelines exist; sessions filled
+    in any other way get it on first use. None if there is no engagement data.
+    """
+    alignment = session.get('alignment')
+    if alignment is None and session.get('engagement_data'):
+        timeline, _ = get_engagement_timeline(session)
+        alignment = SessionAlignment(timeline, session.get('transcript_data') or [])
+        session['alignment'] = alignment
+    return alignment
+
+
+def parse_segment_summary(summary):
+    """Parse a chunk summary returned by create_summary into a dict."""
+    if isinstance(summary, str):
+        try:
+            summary = json.loads(summary)
+        except:
+            summary = {"5_word_summary": summary[:50], "20_word_summary": summary}
+    return summary or {}
+
+
+def transcribe_segments(audio_path, real_start_time=None, summarize=True, progress=None):
+    """
+    Transcribe an audio file into transcript segments (1-minute chunks).
+    
+    Args:
+        audio_path: Path to the audio file
+        real_start_time: Recording start as a UNIX timestamp (default: now)
+        summarize: Summarise each chunk while transcribing; when False every
+                   segment's 'summary' is None (see summarise_segments)
+        progress: Optional callback progress(done_chunks, total_chunks)
+    
+    Returns:
+        List of {start_time, end_time, text, summary} segments ([] if the
+        file is missing or its format is unsupported)
+    """
+    # Check if file exists and is a supported format
+    audio_file = Path(audio_path)
+    if not audio_file.exists():
+        print(f"Audio file not found: {audio_path}")
+        return []
+    
+    # Check file extension
+    if audio_file.suffix.lower() not in ['.wav', '.webm', '.mp3', '.m4a']:
+        print(f"Unsupported audio format: {audio_file.suffix}")
+        return []
+    
+    # Transcribe audio in 1-minute chunks
+    # Note: speech recognition expects WAV, may need conversion
+    results_json = transcribe_audio_file(audio_path, minutes=1, real_start_time=real_start_time,
+                                         summarize=summarize, progress=progress)
+    
+    # Parse JSON string to list
+    if isinstance(results_json, str):
+        results = json.loads(results_json)
+    else:
+        results = results_json
+    
+    # Format to match expected structure
+    formatted_results = []
+    for item in results:
+        summary = item.get('summary')
+        start_time = item.get('start_time', 0)
+        end_time = item.get('end_time', 0)
+        if isinstance(start_time, (int, float)):
+            start_time = datetime.fromtimestamp(start_time).isoformat() + 'Z'
+        if isinstance(end_time, (int, float)):
+            end_time = datetime.fromtimestamp(end_time).isoformat() + 'Z'
+        formatted_results.append({
+            'start_time': start_time,
+            'end_time': end_time,
+            'text': item.get('text', ''),
+            'summary': parse_segment_summary(summary) if summary is not None else None
+        })
+    return formatted_results
+
+
+def summarise_segments(segments, progress=None):
+    """
+    Fill in the summary of every transcript segment that has none.
+    
+    Segments are summarised concurrently (SUMMARY_WORKERS, default 4); each
+    call goes through the shared LLM resilience layer like any other.
+    
+    Args:
+        segments: Transcript segments from transcribe_segments (updated in place)
+        progress: Optional callback progress(done_segments, total_segments)
+    
+    Returns:
+        The segments
+    """
+    pending = [segment for segment in segments if segment.get('summary') is None]
+    if not pending:
+        return segments
+    workers = max(1, min(int(os.getenv('SUMMARY_WORKERS', '4')), len(pending)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='summary') as executor:
+        futures = {executor.submit(create_summary, segment['text']): segment for segment in pending}
+        for done, future in enumerate(as_completed(futures), start=1):
+            futures[future]['summary'] = parse_segment_summary(future.result())
+            if progress:
+                progress(done, len(pending))
+    return segments
+
+
+def save_transcript(segments, audio_path):
+    """
+    Save transcript segments next to the other transcripts for easy access.
+    
+    Returns:
+        Path of the transcript file
+    """
+    transcript_file = Path('data/transcripts') / f"transcript_{Path(audio_path).stem}.json"
+    with open(transcript_file, 'w') as f:
+        json.dump(segments, f, indent=2)
+    print(f"Transcript saved to: {transcript_file}")
+    return transcript_file
+
+
+def audio_to_json(audio_path, real_start_time=None):
     """
     Convert audio file to JSON transcript format.
-    Uses get_large_audio_transcription_fixed_interval and formats the output.
+    Uses audiotranscription.audio_to_json and formats the output.
+    
+    Args:
+        audio_path: Path to the audio file
+        real_start_time: Recording start as a UNIX timestamp, so segment times
+                         line up with the engagement timeline (default: now)
     """
     try:
-        # Check if file exists and is a supported format
-        audio_file = Path(audio_path)
-        if not audio_file.exists():
-            print(f"Audio file not found: {audio_path}")
-            return []
-        
-        # Check file extension
-        if audio_file.suffix.lower() not in ['.wav', '.webm', '.mp3', '.m4a']:
-            print(f"Unsupported audio format: {audio_file.suffix}")
-            return []
-        
-        # Transcribe audio in 1-minute chunks
-        # Note: get_large_audio_transcription_fixed_interval expects WAV, may need conversion
-        results_json = get_large_audio_transcription_fixed_interval(audio_path, minutes=1)
-        
-        # Parse JSON string to list
-        if isinstance(results_json, str):
-            results = json.loads(results_json)
-        else:
-            results = results_json
-        
-        # Format to match expected structure
-        formatted_results = []
-        for item in results:
-            # Parse summary if it's a string
-            summary = item.get('summary', {})
-            if isinstance(summary, str):
-                try:
-                    summary = json.loads(summary)
-                except:
-                    summary = {"5_word_summary": summary[:50], "20_word_summary": summary}
-            
-            formatted_results.append({
-                'start_time': datetime.fromtimestamp(item.get('start_time', 0)).isoformat() + 'Z',
-                'end_time': datetime.fromtimestamp(item.get('end_time', 0)).isoformat() + 'Z',
-                'text': item.get('text', ''),
-                'summary': summary
-            })
-        
-        # Save transcript to file for easy access
-        transcript_file = Path('data/transcripts') / f"transcript_{audio_file.stem}.json"
-        with open(transcript_file, 'w') as f:
-            json.dump(formatted_results, f, indent=2)
-        print(f"Transcript saved to: {transcript_file}")
-        
+        formatted_results = transcribe_segments(audio_path, real_start_time=real_start_time)
+        if formatted_results:
+            save_transcript(formatted_results, audio_path)
         return formatted_results
     except Exception as e:
         print(f"Error in audio_to_json: {e}")
@@ -124,7 +527,8 @@ def start_engagement():
         monitor = EngagementMonitor(
             analysis_interval=30,
             history_length=200,
-            lecture_name=lecture_name
+            lecture_name=lecture_name,
+            on_scores=lambda snapshot: live_hub.publish(session_id, snapshot)
         )
         
         # Initialize audio recorder
@@ -144,7 +548,7 @@ def start_engagement():
         sessions[session_id] = {
             'monitor': monitor,
             'audio_recorder': audio_recorder,
-            'audio_filepath': audio_filepath if audio_recording_started else None,
+            'audio_filepath': str(audio_filepath) if audio_recording_started else None,
             'start_time': datetime.now().isoformat(),
             'lecture_name': lecture_name,
         }
@@ -158,6 +562,53 @@ def start_engagement():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/engagement/frame', methods=['POST'])
+def ingest_frame():
+    """
+    Analyse a video frame sent by a client.
+    
+    Form fields: 'frame' (JPEG) and 'session_id'. The face is cropped here
+    and classified by the shared inference service in a batch with the
+    other sessions' frames; the result goes into the session's monitor (and
+    so into its live stream and exported data). Returns the monitor's
+    updated scores, or 202 with the current ones if the batch takes longer
+    than FRAME_RESULT_WAIT seconds.
+    """
+    try:
+        session_id = request.form.get('session_id')
+        if not session_id or session_id not in sessions:
+            return jsonify({'error': 'Session not found'}), 404
+        
+        monitor = sessions[session_id].get('monitor')
+        if monitor is None or not monitor.is_recording:
+            # Monitors live in the worker process that started the session
+            return jsonify({'error': 'Session is not being recorded by this server process'}), 409
+        
+        frame_file = request.files.get('frame')
+        if frame_file is None:
+            return jsonify({'error': 'No frame provided'}), 400
+        data = frame_file.read(FRAME_MAX_BYTES + 1)
+        if len(data) > FRAME_MAX_BYTES:
+            return jsonify({'error': f'Frame exceeds {FRAME_MAX_BYTES} bytes'}), 413
+        
+        try:
+            face = decode_face(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except RuntimeError as e:
+            return jsonify({'error': str(e)}), 503
+        
+        monitor.frame_count += 1
+        pending = frame_inference.submit(session_id, face, monitor.record_emotions)
+        if not pending.wait(FRAME_RESULT_WAIT):
+            return jsonify({**monitor.snapshot(), 'pending': True}), 202
+        if pending.error:
+            return jsonify({'error': pending.error}), 500
+        return jsonify({**monitor.snapshot(), 'superseded': pending.superseded})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/engagement/current/<session_id>', methods=['GET'])
 def get_current_engagement(session_id):
     """Get current engagement scores for a session"""
@@ -165,7 +616,10 @@ def get_current_engagement(session_id):
         if session_id not in sessions:
             return jsonify({'error': 'Session not found'}), 404
         
-        monitor = sessions[session_id]['monitor']
+        monitor = sessions[session_id].get('monitor')
+        if monitor is None:
+            # Monitors live in the worker process that started the session
+            return jsonify({'error': 'Session is not being recorded by this server process'}), 409
         
         return jsonify({
             'scores': monitor.current_scores,
@@ -177,9 +631,457 @@ def get_current_engagement(session_id):
         return jsonify({'error': str(e)}), 500
 
 
+def format_sse(seq, event, data):
+    """One Server-Sent Event frame."""
+    return f"id: {seq}\nevent: {event}\ndata: {payloads.dumps(data).decode('utf-8')}\n\n"
+
+
+@app.route('/api/engagement/stream/<session_id>', methods=['GET'])
+def stream_engagement(session_id):
+    """
+    Push live engagement scores as Server-Sent Events.
+    
+    Emits a 'scores' event (data: scores, state, emotion, confidence,
+    timestamp, seq) each time the monitor analyses a frame, instead of
+    clients polling /api/engagement/current. The event id is the snapshot's
+    sequence number: reconnecting EventSource clients send it back as
+    Last-Event-ID (or pass ?last_event_id=) and resume after it. A client
+    more than LIVE_STREAM_COALESCE_AFTER snapshots behind receives only the
+    latest one, with 'coalesced' set to the number skipped. The stream
+    sends an 'end' event when the session stops; subscribing after that
+    returns 409.
+    """
+    try:
+        if session_id not in sessions:
+            return jsonify({'error': 'Session not found'}), 404
+        monitor = sessions[session_id].get('monitor')
+        if monitor is None:
+            return jsonify({'error': 'Session is not being recorded by this server process'}), 409
+        
+        # Stopping closes the channel; a new one made afterwards would never be closed
+        channel = live_hub.channel(session_id, create=monitor.is_recording)
+        if channel is None:
+            return jsonify({'error': 'Session has stopped recording'}), 409
+        if not monitor.is_recording:
+            # Stopped while the channel was being created: close it so the stream just ends
+            live_hub.close(session_id)
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        try:
+            last_seq = int(last_event_id) if last_event_id else None
+        except ValueError:
+            return jsonify({'error': 'Last-Event-ID must be an integer'}), 400
+        if last_seq is None or last_seq > channel.seq:
+            # New subscriber (or one from before a restart): start from the current snapshot
+            latest = channel.latest()
+            last_seq = latest[0] - 1 if latest else 0
+        
+        def events():
+            nonlocal last_seq
+            yield "retry: 3000\n\n"
+            while True:
+                batch = channel.wait(last_seq, timeout=LIVE_STREAM_HEARTBEAT)
+                for seq, snapshot, skipped in batch:
+                    data = {**snapshot, 'seq': seq}
+                    if skipped:
+                        data['coalesced'] = skipped
+                    yield format_sse(seq, 'scores', data)
+                    last_seq = seq
+                if channel.closed or session_id not in sessions or sessions[session_id].get('monitor') is None:
+                    yield format_sse(last_seq, 'end', {'sessionId': session_id})
+                    return
+                if not batch:
+                    yield ": keep-alive\n\n"
+        
+        return Response(events(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',  # don't let nginx buffer the stream
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Uploads are copied to disk in blocks of this size
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+def save_upload(file_storage, destination):
+    """
+    Write an uploaded file to disk block by block while hashing it.
+    
+    Args:
+        file_storage: werkzeug FileStorage from request.files
+        destination: Path to write to
+    
+    Returns:
+        Tuple (sha256 hex digest, size in bytes)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(destination, 'wb') as out:
+        while True:
+            block = file_storage.stream.read(UPLOAD_CHUNK_BYTES)
+            if not block:
+                break
+            digest.update(block)
+            out.write(block)
+            size += len(block)
+    return digest.hexdigest(), size
+
+
+STOP_STAGES = ('export', 'transcribe', 'summarise', 'align')
+
+
+def process_stopped_session(job, session_id, session, recorded_audio, uploaded_audio):
+    """
+    Background part of stop_engagement: export → transcribe → summarise → align.
+    
+    Uploaded audio is not converted to WAV first: transcription decodes it
+    once, streaming, straight to the recognizer's PCM format.
+    
+    Runs on the job pool. The engagement data is published as a partial
+    result as soon as it is exported; the full stop response is the job's
+    result.
+    
+    Args:
+        job: The Job running this pipeline
+        session_id: Session being stopped
+        session: The session's dict in `sessions`
+        recorded_audio: Backend-recorded audio file, or None
+        uploaded_audio: Audio file uploaded with the stop request, or None
+    """
+    monitor = session['monitor']
+    
+    # Use backend recorded audio as fallback if no file uploaded
+    final_audio_filepath = Path(uploaded_audio or recorded_audio) if (uploaded_audio or recorded_audio) else None
+    
+    with job.stage('export'):
+        print("💾 Exporting engagement data...")
+        engagement_filepath = monitor.export_data(audio_path=final_audio_filepath)
+        print(f"✅ Engagement data exported to: {engagement_filepath}")
+        # Open the columnar archive (memory-mapped) and build the JSON view for the frontend
+        engagement_archive = EngagementArchive(engagement_filepath) if Path(engagement_filepath).suffix == '.npy' else None
+        engagement_data = engagement_archive.to_json() if engagement_archive else read_engagement(engagement_filepath)
+        job.publish(sessionId=session_id, engagementData=engagement_data)
+    
+    # Process audio transcription if audio file exists
+    transcript_data = None
+    transcript_file_path = None
+    if final_audio_filepath and Path(final_audio_filepath).exists():
+        try:
+            with job.stage('transcribe'):
+                print(f"🎤 Starting audio transcription for: {final_audio_filepath}")
+                recording_start = monitor.recording_start_time.timestamp() if monitor.recording_start_time else None
+                transcript_data = transcribe_segments(
+                    str(final_audio_filepath), real_start_time=recording_start, summarize=False,
+                    progress=lambda done, total: job.progress('transcribe', done, total))
+            with job.stage('summarise'):
+                summarise_segments(transcript_data, progress=lambda done, total: job.progress('summarise', done, total))
+                transcript_file_path = save_transcript(transcript_data, final_audio_filepath)
+            if transcript_data:
+                print(f"✅ Transcription complete: {len(transcript_data)} segments")
+            else:
+                print(f"⚠️  Transcription returned empty data")
+        except Exception as e:
+            # The lecture is still usable without a transcript
+            print(f"❌ Error transcribing audio: {e}")
+            import traceback
+            traceback.print_exc()
+            transcript_data = []
+            job.publish(transcriptError=str(e))
+    else:
+        if final_audio_filepath:
+            print(f"⚠️  Audio file path provided but file does not exist: {final_audio_filepath}")
+        else:
+            print("⚠️  No audio file available for transcription")
+        job.skip('transcribe', 'no audio file')
+        job.skip('summarise', 'no audio file')
+    
+    with job.stage('align'):
+        # Store processed data (one write to the session store)
+        session.update({
+            'engagement_data': engagement_data,
+            'engagement_archive': engagement_archive,
+            'engagement_file': str(engagement_filepath),
+            'transcript_data': transcript_data,
+            'transcript_file': str(transcript_file_path) if transcript_file_path else None,
+            'end_time': datetime.now().isoformat(),
+            'audio_filepath': str(final_audio_filepath) if final_audio_filepath else None,
+        })
+        invalidate_session_artifacts(session)
+        
+        # Match engagement samples to transcript segments once for every later request
+        get_alignment(session)
+        
+        # Recording is over: the monitor's history is exported, free it
+        release_live_objects(sessions.pop_live(session_id))
+    
+    # Prepare response with audio file info
+    response_data = {
+        'sessionId': session_id,
+        'engagementData': engagement_data,
+        'transcript': transcript_data,
+        'success': True
+    }
+    
+    # Add audio file info if available
+    if final_audio_filepath and Path(final_audio_filepath).exists():
+        audio_path_obj = Path(final_audio_filepath)
+        response_data['audioFile'] = {
+            'path': str(final_audio_filepath),
+            'exists': True,
+            'format': audio_path_obj.suffix,
+            'size': audio_path_obj.stat().st_size
+        }
+        if uploaded_audio and session.get('audio_sha256'):
+            response_data['audioFile']['sha256'] = session['audio_sha256']
+    else:
+        response_data['audioFile'] = {
+            'exists': False,
+            'message': 'No audio file recorded'
+        }
+    
+    # Add transcript file info
+    if transcript_file_path and transcript_file_path.exists():
+        response_data['transcriptFile'] = {
+            'path': str(transcript_file_path),
+            'exists': True,
+            'size': transcript_file_path.stat().st_size
+        }
+    
+    print(f"✅ Session {session_id} processed")
+    return response_data
+
+
+def job_accepted(job):
+    """202 Accepted response pointing the client at the job's status URL."""
+    status_url = f"/api/jobs/{job.id}"
+    response = jsonify({**job.to_dict(include_result=False), 'statusUrl': status_url})
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
+
+
+# LLM-bound endpoints run on their own bounded pool, so a burst of generations
+# neither exceeds the provider concurrency we want nor starves cheap endpoints
+llm_jobs = JobManager(
+    max_workers=int(os.getenv('LLM_CONCURRENCY', '4')),
+    retention_seconds=float(os.getenv('JOB_RETENTION_SECONDS', '3600')),
+    name='llm',
+)
+# Generations queued or running beyond this are refused with 503
+LLM_QUEUE_LIMIT = int(os.getenv('LLM_QUEUE_LIMIT', '64'))
+# Callers that state no preference wait this long before being handed the job (202)
+LLM_SYNC_WAIT = float(os.getenv('LLM_SYNC_WAIT', '1'))
+# Longest wait a caller may ask for with 'Prefer: wait=<seconds>'
+LLM_MAX_SYNC_WAIT = float(os.getenv('LLM_MAX_SYNC_WAIT', '25'))
+
+
+def prefers_async():
+    """True if the client asked for a 202 + job instead of waiting (RFC 7240)."""
+    return 'respond-async' in request.headers.get('Prefer', '').lower()
+
+
+def sync_wait():
+    """
+    Seconds this request may wait for a generation before getting the 202.
+    
+    0 with 'Prefer: respond-async'; 'Prefer: wait=<seconds>' asks for up to
+    LLM_MAX_SYNC_WAIT; otherwise LLM_SYNC_WAIT.
+    """
+    prefer = request.headers.get('Prefer', '').lower()
+    if 'respond-async' in prefer:
+        return 0
+    match = re.search(r'\bwait\s*=\s*(\d+(?:\.\d+)?)', prefer)
+    if match:
+        return min(float(match.group(1)), LLM_MAX_SYNC_WAIT)
+    return LLM_SYNC_WAIT
+
+
+# Serialises the "is this generation already running?" check with the submit
+llm_submit_lock = threading.Lock()
+
+
+def artifact_key(session, name, inputs=None):
+    """
+    Key of a generated artifact.
+    
+    Names the generation by artifact, session data version and a hash of the
+    request inputs it depends on, so any change to the session's data or to
+    those inputs yields a new key.
+    
+    Args:
+        session: Session dict
+        name: Session field the artifact is stored in (e.g. 'user_report')
+        inputs: JSON-serialisable request inputs the artifact depends on
+        
+    Returns:
+        String key, e.g. 'user_report:v3:1f2e9a0c4b7d6e5f'
+    """
+    digest = hashlib.sha1(payloads.dumps(inputs)).hexdigest()[:16]
+    return f"{name}:v{session.get('data_version', 0)}:{digest}"
+
+
+def stored_artifact(session, name, key):
+    """The session's stored artifact if it was generated for ``key``, else None."""
+    if session.get(f'artifact_key:{name}') != key:
+        return None
+    return session.get(name)
+
+
+def wants_refresh(payload):
+    """True if the client asked to regenerate (?refresh=1 or "refresh": true in the body)."""
+    return request.args.get('refresh', '').lower() in ('1', 'true') or bool(payload.get('refresh'))
+
+
+def mcq_results_input(payload):
+    """Arguments of the report and plan generations."""
+    return {'mcq_results': payload.get('mcq_results', [])}
+
+
+# LLM generations by job kind, registered by llm_generation:
+# kind -> (fn, artifact, inputs, requires)
+llm_generations = {}
+
+
+def llm_generation(kind, artifact, inputs=None, requires=None):
+    """
+    Register a function that generates a session artifact with the LLM.
+    
+    The function is called as ``fn(session_id, session, **inputs(payload))``
+    on the LLM pool and returns the artifact (a dict), which is stored in
+    the session under ``artifact``.
+    
+    Args:
+        kind: Job kind
+        artifact: Session field the artifact is stored in
+        inputs: Optional callable(payload) -> dict of the function's keyword
+                arguments; they are part of the artifact key
+        requires: Optional (session field, error message): the generation is
+                  refused while that field is empty
+    """
+    def decorator(fn):
+        llm_generations[kind] = (fn, artifact, inputs, requires)
+        return fn
+    return decorator
+
+
+def missing_input(kind, session):
+    """Error message if the session lacks the data a generation requires, else None."""
+    requires = llm_generations[kind][3]
+    if requires and not session.get(requires[0]):
+        return requires[1]
+    return None
+
+
+def run_generation(job, kind, session_id, kwargs, key):
+    """
+    Run a registered generation on the LLM pool and store its artifact.
+    
+    The artifact's key is stored next to it (one field per artifact, so
+    concurrent generations of a bundle never overwrite each other's keys)
+    and the next identical request is served from the session.
+    """
+    fn, artifact, _, _ = llm_generations[kind]
+    session = sessions[session_id]
+    missing = missing_input(kind, session)
+    if missing:
+        raise ValueError(missing)
+    result = fn(session_id, session, **kwargs)
+    session.update({artifact: result, f'artifact_key:{artifact}': key})
+    return result
+
+
+def start_generation(kind, payload):
+    """
+    Serve an LLM generation from its stored artifact, or start it on the LLM pool.
+    
+    Args:
+        kind: Job kind of a generation registered with llm_generation
+        payload: Request body (dict) naming an existing session
+        
+    Returns:
+        Tuple (stored, job): the stored artifact and None on a memo hit;
+        None and the new (or identical, already running) job otherwise;
+        (None, None) if LLM_QUEUE_LIMIT generations are already pending
+    """
+    _, artifact, inputs, _ = llm_generations[kind]
+    session_id = payload['session_id']
+    session = sessions[session_id]
+    kwargs = inputs(payload) if inputs else {}
+    key = artifact_key(session, artifact, kwargs or None)
+    stored = None if wants_refresh(payload) else stored_artifact(session, artifact, key)
+    if stored is not None:
+        return stored, None
+    
+    with llm_submit_lock:
+        running = llm_jobs.active(kind, sessionId=session_id, artifactKey=key)
+        if running:
+            return None, running[0]
+        if llm_jobs.pending() >= LLM_QUEUE_LIMIT:
+            return None, None
+        job = Job(kind, metadata={'sessionId': session_id, 'artifactKey': key})
+        llm_jobs.submit(job, run_generation, kind, session_id, kwargs, key)
+        return None, job
+
+
+def serve_generation(kind):
+    """
+    Answer a POST to an LLM generation endpoint from the bounded LLM pool.
+    
+    The generation runs as a job, so no server thread waits on the LLM:
+    the request waits at most sync_wait() seconds (LLM_SYNC_WAIT, 1 by
+    default; none with 'Prefer: respond-async') and then gets 202 with a
+    job id (poll GET /api/jobs/<jobId>; the job's result is the usual
+    response body). When LLM_QUEUE_LIMIT generations are already pending
+    the endpoint answers 503 with Retry-After.
+    
+    Generations are memoised: a request whose artifact key (session data
+    version plus the hash of its inputs) matches the stored artifact's is
+    answered from the session without touching the pool (X-Artifact-Cache:
+    hit), unless it asks for ?refresh=1. Identical requests arriving while
+    a generation is running share its job instead of starting another.
+    """
+    try:
+        payload = request.get_json(silent=True) or {}
+        session_id = payload.get('session_id')
+        if not session_id or session_id not in sessions:
+            return jsonify({'error': 'Session not found'}), 404
+        missing = missing_input(kind, sessions[session_id])
+        if missing:
+            return jsonify({'error': missing}), 400
+        
+        stored, job = start_generation(kind, payload)
+        if stored is not None:
+            response = jsonify(stored)
+            response.headers['X-Artifact-Cache'] = 'hit'
+            return response
+        if job is None:
+            response = jsonify({'error': 'Too many generations in progress, retry shortly'})
+            response.status_code = 503
+            response.headers['Retry-After'] = '5'
+            return response
+        if prefers_async() or not job.wait(sync_wait()):
+            return job_accepted(job)
+        if job.status != Job.SUCCEEDED:
+            return jsonify({'error': job.error}), 500
+        response = jsonify(job.result)
+        response.headers['X-Artifact-Cache'] = 'miss'
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/engagement/stop', methods=['POST'])
 def stop_engagement():
-    """Stop engagement monitoring and process audio"""
+    """
+    Stop engagement monitoring and process audio in the background.
+    
+    Recording stops and any uploaded audio is saved within the request; the
+    slow part (conversion, export, transcription, summaries, alignment) runs
+    as a job. Returns 202 with the job id; poll GET /api/jobs/<jobId> for
+    progress, the exported engagement data (partial result) and finally the
+    full stop response.
+    """
     try:
         session_id = None
         
@@ -197,13 +1099,27 @@ def stop_engagement():
         if session_id not in sessions:
             return jsonify({'error': f'Session not found: {session_id}'}), 404
         
-        print(f"🛑 Stopping engagement session: {session_id}")
+        # A repeated stop (e.g. a client retry) gets the job already processing the session
+        running = job_manager.active('engagement_stop', sessionId=session_id)
+        if running:
+            return job_accepted(running[0])
         
         session = sessions[session_id]
-        monitor = session['monitor']
+        if session.get('monitor') is None:
+            # Already stopped and processed here (the job released the monitor):
+            # a retry gets the finished job
+            finished = job_manager.get(session.get('stop_job_id') or '')
+            if finished is not None:
+                return job_accepted(finished)
+            return jsonify({'error': 'Session is not being recorded by this server process'}), 409
+        
+        print(f"🛑 Stopping engagement session: {session_id}")
         audio_recorder = session.get('audio_recorder')
         audio_filepath = session.get('audio_filepath')
         
+        # No more frames are recorded once stopped, so the export sees a fixed history
+        session['monitor'].stop_recording()
+        
         # Stop backend audio recording (if it was started)
         if audio_recorder:
             try:
@@ -215,15 +1131,17 @@ def stop_engagement():
             except Exception as e:
                 print(f"⚠️  Error stopping backend audio recorder: {e}")
         
-        # Initialize audio_filepath variable
-        final_audio_filepath = None
+        # Live streams of this session end here
+        live_hub.close(session_id)
         
-        # Use backend recorded audio as fallback if no file uploaded
+        recorded_audio = None
         if audio_filepath and Path(audio_filepath).exists():
-            final_audio_filepath = Path(audio_filepath)
-            print(f"📁 Using backend recorded audio: {final_audio_filepath}")
+            recorded_audio = Path(audio_filepath)
+            print(f"📁 Using backend recorded audio: {recorded_audio}")
         
-        # Handle uploaded audio file if provided (from frontend)
+        # Handle uploaded audio file if provided (from frontend); the request
+        # body is only readable during the request, so save it now
+        uploaded_audio = None
         if 'audio' in request.files:
             audio_file = request.files['audio']
             if audio_file.filename:
@@ -240,166 +1158,157 @@ def stop_engagement():
                     else:
                         file_ext = '.webm'  # Default to webm for MediaRecorder
                 
-                # Save uploaded audio with original extension
-                uploaded_filepath = Path('data/audio') / f"uploaded_{session_id}{file_ext}"
-                audio_file.save(str(uploaded_filepath))
-                print(f"✅ Saved uploaded audio to: {uploaded_filepath}")
-                
-                # Convert to wav for transcription (required for speech_recognition)
-                wav_filepath = Path('data/audio') / f"audio_{session_id}.wav"
-                try:
-                    from pydub import AudioSegment
-                    print(f"🔄 Converting {uploaded_filepath} to WAV format...")
-                    # Detect format from file extension
-                    input_format = file_ext[1:] if file_ext.startswith('.') else 'webm'
-                    audio_segment = AudioSegment.from_file(str(uploaded_filepath), format=input_format)
-                    # Export as WAV with standard settings
-                    audio_segment.export(str(wav_filepath), format="wav")
-                    final_audio_filepath = wav_filepath
-                    print(f"✅ Converted to WAV: {wav_filepath}")
-                except ImportError:
-                    print("❌ Error: pydub not installed. Cannot convert audio format.")
-                    print("   Install with: pip install pydub")
-                    # Try to use original file (may fail with speech_recognition)
-                    final_audio_filepath = uploaded_filepath
-                except Exception as e:
-                    print(f"❌ Error converting webm to wav: {e}")
-                    print(f"   This usually means ffmpeg is not installed.")
-                    print(f"   Install ffmpeg: brew install ffmpeg (macOS) or apt-get install ffmpeg (Linux)")
-                    # Try to use original file (may fail with speech_recognition)
-                    final_audio_filepath = uploaded_filepath
-                    print(f"⚠️  Will attempt transcription with original format (may fail)")
-        
-        # Export engagement data
-        print("💾 Exporting engagement data...")
-        engagement_filepath = monitor.export_data(audio_path=final_audio_filepath)
-        print(f"✅ Engagement data exported to: {engagement_filepath}")
-        
-        # Load engagement data
-        with open(engagement_filepath, 'r') as f:
-            engagement_data = json.load(f)
-        
-        # Process audio transcription if audio file exists
-        transcript_data = None
-        transcript_file_path = None
-        if final_audio_filepath and Path(final_audio_filepath).exists():
-            try:
-                print(f"🎤 Starting audio transcription for: {final_audio_filepath}")
-                transcript_data = audio_to_json(str(final_audio_filepath))
-                # Get the transcript file path that was saved
-                transcript_file_path = Path('data/transcripts') / f"transcript_{Path(final_audio_filepath).stem}.json"
-                if transcript_data:
-                    print(f"✅ Transcription complete: {len(transcript_data)} segments")
-                else:
-                    print(f"⚠️  Transcription returned empty data")
-            except Exception as e:
-                print(f"❌ Error transcribing audio: {e}")
-                import traceback
-                traceback.print_exc()
-                transcript_data = []
-        elif final_audio_filepath:
-            print(f"⚠️  Audio file path provided but file does not exist: {final_audio_filepath}")
-        else:
-            print("⚠️  No audio file available for transcription")
-        
-        # Store processed data
-        session['engagement_data'] = engagement_data
-        session['transcript_data'] = transcript_data
-        session['transcript_file'] = str(transcript_file_path) if transcript_file_path else None
-        session['end_time'] = datetime.now().isoformat()
-        session['audio_filepath'] = str(final_audio_filepath) if final_audio_filepath else None
-        
-        # Prepare response with audio file info
-        response_data = {
-            'sessionId': session_id,
-            'engagementData': engagement_data,
-            'transcript': transcript_data,
-            'success': True
-        }
-        
-        # Add audio file info if available
-        if final_audio_filepath and Path(final_audio_filepath).exists():
-            audio_path_obj = Path(final_audio_filepath)
+                # Save uploaded audio with original extension, hashing it on the way
+                uploaded_audio = Path('data/audio') / f"uploaded_{session_id}{file_ext}"
+                audio_sha256, audio_size = save_upload(audio_file, uploaded_audio)
+                session.update({'audio_sha256': audio_sha256, 'audio_size': audio_size})
+                print(f"✅ Saved uploaded audio to: {uploaded_audio} ({audio_size} bytes, sha256 {audio_sha256[:12]})")
+        
+        job = Job('engagement_stop', stages=STOP_STAGES, metadata={'sessionId': session_id})
+        session['stop_job_id'] = job.id
+        job_manager.submit(job, process_stopped_session, session_id, session, recorded_audio, uploaded_audio)
+        print(f"⏳ Processing session {session_id} as job {job.id}")
+        return job_accepted(job)
+    except Exception as e:
+        print(f"Error in stop_engagement: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Status of a background job.
+    
+    Returns the job's status (queued/running/succeeded/failed), every
+    stage's status, progress and duration, and its (partial) result.
+    """
+    job = job_manager.get(job_id) or llm_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Job not found: {job_id}'}), 404
+    return jsonify(job.to_dict())
+
+
+def add_session_file_info(session, response_data):
+    """Add the audioFile / transcriptFile info of a session to a response dict."""
+    # Add audio file info
+    audio_filepath = session.get('audio_filepath')
+    if audio_filepath:
+        audio_path = Path(audio_filepath)
+        if audio_path.exists():
             response_data['audioFile'] = {
-                'path': str(final_audio_filepath),
+                'path': str(audio_path),
                 'exists': True,
-                'format': audio_path_obj.suffix,
-                'size': audio_path_obj.stat().st_size
+                'format': audio_path.suffix,
+                'size': audio_path.stat().st_size
             }
         else:
             response_data['audioFile'] = {
                 'exists': False,
-                'message': 'No audio file recorded'
+                'path': str(audio_path)
             }
-        
-        # Add transcript file info
-        if transcript_file_path and transcript_file_path.exists():
+    else:
+        response_data['audioFile'] = {
+            'exists': False,
+            'message': 'No audio file path stored'
+        }
+    
+    # Add transcript file info
+    transcript_file = session.get('transcript_file')
+    if transcript_file:
+        transcript_path = Path(transcript_file)
+        if transcript_path.exists():
             response_data['transcriptFile'] = {
-                'path': str(transcript_file_path),
+                'path': str(transcript_path),
                 'exists': True,
-                'size': transcript_file_path.stat().st_size
+                'size': transcript_path.stat().st_size
             }
-        
-        return jsonify(response_data)
-    except Exception as e:
-        print(f"Error in stop_engagement: {e}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({'error': str(e)}), 500
+        else:
+            response_data['transcriptFile'] = {
+                'exists': False,
+                'path': str(transcript_path)
+            }
+    return response_data
 
 
 @app.route('/api/engagement/data/<session_id>', methods=['GET'])
 def get_engagement_data(session_id):
-    """Get full engagement data for a session"""
+    """
+    Get engagement data for a session.
+    
+    Query parameters (all optional):
+        view=metadata: metadata, summary statistics and timeline info only
+        from, to: time window, as elapsed seconds or ISO timestamps
+        cursor, limit: page through the (windowed) timeline; responses carry
+                       page.next_cursor while more samples remain
+        points, method, fields: downsampling (see parse_timeline_query)
+    """
     try:
         if session_id not in sessions:
             return jsonify({'error': 'Session not found'}), 404
         
         session = sessions[session_id]
         if 'engagement_data' not in session:
-            return jsonify({'error': 'Engagement data not available yet'}), 404
-        
-        response_data = session['engagement_data'].copy()
-        
-        # Add audio file info
-        audio_filepath = session.get('audio_filepath')
-        if audio_filepath:
-            audio_path = Path(audio_filepath)
-            if audio_path.exists():
-                response_data['audioFile'] = {
-                    'path': str(audio_path),
-                    'exists': True,
-                    'format': audio_path.suffix,
-                    'size': audio_path.stat().st_size
-                }
-            else:
-                response_data['audioFile'] = {
-                    'exists': False,
-                    'path': str(audio_path)
-                }
-        else:
-            response_data['audioFile'] = {
-                'exists': False,
-                'message': 'No audio file path stored'
+            # Still being processed by the stop job (if any)
+            return jsonify({'error': 'Engagement data not available yet', 'jobId': session.get('stop_job_id')}), 404
+        
+        view = request.args.get('view', 'full')
+        if view not in ('full', 'metadata'):
+            return jsonify({'error': "'view' must be 'full' or 'metadata'"}), 400
+        
+        if view == 'metadata':
+            # Lightweight variant: everything except the samples
+            alignment = get_alignment(session)
+            response_data = {k: v for k, v in session['engagement_data'].items() if k != 'engagement_timeline'}
+            response_data['timeline_info'] = {
+                'total_points': len(alignment),
+                'fields': alignment.score_columns,
+                'first_timestamp': alignment.frame['timestamp'].iloc[0] if len(alignment) else None,
+                'last_timestamp': alignment.frame['timestamp'].iloc[-1] if len(alignment) else None
             }
-        
-        # Add transcript file info
-        transcript_file = session.get('transcript_file')
-        if transcript_file:
-            transcript_path = Path(transcript_file)
-            if transcript_path.exists():
-                response_data['transcriptFile'] = {
-                    'path': str(transcript_path),
-                    'exists': True,
-                    'size': transcript_path.stat().st_size
-                }
+        elif any(name in request.args for name in TIMELINE_QUERY_ARGS):
+            # Windowed / downsampled / field-filtered timeline, built from the score arrays
+            alignment = get_alignment(session)
+            try:
+                points, method, fields = parse_timeline_query(request.args, alignment.score_columns)
+                start, stop, next_cursor = resolve_timeline_window(session, alignment, request.args)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            def build():
+                return format_engagement_timeline(alignment, points, method, fields, rows=slice(start, stop))
+            
+            if (start, stop) == (0, len(alignment)):
+                key = f"engagement-timeline?points={points}&method={method}&fields={','.join(fields)}"
+                timeline = cached_view(session, key, build)
             else:
-                response_data['transcriptFile'] = {
-                    'exists': False,
-                    'path': str(transcript_path)
+                timeline = build()
+            response_data = {k: v for k, v in session['engagement_data'].items() if k != 'engagement_timeline'}
+            response_data['engagement_timeline'] = timeline
+            response_data['page'] = {
+                'start_row': start,
+                'end_row': stop,
+                'total_points': len(alignment),
+                'next_cursor': next_cursor
+            }
+            if points:
+                response_data['downsampling'] = {
+                    'points': points,
+                    'method': method,
+                    'fields': fields,
+                    'original_points': stop - start,
+                    'returned_points': len(timeline)
                 }
-        
-        return jsonify(response_data)
+        else:
+            # The full recording only changes with the data version: serialise
+            # (and compress) it once, and let clients revalidate by ETag
+            body, etag = cached_response_body(
+                session, 'engagement-data',
+                lambda: add_session_file_info(session, session['engagement_data'].copy()))
+            return conditional_json_response(body, etag)
+        
+        return jsonify(add_session_file_info(session, response_data))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -447,19 +1356,105 @@ def get_transcript_file(session_id):
         if not transcript_path.exists():
             return jsonify({'error': 'Transcript file not found'}), 404
         
-        # Return as JSON
-        with open(transcript_path, 'r') as f:
-            transcript_data = json.load(f)
+        # Return as JSON, serialised once per data version
+        def build():
+            with open(transcript_path, 'r') as f:
+                transcript_data = json.load(f)
+            return {
+                'sessionId': session_id,
+                'transcriptFile': str(transcript_path),
+                'transcript': transcript_data
+            }
         
-        return jsonify({
-            'sessionId': session_id,
-            'transcriptFile': str(transcript_path),
-            'transcript': transcript_data
-        })
+        body, etag = cached_response_body(session, 'transcript-file', build)
+        return conditional_json_response(body, etag)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+SENTIMENT_FIELDS = ('bored', 'confused', 'engaged', 'frustrated', 'excited')
+
+
+def format_sentiment_timeline(alignment, points=None, method='lttb', fields=SENTIMENT_FIELDS):
+    """
+    Format a session's engagement samples as sentiment timeline records for the frontend graphs.
+    
+    Args:
+        alignment: The session's SessionAlignment
+        points: Downsample to about this many samples (None returns every sample)
+        method: Downsampling method (see modules.downsample)
+        fields: Score fields to include
+        
+    Returns:
+        List of {timestamp, <fields>, lectureContent} with scores scaled to 0-1
+    """
+    frame = alignment.frame
+    columns = {
+        'timestamp': frame['timestamp'].to_numpy(dtype=object),
+        'lectureContent': alignment.lecture_contents,
+    }
+    # excited is derived from engaged and frustrated is constant, so only the
+    # measured scores drive the downsampling
+    measured = [col for col in ('bored', 'confused', 'engaged')
+                if col in fields or (col == 'engaged' and 'excited' in fields)]
+    for col in measured:
+        # Scores are stored as float32; round away the float32 noise after scaling to 0-1
+        columns[col] = (np.round(frame[col].fillna(0).to_numpy(dtype=np.float64) / 100, 6)
+                        if col in frame.columns else np.zeros(len(frame)))
+    if points:
+        columns = downsample_columns(columns, alignment.epochs, measured, points, method)
+
+    n = len(columns['timestamp'])
+    records = {'timestamp': columns['timestamp']}
+    for field in fields:
+        if field == 'frustrated':
+            records[field] = [0] * n  # Not in backend
+        elif field == 'excited':
+            records[field] = np.round(columns['engaged'] * 0.3, 6)
+        else:
+            records[field] = np.round(columns[field], 6)
+    records['lectureContent'] = columns['lectureContent']
+    return columns_to_records(records)
+
+
+def format_engagement_timeline(alignment, points=None, method='lttb', fields=None, rows=None):
+    """
+    Build engagement_timeline records from a session's score arrays.
+    
+    Args:
+        alignment: The session's SessionAlignment
+        points: Downsample to about this many samples (None returns every sample)
+        method: Downsampling method (see modules.downsample)
+        fields: Score fields to include (default: all)
+        rows: Optional slice of sample rows to format (e.g. from resolve_timeline_window)
+        
+    Returns:
+        List of {timestamp, elapsed_seconds, scores: {<fields>}}
+    """
+    frame = alignment.frame
+    rows = rows or slice(None)
+    fields = list(fields or alignment.score_columns)
+    epochs = alignment.epochs[rows]
+    # Slice before converting, so a page doesn't copy the whole recording
+    window = frame.iloc[rows]
+    columns = {
+        'timestamp': window['timestamp'].to_numpy(dtype=object),
+        'elapsed_seconds': epochs - alignment.epochs[0] if len(frame) else epochs,
+    }
+    for field in fields:
+        columns[field] = window[field].to_numpy(dtype=np.float64)
+    if points:
+        columns = downsample_columns(columns, epochs, fields, points, method)
+
+    timestamps = np.asarray(columns['timestamp']).tolist()
+    elapsed = np.round(columns['elapsed_seconds'], 1).tolist()
+    scores = [np.round(columns[field], 2).tolist() for field in fields]
+    return [
+        {'timestamp': ts, 'elapsed_seconds': el, 'scores': dict(zip(fields, values))}
+        for ts, el, values in zip(timestamps, elapsed, zip(*scores))
+    ]
+
+
 @app.route('/api/sentiment-timeline/<session_id>', methods=['GET'])
 def get_sentiment_timeline(session_id):
     """Get sentiment timeline formatted for frontend graphs"""
@@ -471,70 +1466,30 @@ def get_sentiment_timeline(session_id):
         if 'engagement_data' not in session:
             return jsonify({'error': 'Engagement data not available yet'}), 404
         
-        engagement_data = session['engagement_data']
-        transcript_data = session.get('transcript_data', [])
-        timeline = engagement_data.get('engagement_timeline', [])
-        
-        # Transform to frontend format
-        sentiment_timeline = []
-        for entry in timeline:
-            scores = entry.get('scores', {})
-            
-            # Find matching transcript for lectureContent
-            lecture_content = ''
-            if transcript_data:
-                entry_time = datetime.fromisoformat(entry['timestamp'].replace('Z', '+00:00'))
-                for transcript in transcript_data:
-                    try:
-                        start = datetime.fromisoformat(transcript['start_time'].replace('Z', '+00:00'))
-                        end = datetime.fromisoformat(transcript['end_time'].replace('Z', '+00:00'))
-                        if start <= entry_time <= end:
-                            summary = transcript.get('summary', {})
-                            if isinstance(summary, dict):
-                                lecture_content = summary.get('5_word_summary', '')
-                            break
-                    except:
-                        continue
-            
-            sentiment_timeline.append({
-                'timestamp': entry['timestamp'],
-                'bored': (scores.get('bored', 0) / 100),
-                'confused': (scores.get('confused', 0) / 100),
-                'engaged': (scores.get('engaged', 0) / 100),
-                'frustrated': 0,  # Not in backend
-                'excited': (scores.get('engaged', 0) * 0.3 / 100),
-                'lectureContent': lecture_content
-            })
-        
-        return jsonify(sentiment_timeline)
+        try:
+            points, method, fields = parse_timeline_query(request.args, SENTIMENT_FIELDS)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Formatted and serialised once per session data version and parameter set;
+        # unchanged polls get 304
+        key = f"sentiment-timeline?points={points}&method={method}&fields={','.join(fields)}"
+        body, etag = cached_response_body(
+            session, key, lambda: format_sentiment_timeline(get_alignment(session), points, method, fields))
+        return conditional_json_response(body, etag)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/lecture/summary', methods=['POST'])
-def generate_lecture_summary():
+@llm_generation('lecture_summary', 'lecture_summary',
+                requires=('transcript_data', 'No transcript data available'))
+def lecture_summary(session_id, session):
     """Generate lecture summary from transcript"""
-    try:
-        data = request.get_json()
-        session_id = data.get('session_id')
-        
-        if not session_id or session_id not in sessions:
-            return jsonify({'error': 'Session not found'}), 404
-        
-        session = sessions[session_id]
-        transcript_data = session.get('transcript_data', [])
-        
-        if not transcript_data:
-            return jsonify({'error': 'No transcript data available'}), 400
-        
-        # Generate summary using AI
-        client = init_anthropic_client()
-        
-        # Combine all transcript text
-        full_text = ' '.join([item.get('text', '') for item in transcript_data])
-        
-        # Generate comprehensive summary
-        summary_prompt = f"""Based on the following lecture transcript, create a comprehensive lecture summary in JSON format:
+    # Generate summary using AI
+    client = init_anthropic_client()
+    
+    # Generate comprehensive summary
+    summary_prompt = f"""Based on the lecture transcript in the context, create a comprehensive lecture summary in JSON format:
 {{
     "title": "Lecture Summary",
     "lectureTitle": "Generated from transcript",
@@ -555,62 +1510,104 @@ def generate_lecture_summary():
     "overallTakeaways": ["takeaway1", "takeaway2"],
     "nextSteps": ["step1", "step2"]
 }}
-
-Transcript:
-{full_text[:8000]}  # Limit to avoid token limits
 """
-        
-        summary_raw = send_message(client, message=summary_prompt, max_tokens=2000)
-        summary_data = extract_json_from_claude_response(summary_raw)
-        
-        # Store and return
-        session['lecture_summary'] = summary_data
-        return jsonify(summary_data)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    
+    summary_raw = send_message(client, message=summary_prompt, max_tokens=2000,
+                               system=LECTURE_CONTEXT_SYSTEM, context=get_lecture_context(session))
+    return extract_json_from_claude_response(summary_raw, expect=dict)
 
 
-@app.route('/api/lecture/mcqs', methods=['POST'])
-def generate_mcqs():
+@app.route('/api/lecture/summary', methods=['POST'])
+def generate_lecture_summary():
+    """Generate lecture summary from transcript (on the LLM pool, see serve_generation)"""
+    return serve_generation('lecture_summary')
+
+
+@llm_generation('mcqs', 'mcq_data',
+                requires=('engagement_data', 'Engagement data not available'))
+def mcq_set(session_id, session):
     """Generate MCQs from engagement data and transcript"""
-    try:
-        data = request.get_json()
-        session_id = data.get('session_id')
-        
-        if not session_id or session_id not in sessions:
-            return jsonify({'error': 'Session not found'}), 404
-        
-        session = sessions[session_id]
-        engagement_data = session.get('engagement_data')
-        transcript_data = session.get('transcript_data', [])
-        
-        if not engagement_data:
-            return jsonify({'error': 'Engagement data not available'}), 400
-        
-        # Get engagement timeline
-        emotion_data = engagement_data.get('engagement_timeline', [])
+    transcript_data = session.get('transcript_data', [])
+    
+    # Get engagement timeline
+    emotion_data, n_samples = get_engagement_timeline(session)
+    
+    # Parse transcript
+    client = init_anthropic_client()
+    lecture_context = get_lecture_context(session)
+    
+    # Convert transcript to dict format if needed
+    if isinstance(transcript_data, list):
+        transcript_dict = transcript_data
+    else:
+        transcript_dict = parse_transcript(transcript_data, client)
+    
+    # Generate MCQs using wrapper logic
+    # Use lower thresholds to ensure we get some questions
+    # Also check if we have enough data points
+    if n_samples < 5:
+        # Not enough engagement data, generate questions from transcript only
+        print("Warning: Not enough engagement data, generating questions from transcript only")
+        unique_sessions = []
+        # Generate questions from transcript segments
+        if transcript_dict and len(transcript_dict) > 0:
+            for i, transcript_segment in enumerate(transcript_dict[:5]):  # Use first 5 segments
+                # Generate questions for this segment
+                question_prompt = f"""Based on the following lecture transcript segment, generate 2-3 multiple choice questions in JSON format:
+{{
+    "question_1": {{
+        "question": "Question text here",
+        "options": ["A. Option 1", "B. Option 2", "C. Option 3", "D. Option 4"],
+        "answer": 0,
+        "explanation": "Explanation here"
+    }},
+    "question_2": {{...}}
+}}
+
+Transcript segment:
+{transcript_segment.get('text', '')[:1000]}
+
+Return ONLY valid JSON with no additional text."""
+                
+                try:
+                    questions = send_message_json(client, message=question_prompt, max_tokens=1000,
+                                                  system=LECTURE_CONTEXT_SYSTEM, context=lecture_context)
+                    
+                    unique_sessions.append({
+                        'start_time': transcript_segment.get('start_time', ''),
+                        'end_time': transcript_segment.get('end_time', ''),
+                        'text': transcript_segment.get('text', ''),
+                        'summary': transcript_segment.get('summary', {}),
+                        'questions': questions
+                    })
+                except Exception as e:
+                    print(f"Error generating questions for segment {i}: {e}")
+                    continue
+    else:
+        # Use engagement-based question generation
+        emotion_thresholds = {
+            "bored": 20,  # Lower threshold to catch more periods
+            "confused": 20,
+        }
         
-        # Parse transcript
-        client = init_anthropic_client()
+        things_happened, unique_sessions = pose_questions(
+            client=client,
+            data=emotion_data,
+            transcript_dict=transcript_dict,
+            target=emotion_thresholds,
+            nos_entry_before=2,
+            llm_context=lecture_context,
+            # The session alignment was built from this transcript; reuse it
+            alignment=get_alignment(session) if transcript_dict is transcript_data else None
+        )
         
-        # Convert transcript to dict format if needed
-        if isinstance(transcript_data, list):
-            transcript_dict = transcript_data
-        else:
-            transcript_dict = parse_transcript(transcript_data, client)
-        
-        # Generate MCQs using wrapper logic
-        # Use lower thresholds to ensure we get some questions
-        # Also check if we have enough data points
-        if not emotion_data or len(emotion_data) < 5:
-            # Not enough engagement data, generate questions from transcript only
-            print("Warning: Not enough engagement data, generating questions from transcript only")
+        # If no questions generated from engagement, generate from transcript
+        if not unique_sessions or len(unique_sessions) == 0:
+            print("No questions from engagement data, generating from transcript")
             unique_sessions = []
-            # Generate questions from transcript segments
             if transcript_dict and len(transcript_dict) > 0:
-                for i, transcript_segment in enumerate(transcript_dict[:5]):  # Use first 5 segments
-                    # Generate questions for this segment
-                    question_prompt = f"""Based on the following lecture transcript segment, generate 2-3 multiple choice questions in JSON format:
+                for i, transcript_segment in enumerate(transcript_dict[:3]):  # Use first 3 segments
+                    question_prompt = f"""Based on the following lecture transcript segment, generate 2 multiple choice questions in JSON format:
 {{
     "question_1": {{
         "question": "Question text here",
@@ -627,8 +1624,8 @@ Transcript segment:
 Return ONLY valid JSON with no additional text."""
                     
                     try:
-                        question_raw = send_message(client, message=question_prompt, max_tokens=1000)
-                        questions = extract_json_from_claude_response(question_raw)
+                        questions = send_message_json(client, message=question_prompt, max_tokens=1000,
+                                                      system=LECTURE_CONTEXT_SYSTEM, context=lecture_context)
                         
                         unique_sessions.append({
                             'start_time': transcript_segment.get('start_time', ''),
@@ -640,160 +1637,95 @@ Return ONLY valid JSON with no additional text."""
                     except Exception as e:
                         print(f"Error generating questions for segment {i}: {e}")
                         continue
-        else:
-            # Use engagement-based question generation
-            emotion_thresholds = {
-                "bored": 20,  # Lower threshold to catch more periods
-                "confused": 20,
-            }
-            
-            things_happened, unique_sessions = pose_questions(
-                client=client,
-                data=emotion_data,
-                transcript_dict=transcript_dict,
-                target=emotion_thresholds,
-                nos_entry_before=2
-            )
-            
-            # If no questions generated from engagement, generate from transcript
-            if not unique_sessions or len(unique_sessions) == 0:
-                print("No questions from engagement data, generating from transcript")
-                unique_sessions = []
-                if transcript_dict and len(transcript_dict) > 0:
-                    for i, transcript_segment in enumerate(transcript_dict[:3]):  # Use first 3 segments
-                        question_prompt = f"""Based on the following lecture transcript segment, generate 2 multiple choice questions in JSON format:
-{{
-    "question_1": {{
-        "question": "Question text here",
-        "options": ["A. Option 1", "B. Option 2", "C. Option 3", "D. Option 4"],
-        "answer": 0,
-        "explanation": "Explanation here"
-    }},
-    "question_2": {{...}}
-}}
+    
+    # Generate title
+    title_prompt = "Based on the lecture transcript in the context, can you generate me a short title of the lecture? The best output only, within 10 words please."
+    title_raw = send_message(client, message=title_prompt, max_tokens=100,
+                             system=LECTURE_CONTEXT_SYSTEM, context=lecture_context)
+    
+    # Ensure we have at least some questions
+    if not unique_sessions or len(unique_sessions) == 0:
+        # Last resort: create a simple question from transcript
+        print("Creating fallback questions")
+        if transcript_dict and len(transcript_dict) > 0:
+            first_segment = transcript_dict[0]
+            unique_sessions = [{
+                'start_time': first_segment.get('start_time', ''),
+                'end_time': first_segment.get('end_time', ''),
+                'text': first_segment.get('text', '')[:500],
+                'summary': first_segment.get('summary', {'5_word_summary': 'Lecture Content'}),
+                'questions': {
+                    'question_1': {
+                        'question': 'What is the main topic discussed in this lecture?',
+                        'options': ['A. The topic from the transcript', 'B. Option B', 'C. Option C', 'D. Option D'],
+                        'answer': 0,
+                        'explanation': 'Based on the lecture transcript'
+                    }
+                }
+            }]
+    
+    # Convert to MCQ format
+    # Save unique_sessions temporarily
+    temp_questions_file = Path('output') / f"questions_{session_id}.json"
+    with open(temp_questions_file, 'w') as f:
+        json.dump(unique_sessions, f, indent=2)
+    
+    # Convert to frontend format
+    # Use temp output file
+    temp_output_file = Path('output') / f"mcqData_{session_id}.js"
+    mcq_data = convert_questions_to_mcq(
+        input_file=str(temp_questions_file),
+        output_file=str(temp_output_file),
+        title=title_raw
+    )
+    
+    # Ensure we have questions
+    if not mcq_data.get('questions') or len(mcq_data.get('questions', [])) == 0:
+        # Create a default question structure
+        mcq_data = {
+            'lectureTitle': title_raw.strip() if title_raw else 'Lecture Quiz',
+            'questions': [{
+                'id': 1,
+                'topic': 'General',
+                'question': 'Please complete the engagement monitor first to generate personalized questions.',
+                'options': ['A. I understand', 'B. I understand', 'C. I understand', 'D. I understand'],
+                'correctAnswer': 0,
+                'explanation': 'Questions are generated based on your engagement data and lecture transcript. Please start and stop the engagement monitor first.'
+            }]
+        }
+    
+    # Clean up temp output file
+    if temp_output_file.exists():
+        temp_output_file.unlink()
+    
+    # Clean up temp file
+    if temp_questions_file.exists():
+        temp_questions_file.unlink()
+    
+    return mcq_data
 
-Transcript segment:
-{transcript_segment.get('text', '')[:1000]}
 
-Return ONLY valid JSON with no additional text."""
-                        
-                        try:
-                            question_raw = send_message(client, message=question_prompt, max_tokens=1000)
-                            questions = extract_json_from_claude_response(question_raw)
-                            
-                            unique_sessions.append({
-                                'start_time': transcript_segment.get('start_time', ''),
-                                'end_time': transcript_segment.get('end_time', ''),
-                                'text': transcript_segment.get('text', ''),
-                                'summary': transcript_segment.get('summary', {}),
-                                'questions': questions
-                            })
-                        except Exception as e:
-                            print(f"Error generating questions for segment {i}: {e}")
-                            continue
-        
-        # Generate title
-        title_prompt = "Based on the transcript_data, can you generate me a short title of the lecture? The best output only, within 10 words please."
-        title_raw = send_message(client, message=title_prompt + str(transcript_dict), max_tokens=100)
-        
-        # Ensure we have at least some questions
-        if not unique_sessions or len(unique_sessions) == 0:
-            # Last resort: create a simple question from transcript
-            print("Creating fallback questions")
-            if transcript_dict and len(transcript_dict) > 0:
-                first_segment = transcript_dict[0]
-                unique_sessions = [{
-                    'start_time': first_segment.get('start_time', ''),
-                    'end_time': first_segment.get('end_time', ''),
-                    'text': first_segment.get('text', '')[:500],
-                    'summary': first_segment.get('summary', {'5_word_summary': 'Lecture Content'}),
-                    'questions': {
-                        'question_1': {
-                            'question': 'What is the main topic discussed in this lecture?',
-                            'options': ['A. The topic from the transcript', 'B. Option B', 'C. Option C', 'D. Option D'],
-                            'answer': 0,
-                            'explanation': 'Based on the lecture transcript'
-                        }
-                    }
-                }]
-        
-        # Convert to MCQ format
-        # Save unique_sessions temporarily
-        temp_questions_file = Path('output') / f"questions_{session_id}.json"
-        with open(temp_questions_file, 'w') as f:
-            json.dump(unique_sessions, f, indent=2)
-        
-        # Convert to frontend format
-        # Use temp output file
-        temp_output_file = Path('output') / f"mcqData_{session_id}.js"
-        mcq_data = convert_questions_to_mcq(
-            input_file=str(temp_questions_file),
-            output_file=str(temp_output_file),
-            title=title_raw
-        )
-        
-        # Ensure we have questions
-        if not mcq_data.get('questions') or len(mcq_data.get('questions', [])) == 0:
-            # Create a default question structure
-            mcq_data = {
-                'lectureTitle': title_raw.strip() if title_raw else 'Lecture Quiz',
-                'questions': [{
-                    'id': 1,
-                    'topic': 'General',
-                    'question': 'Please complete the engagement monitor first to generate personalized questions.',
-                    'options': ['A. I understand', 'B. I understand', 'C. I understand', 'D. I understand'],
-                    'correctAnswer': 0,
-                    'explanation': 'Questions are generated based on your engagement data and lecture transcript. Please start and stop the engagement monitor first.'
-                }]
-            }
-        
-        # Clean up temp output file
-        if temp_output_file.exists():
-            temp_output_file.unlink()
-        
-        # Clean up temp file
-        if temp_questions_file.exists():
-            temp_questions_file.unlink()
-        
-        # Store and return
-        session['mcq_data'] = mcq_data
-        return jsonify(mcq_data)
-    except Exception as e:
-        print(f"Error in generate_mcqs: {e}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({'error': str(e)}), 500
+@app.route('/api/lecture/mcqs', methods=['POST'])
+def generate_mcqs():
+    """Generate MCQs from engagement data and transcript (on the LLM pool, see serve_generation)"""
+    return serve_generation('mcqs')
 
 
-@app.route('/api/report/generate', methods=['POST'])
-def generate_user_report():
+@llm_generation('user_report', 'user_report', inputs=mcq_results_input,
+                requires=('engagement_data', 'Engagement data not available'))
+def user_report(session_id, session, mcq_results):
     """Generate user report from engagement data and MCQ performance"""
-    try:
-        data = request.get_json()
-        session_id = data.get('session_id')
-        mcq_results = data.get('mcq_results', [])
-        
-        if not session_id or session_id not in sessions:
-            return jsonify({'error': 'Session not found'}), 404
-        
-        session = sessions[session_id]
-        engagement_data = session.get('engagement_data')
-        
-        if not engagement_data:
-            return jsonify({'error': 'Engagement data not available'}), 400
-        
-        # Generate report using AI
-        client = init_anthropic_client()
-        
-        # Prepare data for AI
-        engagement_timeline = engagement_data.get('engagement_timeline', [])
-        mcq_performance = {
-            'total_questions': len(mcq_results),
-            'correct': sum(1 for r in mcq_results if r.get('isCorrect', False)),
-            'results': mcq_results
-        }
-        
-        report_prompt = f"""Based on the following engagement data and MCQ performance, generate a comprehensive user report in JSON format matching this structure:
+    # Generate report using AI
+    client = init_anthropic_client()
+    
+    # Prepare data for AI (engagement data travels in the cached lecture context)
+    mcq_performance = {
+        'total_questions': len(mcq_results),
+        'correct': sum(1 for r in mcq_results if r.get('isCorrect', False)),
+        'results': mcq_results
+    }
+    
+    report_prompt = f"""Based on the engagement data in the context and the MCQ performance below, generate a comprehensive user report in JSON format matching this structure:
 {{
     "title": "Your Learning Report",
     "lectureTitle": "Lecture Title",
@@ -835,49 +1767,36 @@ def generate_user_report():
     ]
 }}
 
-Engagement Data: {json.dumps(engagement_timeline[:50], indent=2)}
 MCQ Performance: {json.dumps(mcq_performance, indent=2)}
 """
-        
-        report_raw = send_message(client, message=report_prompt, max_tokens=3000)
-        report_data = extract_json_from_claude_response(report_raw)
-        
-        # Store and return
-        session['user_report'] = report_data
-        return jsonify(report_data)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    
+    report_raw = send_message(client, message=report_prompt, max_tokens=3000,
+                              system=LECTURE_CONTEXT_SYSTEM, context=get_lecture_context(session))
+    report_data = extract_json_from_claude_response(report_raw, expect=dict)
+    
+    return report_data
 
 
-@app.route('/api/plan/generate', methods=['POST'])
-def generate_study_plan():
+@app.route('/api/report/generate', methods=['POST'])
+def generate_user_report():
+    """Generate user report from engagement data and MCQ performance (on the LLM pool, see serve_generation)"""
+    return serve_generation('user_report')
+
+
+@llm_generation('study_plan', 'study_plan', inputs=mcq_results_input,
+                requires=('engagement_data', 'Engagement data not available'))
+def study_plan(session_id, session, mcq_results):
     """Generate study plan from engagement data and MCQ performance"""
-    try:
-        data = request.get_json()
-        session_id = data.get('session_id')
-        mcq_results = data.get('mcq_results', [])
-        
-        if not session_id or session_id not in sessions:
-            return jsonify({'error': 'Session not found'}), 404
-        
-        session = sessions[session_id]
-        engagement_data = session.get('engagement_data')
-        transcript_data = session.get('transcript_data', [])
-        
-        if not engagement_data:
-            return jsonify({'error': 'Engagement data not available'}), 400
-        
-        # Generate study plan using AI
-        client = init_anthropic_client()
-        
-        engagement_timeline = engagement_data.get('engagement_timeline', [])
-        mcq_performance = {
-            'total_questions': len(mcq_results),
-            'correct': sum(1 for r in mcq_results if r.get('isCorrect', False)),
-            'results': mcq_results
-        }
-        
-        plan_prompt = f"""Based on the following engagement data, transcript, and MCQ performance, generate a personalized study plan in JSON format:
+    # Generate study plan using AI
+    client = init_anthropic_client()
+    
+    mcq_performance = {
+        'total_questions': len(mcq_results),
+        'correct': sum(1 for r in mcq_results if r.get('isCorrect', False)),
+        'results': mcq_results
+    }
+    
+    plan_prompt = f"""Based on the engagement data and transcript in the context and the MCQ performance below, generate a personalized study plan in JSON format:
 {{
     "title": "Post-Lecture Study Plan",
     "lectureTitle": "Lecture Title",
@@ -900,20 +1819,122 @@ def generate_study_plan():
     ]
 }}
 
-Engagement Data: {json.dumps(engagement_timeline[:30], indent=2)}
 MCQ Performance: {json.dumps(mcq_performance, indent=2)}
-Transcript Topics: {json.dumps([t.get('summary', {}).get('5_word_summary', '') for t in transcript_data[:10]], indent=2)}
 """
-        
-        plan_raw = send_message(client, message=plan_prompt, max_tokens=2000)
-        plan_data = extract_json_from_claude_response(plan_raw)
-        
-        # Store and return
-        session['study_plan'] = plan_data
-        return jsonify(plan_data)
+    
+    plan_raw = send_message(client, message=plan_prompt, max_tokens=2000,
+                            system=LECTURE_CONTEXT_SYSTEM, context=get_lecture_context(session))
+    plan_data = extract_json_from_claude_response(plan_raw, expect=dict)
+    
+    return plan_data
+
+
+@app.route('/api/plan/generate', methods=['POST'])
+def generate_study_plan():
+    """Generate study plan from engagement data and MCQ performance (on the LLM pool, see serve_generation)"""
+    return serve_generation('study_plan')
+
+
+# Artifacts a bundle request generates unless it names its own
+BUNDLE_ARTIFACTS = ('lecture_summary', 'mcqs', 'user_report', 'study_plan')
+# Seconds a bundle stream waits for its slowest generation
+BUNDLE_TIMEOUT = float(os.getenv('LLM_BUNDLE_TIMEOUT', '600'))
+
+
+def bundle_line(**fields):
+    """One NDJSON line of a bundle stream."""
+    return payloads.dumps(fields) + b'\n'
+
+
+@app.route('/api/lecture/bundle', methods=['POST'])
+def generate_bundle():
+    """
+    Generate the post-lecture artifacts (summary, MCQs, report, plan) in one request.
+
+    The shared lecture context is built once, then the generations run
+    concurrently on the LLM pool, each memoised and de-duplicated exactly as
+    its own endpoint is. Body: session_id, optional mcq_results (report and
+    plan), optional artifacts (subset of BUNDLE_ARTIFACTS), optional refresh.
+    
+    With 'Prefer: respond-async' the endpoint returns at once: stored
+    artifacts under 'results' and the job id of every other one under
+    'jobs' (202 if any are generating), so no server thread waits on the
+    LLM. Otherwise the response is NDJSON, one line per artifact in the
+    order they complete, so the wait is the slowest generation rather than
+    the sum. If the LLM queue fills up part-way, the answer is 503 with the
+    jobs already started and the artifacts that were not.
+    """
+    try:
+        data = request.get_json() or {}
+        session_id = data.get('session_id')
+
+        if not session_id or session_id not in sessions:
+            return jsonify({'error': 'Session not found'}), 404
+
+        kinds = data.get('artifacts') or list(BUNDLE_ARTIFACTS)
+        unknown = [kind for kind in kinds if kind not in BUNDLE_ARTIFACTS]
+        if unknown:
+            return jsonify({'error': f"Unknown artifacts: {', '.join(map(str, unknown))}. "
+                                     f"Available: {', '.join(BUNDLE_ARTIFACTS)}"}), 400
+
+        session = sessions[session_id]
+        if not session.get('engagement_data') and not session.get('transcript_data'):
+            return jsonify({'error': 'No engagement or transcript data available'}), 400
+
+        # Build the context every generation sends once, up front, instead of
+        # each concurrent generation building its own copy
+        get_lecture_context(session)
+
+        started = {}
+        for kind in kinds:
+            stored, job = start_generation(kind, data)
+            if stored is None and job is None:
+                break
+            started[kind] = (stored, job)
+        results = {kind: stored for kind, (stored, job) in started.items() if job is None}
+        jobs = {kind: job.id for kind, (stored, job) in started.items() if job is not None}
+        
+        if len(started) < len(kinds):
+            # The jobs already started keep running; hand them to the client
+            response = jsonify({'error': 'Too many generations in progress, retry shortly',
+                                'results': results, 'jobs': jobs,
+                                'notStarted': [kind for kind in kinds if kind not in started]})
+            response.status_code = 503
+            response.headers['Retry-After'] = '5'
+            return response
+        print(f"📦 Bundle for session {session_id}: {', '.join(kinds)}")
+        
+        if prefers_async():
+            return jsonify({'results': results, 'jobs': jobs}), 202 if jobs else 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+    def lines():
+        jobs = {}
+        for kind, (stored, job) in started.items():
+            if job is None:
+                yield bundle_line(artifact=kind, status='succeeded', cache='hit', data=stored)
+            else:
+                jobs[job] = kind
+        try:
+            for job in jobs_as_completed(jobs, timeout=BUNDLE_TIMEOUT):
+                if job.status == Job.SUCCEEDED:
+                    yield bundle_line(artifact=jobs[job], status='succeeded', cache='miss',
+                                      data=dict(job.result))
+                else:
+                    yield bundle_line(artifact=jobs[job], status='failed', error=job.error)
+        except TimeoutError:
+            # Still running: the client can pick these up from /api/jobs/<jobId>
+            for job, kind in jobs.items():
+                if not job.finished:
+                    yield bundle_line(artifact=kind, status='pending', jobId=job.id,
+                                      statusUrl=f"/api/jobs/{job.id}")
+
+    return Response(lines(), mimetype='application/x-ndjson', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
 
 @app.route('/', methods=['GET'])
 def root():
@@ -923,9 +1944,11 @@ def root():
         'version': '1.0',
         'endpoints': {
             'health': 'GET /api/health',
+            'metrics': 'GET /api/metrics',
             'engagement': {
                 'start': 'POST /api/engagement/start',
                 'current': 'GET /api/engagement/current/<session_id>',
+                'frame': 'POST /api/engagement/frame',
                 'stop': 'POST /api/engagement/stop',
                 'data': 'GET /api/engagement/data/<session_id>',
                 'audio': 'GET /api/engagement/audio/<session_id>',
@@ -934,7 +1957,8 @@ def root():
             },
             'lecture': {
                 'summary': 'POST /api/lecture/summary',
-                'mcqs': 'POST /api/lecture/mcqs'
+                'mcqs': 'POST /api/lecture/mcqs',
+                'bundle': 'POST /api/lecture/bundle'
             },
             'reports': {
                 'user_report': 'POST /api/report/generate',
@@ -951,6 +1975,12 @@ def health_check():
     return jsonify({'status': 'healthy', 'sessions': len(sessions)})
 
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """LLM resilience counters, circuit breaker state and latency percentiles; frame inference batching"""
+    return jsonify({'llm': llm_caller.snapshot(), 'inference': frame_inference.stats()})
+
+
 if __name__ == '__main__':
     print("Starting Listant API Server...")
     print("API will be available at http://localhost:8000")
@@ -2,26 +2,28 @@ import numpy as np
 import pandas as pd
 import speech_recognition as sr
 import json
-import os
+import math
+import shutil
+import subprocess
+import tempfile
 from dotenv import load_dotenv
-from anthropic import Anthropic, HUMAN_PROMPT, AI_PROMPT
+from anthropic import Anthropic
 from pathlib import Path
 import anthropic
 # import speech_recognition as sr 
-import os 
 from pydub import AudioSegment
 from pydub.silence import split_on_silence
 from datetime import datetime, timedelta
+from modules.utils import init_anthropic_client, send_message
 
-client = anthropic.Anthropic()
 # create a speech recognition object
 r = sr.Recognizer()
+# The LLM client is created on demand (init_anthropic_client), so importing this
+# module needs no API key; set LLM_BACKEND=stub to run without one
 load_dotenv()
-api_key = os.getenv("ANTHROPIC_API_KEY")
-if not api_key:
-    raise ValueError("API key not found. Make sure ANTHROPIC_API_KEY is set in your .env file.")
 
-client = Anthropic(api_key=api_key)
+SUMMARY_MODEL = "claude-sonnet-4-20250514"
+
 # a function to recognize speech in the audio file
 # so that we don't repeat ourselves in in other functions
 def transcribe_audio(path):
@@ -32,16 +34,9 @@ def transcribe_audio(path):
         text = r.recognize_google(audio_listened)
     return text
 
-def create_summary(text):
-    # Initialize the Anthropic client with the API key
-    api_key = os.getenv("ANTHROPIC_API_KEY")
-    if not api_key:
-        raise ValueError("API key not found. Make sure ANTHROPIC_API_KEY is set.")
-    
-    client = Anthropic(api_key=api_key)
-    
-    # Define the prompt for Claude
-    prompt = f"""Please create a JSON object with exactly this structure:
+def build_summary_prompt(text):
+    """Prompt asking Claude for the 5- and 20-word summaries of a transcript chunk."""
+    return f"""Please create a JSON object with exactly this structure:
     {{
         "5_word_summary": "five word summary here",
         "20_word_summary": "twenty word summary here"
@@ -52,37 +47,132 @@ def create_summary(text):
     {text}
 
     Return ONLY valid JSON with no additional text or formatting."""
-    response = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=300,
-        messages=[
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ]
-    )
+
+def create_summary(text):
+    # Initialize the Anthropic client with the API key
+    client = init_anthropic_client()
     
-    # Extract and return the summary
-    summary = response.content[0].text
+    # Define the prompt for Claude
+    prompt = build_summary_prompt(text)
+    try:
+        summary = send_message(client, message=prompt, model=SUMMARY_MODEL, max_tokens=300)
+    except Exception as e:
+        # Retries are exhausted or the circuit is open: keep the chunk with an extractive summary
+        print(f"Summary generation failed, using fallback: {e}")
+        words = text.split()
+        summary = json.dumps({
+            "5_word_summary": " ".join(words[:5]),
+            "20_word_summary": " ".join(words[:20])
+        })
+    
+    # Return the summary
     return summary
 
+# Speech recognition works on 16 kHz mono 16-bit PCM; decoding straight to it
+# avoids writing and re-reading a full-rate WAV
+TARGET_SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+
+
+def transcribe_pcm(pcm, sample_rate=TARGET_SAMPLE_RATE, sample_width=SAMPLE_WIDTH):
+    """Recognize speech in a chunk of raw mono PCM audio."""
+    return r.recognize_google(sr.AudioData(pcm, sample_rate, sample_width))
+
+
+def audio_duration(path):
+    """Duration of an audio file in seconds via ffprobe, or None if unknown."""
+    ffprobe = shutil.which("ffprobe")
+    if not ffprobe:
+        return None
+    try:
+        out = subprocess.run(
+            [ffprobe, "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", str(path)],
+            capture_output=True, text=True, timeout=30).stdout.strip()
+        return float(out)
+    except (ValueError, subprocess.SubprocessError):
+        # e.g. 'N/A' for MediaRecorder WebM without a duration header
+        return None
+
+
+def pcm_chunks(path, chunk_seconds, sample_rate=TARGET_SAMPLE_RATE):
+    """
+    Decode an audio file to mono 16-bit PCM in one streaming pass, chunk by chunk.
+
+    With ffmpeg on the PATH the file is decoded by a single ffmpeg process
+    writing PCM to a pipe, so only one chunk is in memory at a time and no
+    intermediate file is written. Without ffmpeg, pydub loads the file
+    (WAV only) and it is resampled in memory.
+
+    Args:
+        path: Audio file in any format ffmpeg reads (webm, wav, mp3, m4a, ...)
+        chunk_seconds: Length of each chunk; the last one may be shorter
+        sample_rate: Output sample rate
+
+    Yields:
+        bytes of PCM audio, chunk_seconds long each
+    """
+    chunk_bytes = int(chunk_seconds * sample_rate) * SAMPLE_WIDTH
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        sound = AudioSegment.from_file(path).set_channels(1).set_frame_rate(sample_rate).set_sample_width(SAMPLE_WIDTH)
+        raw = sound.raw_data
+        for offset in range(0, len(raw), chunk_bytes):
+            yield raw[offset:offset + chunk_bytes]
+        return
+
+    # ffmpeg's errors go to a file, not a pipe: a corrupt upload can log more
+    # than a pipe buffer holds, and ffmpeg would block on it while we block on stdout
+    errors = tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        [ffmpeg, "-nostdin", "-v", "error", "-i", str(path),
+         "-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(sample_rate), "-"],
+        stdout=subprocess.PIPE, stderr=errors)
+    try:
+        while True:
+            chunk = process.stdout.read(chunk_bytes)
+            if not chunk:
+                break
+            yield chunk
+        if process.wait() != 0:
+            errors.seek(0)
+            message = errors.read().decode(errors='replace').strip()
+            raise RuntimeError(f"ffmpeg could not decode {path}: {message[-2000:]}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.stdout.close()
+        process.wait()
+        errors.close()
+
+
 # a function that splits the audio file into fixed interval chunks
 # and applies speech recognition
 def audio_to_json(path, 
                   minutes=0.5, 
-                  real_start_time=None):
+                  real_start_time=None,
+                  summarize=True,
+                  progress=None):
     """Splitting the large audio file into fixed interval chunks
-    and apply speech recognition on each of these chunks"""
-    # open the audio file using pydub
-    sound = AudioSegment.from_file(path)  
-    # split the audio file into chunks
-    chunk_length_ms = int(1000 * 60 * minutes) # convert to milliseconds
-    chunks = [sound[i:i + chunk_length_ms] for i in range(0, len(sound), chunk_length_ms)]
-    folder_name = "audio-fixed-chunks"
-    # create a directory to store the audio chunks
-    if not os.path.isdir(folder_name):
-        os.mkdir(folder_name)
+    and apply speech recognition on each of these chunks
+
+    The file is decoded once, straight to the recognizer's 16 kHz PCM
+    (see pcm_chunks), and each chunk is transcribed as it is decoded.
+
+    Args:
+        path: Audio file to transcribe
+        minutes: Chunk length in minutes
+        real_start_time: Recording start (datetime or UNIX timestamp; default now)
+        summarize: Ask Claude for each chunk's summaries; when False the
+                   'summary' field is None and callers summarise later
+        progress: Optional callback progress(done_chunks, total_chunks);
+                  total_chunks is None when the duration is unknown
+
+    Returns:
+        JSON string with one {start_time, end_time, text, summary} per chunk
+    """
+    chunk_duration_sec = 60 * minutes
+    duration = audio_duration(path)
+    total_chunks = math.ceil(duration / chunk_duration_sec) if duration else None
     
     # find the start time
     if real_start_time is None:
@@ -93,29 +183,23 @@ def audio_to_json(path,
 
     # process each chunk 
     results = []  # to store transcriptions with timestamps
-    for i, audio_chunk in enumerate(chunks, start=1):
-        
-        # start_time = (i - 1) * (chunk_length_ms / 1000)
-        # end_time = i * (chunk_length_ms / 1000)
+    results_json = json.dumps(results, indent=4)
+    for i, pcm in enumerate(pcm_chunks(path, chunk_duration_sec), start=1):
 
         # Calculate start and end times using timedelta
-        chunk_duration_sec = chunk_length_ms / 1000
         start_time = real_start_time + timedelta(seconds=(i - 1) * chunk_duration_sec)
         end_time = real_start_time + timedelta(seconds=i * chunk_duration_sec)
 
-        # export audio chunk and save it in the `folder_name` directory.
-        chunk_filename = os.path.join(folder_name, f"chunk{i}.wav")
-        audio_chunk.export(chunk_filename, format="wav")
         # recognize the chunk
         try:
-            text = transcribe_audio(chunk_filename)
+            text = transcribe_pcm(pcm)
         except sr.UnknownValueError as e:
             print("Error:", str(e))
             text = "[Unintelligible]" 
         else:
             text = f"{text.capitalize()}. "
 
-        summary = create_summary(text)
+        summary = create_summary(text) if summarize else None
         results.append({
             "start_time": start_time.isoformat()+ 'Z',
             "end_time": end_time.isoformat()+ 'Z',
@@ -125,6 +209,8 @@ def audio_to_json(path,
         print(f"Chunk {i} ({start_time:.2f}s - {end_time:.2f}s): {text}")
         results_json = json.dumps(results, indent=4)
         print(results_json)
+        if progress:
+            progress(i, max(total_chunks or 0, i) if total_chunks else None)
     # return the results
     return results_json
 
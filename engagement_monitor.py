@@ -11,6 +11,8 @@ import pyaudio
 import wave
 import threading
 
+from modules.engagement_store import SCORE_FIELDS, save_engagement
+
 class AudioRecorder:
     """Handles audio recording in a separate thread."""
     
@@ -79,13 +81,14 @@ class AudioRecorder:
         if self.stream:
             self.stream.stop_stream()
             self.stream.close()
+            self.stream = None
         
         # Save to WAV file
         if self.frames:
             try:
                 wf = wave.open(str(self.output_path), 'wb')
                 wf.setnchannels(self.channels)
-                wf.setsampwidth(self.audio.get_sample_size(self.format))
+                wf.setsampwidth(pyaudio.get_sample_size(self.format))
                 wf.setframerate(self.sample_rate)
                 wf.writeframes(b''.join(self.frames))
                 wf.close()
@@ -93,18 +96,24 @@ class AudioRecorder:
             except Exception as e:
                 print(f"⚠️  Error saving audio file: {e}")
                 return False
+            finally:
+                # The WAV file has the audio now; don't keep every raw frame in memory
+                self.frames = []
         
         return False
     
     def cleanup(self):
-        """Cleanup audio resources."""
+        """Cleanup audio resources. Safe to call more than once."""
         if self.stream:
             self.stream.close()
-        self.audio.terminate()
+            self.stream = None
+        if self.audio is not None:
+            self.audio.terminate()
+            self.audio = None
 
 
 class EngagementMonitor:
-    def __init__(self, analysis_interval=30, history_length=100, lecture_name=None):
+    def __init__(self, analysis_interval=30, history_length=100, lecture_name=None, on_scores=None):
         """
         Initialize the engagement monitor.
         
@@ -112,7 +121,10 @@ class EngagementMonitor:
             analysis_interval: Number of frames between analyses (lower = more frequent but slower)
             history_length: Number of data points to keep in time-series history
             lecture_name: Name of the lecture for file naming
+            on_scores: Optional callback receiving a snapshot dict (scores, state,
+                       emotion, confidence, timestamp) after every analysed frame
         """
+        self.on_scores = on_scores
         self.analysis_interval = analysis_interval
         self.frame_count = 0
         self.lecture_name = lecture_name
@@ -121,6 +133,9 @@ class EngagementMonitor:
         self.recording_start_time = None
         self.recording_end_time = None
         self.is_recording = False
+        # Guards the history against frames recorded (e.g. by the API's
+        # inference thread) while it is being exported
+        self._lock = threading.Lock()
         
         # Store recent emotions for smoothing
         self.emotion_history = deque(maxlen=10)
@@ -170,6 +185,11 @@ class EngagementMonitor:
         if self.lecture_name:
             print(f"   Lecture: {self.lecture_name}")
         print(f"   Audio: Recording from default microphone")
+    
+    def stop_recording(self):
+        """Stop recording; frames analysed afterwards are no longer recorded."""
+        with self._lock:
+            self.is_recording = False
         
     def analyze_frame(self, frame):
         """Analyze a single frame for emotions and engagement."""
@@ -187,9 +207,30 @@ class EngagementMonitor:
             if isinstance(result, list):
                 result = result[0]
             
-            # Get emotion data
-            emotions = result['emotion']
-            self.dominant_emotion = result['dominant_emotion']
+            self.record_emotions(result['emotion'], result['dominant_emotion'])
+            return True
+            
+        except Exception as e:
+            # No face detected or other error
+            return False
+    
+    def record_emotions(self, emotions, dominant_emotion):
+        """
+        Record one analysed frame's emotion percentages and update the scores.
+        
+        Used by analyze_frame, and by the API's batched inference service for
+        frames sent by remote clients.
+        
+        Args:
+            emotions: Emotion name -> percentage, as returned by DeepFace
+            dominant_emotion: Name of the strongest emotion
+        
+        Does nothing once recording has stopped.
+        """
+        with self._lock:
+            if not self.is_recording:
+                return
+            self.dominant_emotion = dominant_emotion
             
             # Store in history
             self.emotion_history.append(emotions)
@@ -207,12 +248,19 @@ class EngagementMonitor:
             # Determine winner-takes-all state
             self.engagement_state = max(scores, key=scores.get)
             self.confidence = scores[self.engagement_state]
-            
-            return True
-            
-        except Exception as e:
-            # No face detected or other error
-            return False
+        
+        if self.on_scores is not None:
+            self.on_scores(self.snapshot())
+    
+    def snapshot(self):
+        """Current scores and state, as served by the live endpoints."""
+        return {
+            'scores': {state: float(score) for state, score in self.current_scores.items()},
+            'state': self.engagement_state,
+            'emotion': self.dominant_emotion,
+            'confidence': float(self.confidence),
+            'timestamp': self.timestamps[-1] if self.timestamps else None
+        }
     
     def _calculate_all_engagement_scores(self, emotions):
         """
@@ -294,13 +342,22 @@ class EngagementMonitor:
             'boredom_periods': boredom_periods[:5]     # Top 5
         }
     
-    def export_data(self, output_dir='./data/engagement', audio_path=None):
+    def export_data(self, output_dir='./data/engagement', audio_path=None, columnar=True):
         """
-        Export engagement data to JSON file.
+        Export engagement data to disk.
+        
+        By default the recording is written in the columnar format of
+        modules.engagement_store (an .npy array of samples plus a .meta.json
+        sidecar); read it back with read_engagement or EngagementArchive.
         
         Args:
             output_dir: Directory to save engagement data
             audio_path: Path to the audio file (if recorded)
+            columnar: Write the columnar format; False writes the legacy
+                      indented JSON file instead
+        
+        Returns:
+            Path of the .npy archive (columnar) or of the .json file
         """
         # Create output directory if it doesn't exist
         output_path = Path(output_dir)
@@ -311,57 +368,67 @@ class EngagementMonitor:
         timestamp_str = self.recording_start_time.strftime('%Y-%m-%d_%H-%M-%S')
         
         if self.lecture_name:
-            filename = f"engagement_{self.lecture_name}_{timestamp_str}.json"
+            filename = f"engagement_{self.lecture_name}_{timestamp_str}"
         else:
-            filename = f"engagement_{timestamp_str}.json"
-        
-        filepath = output_path / filename
-        
-        # Build timeline data
-        timeline = []
-        timestamps_list = list(self.timestamps)
-        start_time = timestamps_list[0] if timestamps_list else time.time()
-        
-        for i, timestamp in enumerate(timestamps_list):
-            timeline.append({
-                'timestamp': datetime.fromtimestamp(timestamp).isoformat(),
-                'elapsed_seconds': round(timestamp - start_time, 1),
-                'scores': {
-                    'concentrated': round(list(self.engagement_scores_history['concentrated'])[i], 2),
-                    'engaged': round(list(self.engagement_scores_history['engaged'])[i], 2),
-                    'confused': round(list(self.engagement_scores_history['confused'])[i], 2),
-                    'bored': round(list(self.engagement_scores_history['bored'])[i], 2)
-                }
-            })
+            filename = f"engagement_{timestamp_str}"
+        
+        # Score columns straight from the history deques (no per-sample dicts),
+        # read together so the columns stay aligned
+        with self._lock:
+            timestamps = np.array(self.timestamps, dtype=np.float64)
+            scores = {
+                state: np.round(np.array(self.engagement_scores_history[state], dtype=np.float64), 2)
+                for state in SCORE_FIELDS
+            }
+            key_moments = self._find_key_moments()
+        start_time = timestamps[0] if len(timestamps) else time.time()
+        elapsed = np.round(timestamps - start_time, 1)
         
         # Calculate summary statistics
         summary_stats = {
             'avg_scores': {},
-            'key_moments': self._find_key_moments()
+            'key_moments': key_moments
         }
         
         for state in ['concentrated', 'engaged', 'confused', 'bored']:
-            scores = list(self.engagement_scores_history[state])
-            if scores:
-                summary_stats['avg_scores'][state] = round(np.mean(scores), 2)
+            if len(scores[state]):
+                summary_stats['avg_scores'][state] = round(float(np.mean(scores[state])), 2)
+        
+        metadata = {
+            'lecture_name': self.lecture_name,
+            'start_time': self.recording_start_time.isoformat(),
+            'end_time': self.recording_end_time.isoformat(),
+            'duration_seconds': round((self.recording_end_time - self.recording_start_time).total_seconds(), 1),
+            'total_data_points': len(timestamps),
+            'audio_file': str(audio_path.name) if audio_path else None,
+            'student_id': None,  # Can be filled in later
+            'course': None       # Can be filled in later
+        }
+        
+        if columnar:
+            # Store local wall-clock time as epoch seconds (naive times are read as UTC)
+            utc_offset = datetime.fromtimestamp(start_time).astimezone().utcoffset().total_seconds()
+            return save_engagement(output_path / filename, metadata, summary_stats,
+                                   timestamps + utc_offset, scores, elapsed_seconds=elapsed)
+        
+        # Build timeline data
+        timeline = []
+        for i, timestamp in enumerate(timestamps.tolist()):
+            timeline.append({
+                'timestamp': datetime.fromtimestamp(timestamp).isoformat(),
+                'elapsed_seconds': float(elapsed[i]),
+                'scores': {state: float(scores[state][i]) for state in SCORE_FIELDS}
+            })
         
         # Build complete data structure
         data = {
-            'metadata': {
-                'lecture_name': self.lecture_name,
-                'start_time': self.recording_start_time.isoformat(),
-                'end_time': self.recording_end_time.isoformat(),
-                'duration_seconds': round((self.recording_end_time - self.recording_start_time).total_seconds(), 1),
-                'total_data_points': len(timeline),
-                'audio_file': str(audio_path.name) if audio_path else None,
-                'student_id': None,  # Can be filled in later
-                'course': None       # Can be filled in later
-            },
+            'metadata': metadata,
             'engagement_timeline': timeline,
             'summary_statistics': summary_stats
         }
         
         # Save to file
+        filepath = output_path / f"{filename}.json"
         with open(filepath, 'w') as f:
             json.dump(data, f, indent=2)
         
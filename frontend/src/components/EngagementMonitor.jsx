@@ -46,6 +46,8 @@ const EngagementMonitor = () => {
   const sessionIdRef = useRef(null)
   const intervalRef = useRef(null)
   const timeIntervalRef = useRef(null)
+  const unsubscribeRef = useRef(null)
+  const liveScoresRef = useRef(false)
 
   const stopRecording = useCallback(async () => {
     try {
@@ -55,11 +57,16 @@ const EngagementMonitor = () => {
         timeIntervalRef.current = null
       }
 
-      // Stop data fetching
+      // Stop data updates
       if (intervalRef.current) {
         clearInterval(intervalRef.current)
         intervalRef.current = null
       }
+      if (unsubscribeRef.current) {
+        unsubscribeRef.current()
+        unsubscribeRef.current = null
+      }
+      liveScoresRef.current = false
 
       // Stop camera stream
       if (streamRef.current) {
@@ -191,6 +198,9 @@ const EngagementMonitor = () => {
       if (intervalRef.current) {
         clearInterval(intervalRef.current)
       }
+      if (unsubscribeRef.current) {
+        unsubscribeRef.current()
+      }
       if (streamRef.current) {
         streamRef.current.getTracks().forEach((track) => track.stop())
       }
@@ -297,10 +307,11 @@ const EngagementMonitor = () => {
       // Start with simulation immediately
       simulateEngagementData()
 
-      // Start sending frames to backend (when API is ready)
-      // For now, we'll simulate data updates
+      // Keep simulating until the backend's live stream delivers scores
       intervalRef.current = setInterval(() => {
-        fetchEngagementData()
+        if (!liveScoresRef.current) {
+          simulateEngagementData()
+        }
       }, 2000) // Update every 2 seconds
 
       // Call backend API to start recording session
@@ -316,6 +327,21 @@ const EngagementMonitor = () => {
               localStorage.setItem('currentSessionId', newSessionId)
               // Clear any previous errors
               setError(null)
+              // Live scores are pushed by the server instead of polled
+              // (unless recording was stopped while the session started)
+              if (intervalRef.current) {
+                unsubscribeRef.current = api.subscribeToEngagement(
+                  newSessionId,
+                  (data) => {
+                    liveScoresRef.current = true
+                    updateEngagementDisplay(data)
+                  },
+                  () => {
+                    unsubscribeRef.current = null
+                    liveScoresRef.current = false
+                  },
+                )
+              }
             }
             // Silently handle missing session ID - recording will continue
           })
@@ -348,24 +374,6 @@ const EngagementMonitor = () => {
   }
 
 
-  const fetchEngagementData = () => {
-    // Use simulation by default - API calls are non-blocking
-    simulateEngagementData()
-    
-    // Try to fetch from API in background (non-blocking, lazy loaded)
-    import('../services/engagementApi').then((module) => {
-      module.default.getCurrentEngagement()
-        .then((data) => {
-          updateEngagementDisplay(data)
-        })
-        .catch((err) => {
-          // Silently fail - simulation is already running
-        })
-    }).catch(() => {
-      // API module failed to load, ignore - simulation is already running
-    })
-  }
-
   const simulateEngagementData = () => {
     // Simulate engagement data for demo purposes
     const simulatedScores = {
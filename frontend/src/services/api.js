@@ -8,13 +8,16 @@
  * 1. POST /api/engagement/start - Start recording engagement + audio
  * 2. POST /api/engagement/frame - Send video frame for analysis (optional, real-time)
  * 3. POST /api/engagement/audio-chunk - Send audio chunk (optional, streaming)
- * 4. POST /api/engagement/stop - Stop recording, process audio → transcript
+ * 4. POST /api/engagement/stop - Stop recording, process audio → transcript (202 + job id)
+ *    GET /api/jobs/:jobId - Poll the processing job until it has finished
  * 5. GET /api/engagement/data/:sessionId - Get engagement data
  * 6. POST /api/lecture/summary - Generate lecture summary from transcript
  * 7. POST /api/lecture/mcqs - Generate MCQs from engagement + transcript
  * 8. POST /api/report/generate - Generate user report from engagement + MCQ performance
  * 9. POST /api/plan/generate - Generate study plan from engagement + MCQ performance
  * 10. GET /api/sentiment-timeline/:sessionId - Get sentiment timeline for graphs
+ * 11. GET /api/engagement/stream/:sessionId - Live scores pushed as Server-Sent Events
+ * 12. POST /api/lecture/bundle - Summary, MCQs, report and plan at once (202 + job ids)
  */
 
 // Lazy get API base URL to prevent blocking on module load
@@ -55,13 +58,18 @@ const apiCall = async (endpoint, options = {}, timeout = 10000) => {
     if (!response.ok) {
       const errorText = await response.text()
       let errorMessage = `HTTP error! status: ${response.status}`
+      let errorJson = null
       try {
-        const errorJson = JSON.parse(errorText)
+        errorJson = JSON.parse(errorText)
         errorMessage = errorJson.error || errorMessage
       } catch {
         errorMessage = errorText || errorMessage
       }
-      throw new Error(errorMessage)
+      const error = new Error(errorMessage)
+      // Callers that understand an error body (e.g. the bundle's 503) can read it
+      error.status = response.status
+      error.body = errorJson
+      throw error
     }
 
     return await response.json()
@@ -198,13 +206,54 @@ export const sendAudioChunk = async (audioBlob, sessionId) => {
   }
 }
 
+/**
+ * Poll a background job until it finishes
+ * @param {string} jobId - Job ID returned with a 202 response
+ * @param {function} onProgress - Optional callback receiving each job status (stages, partial result)
+ * @param {number} interval - Poll interval in ms
+ * @param {number} timeout - Give up after this many ms
+ * @returns {Promise<object>} The job's result
+ */
+export const waitForJob = async (jobId, onProgress = null, interval = 1000, timeout = 30 * 60 * 1000) => {
+  const deadline = Date.now() + timeout
+  while (Date.now() < deadline) {
+    const job = await apiCall(`/api/jobs/${jobId}`, { method: 'GET' }, 5000)
+    if (onProgress) onProgress(job)
+    if (job.status === 'succeeded') return job.result
+    if (job.status === 'failed') throw new Error(job.error || 'Job failed')
+    await new Promise(resolve => setTimeout(resolve, interval))
+  }
+  throw new Error('Timed out waiting for the backend to finish processing')
+}
+
+/**
+ * Start an LLM generation as a background job and wait for its result
+ * (the server holds no thread while the model works)
+ * @param {string} endpoint - Generation endpoint
+ * @param {object} body - Request body
+ * @returns {Promise<object>} The endpoint's usual response body
+ */
+const generateAsync = async (endpoint, body) => {
+  const accepted = await apiCall(endpoint, {
+    method: 'POST',
+    headers: { 'Prefer': 'respond-async' },
+    body: JSON.stringify(body),
+  }, 10000)
+  return accepted.jobId ? waitForJob(accepted.jobId, null, 1000, 5 * 60 * 1000) : accepted
+}
+
 /**
  * Stop engagement monitoring and process audio
+ *
+ * The backend answers 202 with a job id and processes the recording in the
+ * background; this resolves once the job has finished, with its result.
  * @param {string} sessionId - Session ID
  * @param {Blob} audioBlob - Final audio recording (if not streamed)
+ * @param {function} onProgress - Optional callback receiving job status updates
  * @returns {Promise<{sessionId: string, engagementData: object, transcript: object}>}
  */
-export const stopEngagementSession = async (sessionId, audioBlob = null) => {
+export const stopEngagementSession = async (sessionId, audioBlob = null, onProgress = null) => {
+  let accepted
   if (audioBlob) {
     // Send audio file if provided
     const formData = new FormData()
@@ -214,7 +263,7 @@ export const stopEngagementSession = async (sessionId, audioBlob = null) => {
     formData.append('session_id', sessionId)
 
     const controller = new AbortController()
-    const timeoutId = setTimeout(() => controller.abort(), 30000) // 30s for audio processing
+    const timeoutId = setTimeout(() => controller.abort(), 30000) // 30s for the upload
 
     try {
       const response = await fetch(`${getApiUrl()}/api/engagement/stop`, {
@@ -229,21 +278,43 @@ export const stopEngagementSession = async (sessionId, audioBlob = null) => {
         throw new Error(`HTTP error! status: ${response.status}`)
       }
 
-      return await response.json()
+      accepted = await response.json()
     } catch (error) {
       clearTimeout(timeoutId)
       if (error.name === 'AbortError') {
-        throw new Error('Request timeout - audio processing may take longer')
+        throw new Error('Request timeout - audio upload may take longer')
       }
       throw error
     }
   } else {
     // Just stop the session
-    return apiCall('/api/engagement/stop', {
+    accepted = await apiCall('/api/engagement/stop', {
       method: 'POST',
       body: JSON.stringify({ session_id: sessionId }),
     }, 10000)
   }
+
+  // Audio conversion, transcription and summaries run as a background job
+  return accepted.jobId ? waitForJob(accepted.jobId, onProgress) : accepted
+}
+
+/**
+ * Follow live engagement scores pushed by the backend (Server-Sent Events)
+ * instead of polling getCurrentEngagement. EventSource reconnects on its own
+ * and resumes after the last received event.
+ * @param {string} sessionId - Session ID
+ * @param {function} onScores - Called with {scores, state, emotion, confidence, timestamp, seq}
+ * @param {function} onEnd - Optional, called when the session stops
+ * @returns {function} Call to unsubscribe
+ */
+export const subscribeToEngagement = (sessionId, onScores, onEnd = null) => {
+  const source = new EventSource(`${getApiUrl()}/api/engagement/stream/${sessionId}`)
+  source.addEventListener('scores', (event) => onScores(JSON.parse(event.data)))
+  source.addEventListener('end', () => {
+    source.close()
+    if (onEnd) onEnd()
+  })
+  return () => source.close()
 }
 
 /**
@@ -278,10 +349,7 @@ export const getEngagementData = async (sessionId) => {
  * @returns {Promise<object>} Lecture summary matching lectureSummaryData.js format
  */
 export const generateLectureSummary = async (sessionId) => {
-  return apiCall('/api/lecture/summary', {
-    method: 'POST',
-    body: JSON.stringify({ session_id: sessionId }),
-  }, 30000) // 30s timeout for AI generation
+  return generateAsync('/api/lecture/summary', { session_id: sessionId })
 }
 
 /**
@@ -290,10 +358,7 @@ export const generateLectureSummary = async (sessionId) => {
  * @returns {Promise<object>} MCQ data matching mcqData.js format
  */
 export const generateMCQs = async (sessionId) => {
-  return apiCall('/api/lecture/mcqs', {
-    method: 'POST',
-    body: JSON.stringify({ session_id: sessionId }),
-  }, 30000) // 30s timeout for AI generation
+  return generateAsync('/api/lecture/mcqs', { session_id: sessionId })
 }
 
 /**
@@ -307,13 +372,10 @@ export const generateMCQs = async (sessionId) => {
  * @returns {Promise<object>} User report matching userReportData.js format
  */
 export const generateUserReport = async (sessionId, mcqResults = []) => {
-  return apiCall('/api/report/generate', {
-    method: 'POST',
-    body: JSON.stringify({ 
-      session_id: sessionId,
-      mcq_results: mcqResults,
-    }),
-  }, 30000) // 30s timeout for AI generation
+  return generateAsync('/api/report/generate', {
+    session_id: sessionId,
+    mcq_results: mcqResults,
+  })
 }
 
 /**
@@ -327,13 +389,53 @@ export const generateUserReport = async (sessionId, mcqResults = []) => {
  * @returns {Promise<object>} Study plan matching studyPlanData.js format
  */
 export const generateStudyPlan = async (sessionId, mcqResults = []) => {
-  return apiCall('/api/plan/generate', {
-    method: 'POST',
-    body: JSON.stringify({ 
-      session_id: sessionId,
-      mcq_results: mcqResults,
-    }),
-  }, 30000) // 30s timeout for AI generation
+  return generateAsync('/api/plan/generate', {
+    session_id: sessionId,
+    mcq_results: mcqResults,
+  })
+}
+
+/**
+ * Generate several post-lecture artifacts in one request. The backend starts
+ * them concurrently and answers at once (Prefer: respond-async) with stored
+ * artifacts and job ids; each job is then followed until it completes.
+ * If the LLM queue fills up part-way (503), the jobs that did start are still
+ * followed and the artifacts that did not are returned as {error}.
+ * @param {string} sessionId - Session ID
+ * @param {object} options - {mcqResults, artifacts: subset of
+ *   ['lecture_summary', 'mcqs', 'user_report', 'study_plan'], refresh}
+ * @param {function} onArtifact - Called with (artifact, data) as each one completes
+ * @returns {Promise<object>} All artifacts by name; failed ones are {error}
+ */
+export const generateBundle = async (sessionId, { mcqResults = [], artifacts, refresh = false } = {}, onArtifact = null) => {
+  let accepted
+  try {
+    accepted = await apiCall('/api/lecture/bundle', {
+      method: 'POST',
+      headers: { 'Prefer': 'respond-async' },
+      body: JSON.stringify({ session_id: sessionId, mcq_results: mcqResults, artifacts, refresh }),
+    }, 10000)
+  } catch (error) {
+    // 503 lists the jobs started before the queue filled up
+    if (error.status !== 503 || !error.body) throw error
+    accepted = error.body
+  }
+
+  const results = {}
+  const done = (artifact, data) => {
+    results[artifact] = data
+    if (onArtifact) onArtifact(artifact, data)
+  }
+  Object.entries(accepted.results || {}).forEach(([artifact, data]) => done(artifact, data))
+  for (const artifact of accepted.notStarted || []) {
+    done(artifact, { error: accepted.error })
+  }
+  await Promise.all(Object.entries(accepted.jobs || {}).map(([artifact, jobId]) =>
+    waitForJob(jobId, null, 1000, 5 * 60 * 1000)
+      .catch((error) => ({ error: error.message }))
+      .then((data) => done(artifact, data))
+  ))
+  return results
 }
 
 /**
@@ -409,6 +511,7 @@ export default {
   sendAudioChunk,
   stopEngagementSession,
   getCurrentEngagement,
+  subscribeToEngagement,
   getEngagementData,
   
   // Lecture
@@ -0,0 +1,254 @@
+"""
+Bulk LLM requests through the Message Batches API, with a resumable checkpoint.
+
+Non-interactive workloads (e.g. backfilling MCQs for a semester of recorded
+lectures) queue their prompts on a ``BatchRunner`` instead of calling
+send_message one segment at a time. The runner submits them as message
+batches, polls until they end and maps every result back by ``custom_id``.
+Progress is written to a JSON checkpoint after every step, so an interrupted
+run resumes without resubmitting requests that are already in flight or done.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+from pathlib import Path
+
+from modules.resilience import llm_caller
+from modules.utils import build_request_params
+
+# API limit is 100,000 requests / 256 MB per batch; stay well below it
+MAX_REQUESTS_PER_BATCH = 10000
+
+_CUSTOM_ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+def make_custom_id(*parts):
+    """
+    Build a valid, deterministic batch ``custom_id`` from arbitrary parts.
+
+    Custom ids must match ``^[A-Za-z0-9_-]{1,64}$``. Parts are slugged;
+    whenever slugging changed them (or the slug is too long) a hash of the
+    original is appended, so e.g. "Week 1.2" and "Week 1,2" stay distinct.
+
+    Args:
+        *parts: Strings or numbers identifying the request
+
+    Returns:
+        custom_id string
+    """
+    raw = '-'.join(str(p) for p in parts)
+    slug = re.sub(r'[^A-Za-z0-9_-]+', '_', raw).strip('_') or 'req'
+    if slug == raw and len(slug) <= 64:
+        return slug
+    digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()[:12]
+    return f"{slug[:51]}-{digest}"
+
+
+class BatchRunner:
+    """
+    Collect message requests, run them as batches and return results by id.
+
+    Example:
+        runner = BatchRunner(client, 'output/backfill_checkpoint.json')
+        runner.add('lec1-q-0', prompt, max_tokens=1000)
+        results = runner.run()      # {'lec1-q-0': {'text': '...'}}
+    """
+
+    def __init__(self, client, checkpoint_path, poll_interval=30.0,
+                 max_requests_per_batch=MAX_REQUESTS_PER_BATCH):
+        """
+        Args:
+            client: Client exposing messages.batches (Anthropic or the stub)
+            checkpoint_path: JSON file used to persist progress
+            poll_interval: Seconds between status polls
+            max_requests_per_batch: Requests per submitted batch
+        """
+        self.client = client
+        self.checkpoint_path = Path(checkpoint_path)
+        self.poll_interval = poll_interval
+        self.max_requests_per_batch = max_requests_per_batch
+        self._pending = {}
+        self.state = self._load_checkpoint()
+
+    def _load_checkpoint(self):
+        if self.checkpoint_path.exists():
+            with open(self.checkpoint_path, 'r') as f:
+                return json.load(f)
+        return {'batches': [], 'results': {}}
+
+    def _save_checkpoint(self):
+        self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.checkpoint_path.with_suffix(self.checkpoint_path.suffix + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _submitted_ids(self):
+        # Unconfirmed submissions (no batch id yet) are settled by _reconcile_unconfirmed
+        return {cid for batch in self.state['batches'] if batch['id'] for cid in batch['custom_ids']}
+
+    def add(self, custom_id, message, model="claude-haiku-4-5", max_tokens=1000,
+            system=None, context=None):
+        """
+        Queue a request unless it already has a result or is in flight.
+
+        Args:
+            custom_id: Unique id (see make_custom_id)
+            message, model, max_tokens, system, context: As for send_message
+
+        Returns:
+            True if the request was queued, False if it is already handled
+        """
+        if not _CUSTOM_ID_RE.match(custom_id):
+            raise ValueError(f"Invalid batch custom_id: {custom_id!r}")
+        if custom_id in self.state['results'] or custom_id in self._submitted_ids():
+            return False
+        self._pending[custom_id] = build_request_params(message, model, max_tokens, system, context)
+        return True
+
+    def submit(self):
+        """
+        Submit queued requests as one or more batches and checkpoint their ids.
+
+        Creating a batch is not idempotent, so it is called exactly once,
+        outside llm_caller's retries and hedging (a second attempt would
+        create and bill a second batch). Each chunk is checkpointed as an
+        unconfirmed submission first; if the call fails, or the process
+        dies before the batch id is recorded, the batch is looked up with
+        batches.list instead of being created again.
+        """
+        items = list(self._pending.items())
+        for i in range(0, len(items), self.max_requests_per_batch):
+            chunk = items[i:i + self.max_requests_per_batch]
+            entry = {
+                'id': None,
+                'custom_ids': [cid for cid, _ in chunk],
+                'status': 'submitting',
+                'collected': False,
+                'submitted_at': time.time(),
+            }
+            self.state['batches'].append(entry)
+            self._save_checkpoint()
+            try:
+                batch = self.client.messages.batches.create(
+                    requests=[{'custom_id': cid, 'params': params} for cid, params in chunk]
+                )
+                entry['id'] = batch.id
+                entry['status'] = batch.processing_status
+            except Exception:
+                # The request may still have created the batch
+                if not self._reconcile(entry):
+                    self.state['batches'].remove(entry)
+                    self._save_checkpoint()
+                    raise
+            for cid, _ in chunk:
+                del self._pending[cid]
+            self._save_checkpoint()
+            print(f"Submitted batch {entry['id']} with {len(chunk)} requests")
+
+    def _reconcile(self, entry):
+        """
+        Find the batch an unconfirmed submission created, if it created one.
+
+        Candidates are batches created since the submission (newest first)
+        that are not tracked yet and hold as many requests; for ended ones
+        the custom_ids are compared as well.
+
+        Returns:
+            True if the batch was found and recorded on ``entry``
+        """
+        known = {b['id'] for b in self.state['batches'] if b['id']}
+        expected = set(entry['custom_ids'])
+        for batch in llm_caller.call(self.client.messages.batches.list, limit=100):
+            # Allow for clock skew between us and the API
+            if batch.created_at.timestamp() < entry['submitted_at'] - 60:
+                break
+            counts = batch.request_counts
+            total = sum(getattr(counts, name, 0) or 0 for name in
+                        ('processing', 'succeeded', 'errored', 'canceled', 'expired'))
+            if batch.id in known or total != len(expected):
+                continue
+            if batch.processing_status == 'ended':
+                ids = {item.custom_id for item in llm_caller.call(self.client.messages.batches.results, batch.id)}
+                if ids != expected:
+                    continue
+            entry['id'] = batch.id
+            entry['status'] = batch.processing_status
+            print(f"Recovered batch {batch.id} of an unconfirmed submission")
+            return True
+        return False
+
+    def _reconcile_unconfirmed(self):
+        """
+        Settle submissions an earlier run left without a batch id.
+
+        Recovered batches are tracked again (and their requests dropped from
+        the queue); submissions that created no batch are forgotten, so
+        their requests are submitted normally.
+        """
+        unconfirmed = [b for b in self.state['batches'] if not b['id']]
+        for entry in unconfirmed:
+            if self._reconcile(entry):
+                for cid in entry['custom_ids']:
+                    self._pending.pop(cid, None)
+            else:
+                self.state['batches'].remove(entry)
+        if unconfirmed:
+            self._save_checkpoint()
+
+    def wait(self):
+        """Poll every uncollected batch until it ends, collecting results as they do."""
+        while True:
+            open_batches = [b for b in self.state['batches'] if b['id'] and not b['collected']]
+            if not open_batches:
+                return
+            for entry in open_batches:
+                batch = llm_caller.call(self.client.messages.batches.retrieve, entry['id'])
+                entry['status'] = batch.processing_status
+                if batch.processing_status == 'ended':
+                    self._collect(entry)
+            self._save_checkpoint()
+            if any(b['id'] and not b['collected'] for b in self.state['batches']):
+                time.sleep(self.poll_interval)
+
+    def _collect(self, entry):
+        for item in llm_caller.call(self.client.messages.batches.results, entry['id']):
+            result = item.result
+            if result.type == 'succeeded':
+                text = ''.join(block.text for block in result.message.content
+                               if getattr(block, 'type', 'text') == 'text')
+                self.state['results'][item.custom_id] = {'text': text}
+            else:
+                error = getattr(result, 'error', None)
+                self.state['results'][item.custom_id] = {
+                    'error': result.type,
+                    'detail': str(getattr(error, 'error', error) or '')
+                }
+        entry['collected'] = True
+        print(f"Collected results of batch {entry['id']}")
+
+    def run(self):
+        """
+        Submit pending requests, wait for all batches and return every result.
+
+        Returns:
+            Dict custom_id -> {'text': str} or {'error': str, 'detail': str}
+        """
+        self._reconcile_unconfirmed()
+        if self._pending:
+            self.submit()
+        self.wait()
+        return self.state['results']
+
+    def forget_errors(self):
+        """Drop errored results so the next add/run retries those requests."""
+        failed = {cid for cid, r in self.state['results'].items() if 'error' in r}
+        for cid in failed:
+            del self.state['results'][cid]
+        for entry in self.state['batches']:
+            entry['custom_ids'] = [cid for cid in entry['custom_ids'] if cid not in failed]
+        self._save_checkpoint()
+        return len(failed)
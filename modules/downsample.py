@@ -0,0 +1,150 @@
+"""
+Shape-preserving downsampling of engagement timelines for charts.
+
+A chart a few hundred pixels wide cannot show thousands of samples, so the
+timeline endpoints can return about ``points`` samples instead:
+
+    lttb    Largest-Triangle-Three-Buckets: keeps the samples that carry the
+            visual shape (peaks, dips, turns) of each series
+    minmax  keeps the minimum and maximum sample of every bucket, so no
+            spike is lost
+    mean    one averaged sample per bucket (smooths noise)
+
+lttb and minmax return real samples; mean returns one synthetic sample per
+bucket (non-averaged columns take the bucket's first sample). Everything is
+computed with bucket-wise NumPy reductions, no per-sample Python loop.
+"""
+
+import numpy as np
+
+
+DOWNSAMPLE_METHODS = ('lttb', 'minmax', 'mean')
+
+
+def bucket_edges(n, buckets, first=0, last=None):
+    """
+    Split rows [first, last) into at most ``buckets`` contiguous, non-empty buckets.
+
+    Returns:
+        Sorted int array of bucket start rows, ending with ``last``
+    """
+    last = n if last is None else last
+    edges = np.linspace(first, last, max(1, buckets) + 1).astype(np.int64)
+    return np.unique(edges)
+
+
+def _first_argmax(values, edges):
+    """Row index of the (first) maximum of ``values`` within each bucket."""
+    starts = edges[:-1]
+    best = np.maximum.reduceat(values[:edges[-1]], starts)
+    bucket = np.repeat(np.arange(len(starts)), np.diff(edges))
+    hits = np.flatnonzero(values[edges[0]:edges[-1]] == best[bucket]) + edges[0]
+    _, first = np.unique(bucket[hits - edges[0]], return_index=True)
+    return hits[first]
+
+
+def lttb_indices(x, y, points):
+    """
+    Pick about ``points`` samples of one series with Largest-Triangle-Three-Buckets.
+
+    The first and last samples are always kept; every bucket in between keeps
+    the sample forming the largest triangle with its neighbouring buckets.
+    This is the vectorised LTTB variant that anchors each triangle on the
+    means of the previous and next buckets, so all buckets are scored at once.
+
+    Args:
+        x: Sample positions (e.g. epoch seconds), increasing
+        y: Sample values (NaN is treated as 0)
+        points: Target number of samples (>= 3)
+
+    Returns:
+        Sorted int array of selected row indices
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    n = len(y)
+    if points >= n or n <= 2:
+        return np.arange(n)
+
+    edges = bucket_edges(n, points - 2, first=1, last=n - 1)
+    starts = edges[:-1]
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[:edges[-1]], starts) / counts
+    mean_y = np.add.reduceat(y[:edges[-1]], starts) / counts
+    # Neighbour anchors: the previous/next bucket means, or the fixed end points
+    prev_x = np.concatenate([[x[0]], mean_x[:-1]])
+    prev_y = np.concatenate([[y[0]], mean_y[:-1]])
+    next_x = np.concatenate([mean_x[1:], [x[-1]]])
+    next_y = np.concatenate([mean_y[1:], [y[-1]]])
+
+    bucket = np.repeat(np.arange(len(starts)), counts)
+    rows = slice(edges[0], edges[-1])
+    area = np.abs((prev_x[bucket] - next_x[bucket]) * (y[rows] - prev_y[bucket])
+                  - (prev_x[bucket] - x[rows]) * (next_y[bucket] - prev_y[bucket]))
+    area_full = np.zeros(n)
+    area_full[rows] = area
+    return np.concatenate([[0], _first_argmax(area_full, edges), [n - 1]])
+
+
+def minmax_indices(y, points):
+    """
+    Keep the minimum and maximum sample of each of ``points // 2`` buckets.
+
+    Args:
+        y: Sample values (NaN is treated as 0)
+        points: Target number of samples (>= 2)
+
+    Returns:
+        Sorted int array of selected row indices
+    """
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    n = len(y)
+    if points >= n:
+        return np.arange(n)
+    edges = bucket_edges(n, points // 2)
+    return np.union1d(_first_argmax(y, edges), _first_argmax(-y, edges))
+
+
+def downsample_columns(columns, x, fields, points, method='lttb'):
+    """
+    Downsample a columnar timeline to about ``points`` samples.
+
+    Args:
+        columns: Dict name -> sequence, all of the same length
+        x: Sample positions used by lttb (e.g. epoch seconds)
+        fields: Numeric columns whose shape is preserved (lttb/minmax) or that
+                are averaged (mean); the sample budget is split between them
+        points: Target number of samples
+        method: One of DOWNSAMPLE_METHODS
+
+    Returns:
+        Dict with the same keys as ``columns``, as numpy arrays
+
+    Raises:
+        ValueError: If the method is unknown
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unknown downsampling method {method!r}; use one of {', '.join(DOWNSAMPLE_METHODS)}")
+    arrays = {name: np.asarray(values) for name, values in columns.items()}
+    n = len(x)
+    if points >= n or not fields:
+        return arrays
+
+    if method == 'mean':
+        edges = bucket_edges(n, points)
+        starts = edges[:-1]
+        counts = np.diff(edges)
+        result = {name: values[starts] for name, values in arrays.items()}
+        for field in fields:
+            values = np.nan_to_num(arrays[field].astype(np.float64))
+            result[field] = np.add.reduceat(values, starts) / counts
+        return result
+
+    # Split the budget between the fields and keep the union of their picks
+    budget = max(3, points // len(fields))
+    picks = [
+        lttb_indices(x, arrays[field], budget) if method == 'lttb' else minmax_indices(arrays[field], budget)
+        for field in fields
+    ]
+    rows = np.unique(np.concatenate(picks))
+    return {name: values[rows] for name, values in arrays.items()}
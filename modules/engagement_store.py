@@ -0,0 +1,172 @@
+"""
+Columnar on-disk format for engagement recordings.
+
+A recording is stored as two files next to each other:
+    engagement_<name>_<time>.npy       structured array, one row per sample:
+                                       timestamp (float64 epoch seconds),
+                                       elapsed_seconds and one float32 column
+                                       per score
+    engagement_<name>_<time>.meta.json metadata and summary_statistics
+
+The .npy file is loaded memory-mapped, so opening an archive reads only the
+header; consumers take the columns they need as arrays. The legacy JSON
+layout (metadata / engagement_timeline / summary_statistics) is produced on
+demand for the frontend and older callers.
+
+Timestamps follow the pipeline's wall-clock convention (see
+modules.utils.iso_to_epoch): a sample taken at local time 10:32:26 is stored
+as the epoch of 10:32:26 UTC, so the ISO view shows the local wall clock.
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+
+
+FORMAT_VERSION = 'engagement-columnar/1'
+SCORE_FIELDS = ('concentrated', 'engaged', 'confused', 'bored')
+META_SUFFIX = '.meta.json'
+
+
+def engagement_dtype(score_fields=SCORE_FIELDS):
+    """Structured dtype of one sample row."""
+    return np.dtype([('timestamp', '<f8'), ('elapsed_seconds', '<f4')]
+                    + [(field, '<f4') for field in score_fields])
+
+
+def meta_path(npy_path):
+    """Path of the metadata sidecar belonging to an .npy archive."""
+    npy_path = Path(npy_path)
+    return npy_path.with_name(npy_path.stem + META_SUFFIX)
+
+
+def epoch_to_iso(epochs):
+    """
+    Format epoch seconds as naive ISO strings with microseconds, vectorised.
+
+    Args:
+        epochs: Array of epoch seconds
+
+    Returns:
+        numpy array of ISO 8601 strings (e.g. '2025-11-16T10:32:26.565588')
+    """
+    micros = np.round(np.asarray(epochs, dtype=np.float64) * 1e6).astype('datetime64[us]')
+    return np.datetime_as_string(micros, unit='us')
+
+
+def save_engagement(base_path, metadata, summary_statistics, timestamps, scores, elapsed_seconds=None):
+    """
+    Write a recording in the columnar format.
+
+    Args:
+        base_path: Output path without extension (e.g. data/engagement/engagement_X)
+        metadata: Metadata dict (lecture_name, start_time, ...)
+        summary_statistics: Summary statistics dict
+        timestamps: Sample times as wall-clock epoch seconds
+        scores: Dict score name -> sequence of values, same length as timestamps
+        elapsed_seconds: Seconds since the first sample (default: derived from timestamps)
+
+    Returns:
+        Path of the written .npy file
+    """
+    base_path = Path(base_path)
+    base_path.parent.mkdir(parents=True, exist_ok=True)
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    if elapsed_seconds is None:
+        elapsed_seconds = timestamps - timestamps[0] if len(timestamps) else timestamps
+    score_fields = tuple(scores)
+
+    rows = np.empty(len(timestamps), dtype=engagement_dtype(score_fields))
+    rows['timestamp'] = timestamps
+    rows['elapsed_seconds'] = elapsed_seconds
+    for field in score_fields:
+        rows[field] = scores[field]
+
+    # Append rather than with_suffix: lecture names may contain dots ("Lecture 3.2")
+    npy_path = base_path.with_name(base_path.name + '.npy')
+    np.save(npy_path, rows, allow_pickle=False)
+    with open(meta_path(npy_path), 'w') as f:
+        json.dump({
+            'format': FORMAT_VERSION,
+            'score_fields': list(score_fields),
+            'metadata': metadata,
+            'summary_statistics': summary_statistics,
+        }, f, indent=2)
+    return npy_path
+
+
+class EngagementArchive:
+    """
+    A columnar engagement recording, memory-mapped from disk.
+
+    Example:
+        archive = EngagementArchive('data/engagement/engagement_Test1_2025-11-16_10-32-17.npy')
+        bored = archive.data['bored']            # float32 view, no parsing
+        frame = engagement_frame(archive.columns())
+        payload = archive.to_json()              # legacy JSON layout
+    """
+
+    def __init__(self, path, mmap=True):
+        """
+        Args:
+            path: Path of the .npy file
+            mmap: Memory-map the samples instead of reading them into memory
+        """
+        self.path = Path(path)
+        with open(meta_path(self.path), 'r') as f:
+            meta = json.load(f)
+        self.metadata = meta.get('metadata', {})
+        self.summary_statistics = meta.get('summary_statistics', {})
+        self.score_fields = meta.get('score_fields', list(SCORE_FIELDS))
+        self.data = np.load(self.path, mmap_mode='r' if mmap else None, allow_pickle=False)
+
+    def __len__(self):
+        return len(self.data)
+
+    def columns(self):
+        """
+        Columnar mapping accepted by modules.timeline.engagement_frame.
+
+        Returns:
+            {'timestamp': epoch seconds, 'scores': {name: float32 array}}
+        """
+        return {
+            'timestamp': self.data['timestamp'],
+            'scores': {field: self.data[field] for field in self.score_fields},
+        }
+
+    def timeline(self):
+        """Samples as engagement_timeline records (ISO timestamps, nested scores)."""
+        timestamps = epoch_to_iso(self.data['timestamp']).tolist()
+        elapsed = np.round(self.data['elapsed_seconds'].astype(np.float64), 1).tolist()
+        scores = [np.round(self.data[field].astype(np.float64), 2).tolist() for field in self.score_fields]
+        return [
+            {'timestamp': ts, 'elapsed_seconds': el, 'scores': dict(zip(self.score_fields, values))}
+            for ts, el, values in zip(timestamps, elapsed, zip(*scores))
+        ]
+
+    def to_json(self):
+        """The recording in the legacy JSON layout used by the API and frontend."""
+        return {
+            'metadata': self.metadata,
+            'engagement_timeline': self.timeline(),
+            'summary_statistics': self.summary_statistics,
+        }
+
+
+def read_engagement(path):
+    """
+    Load an engagement recording in the legacy JSON layout, whatever its format.
+
+    Args:
+        path: Path of a columnar .npy archive or of a legacy .json export
+
+    Returns:
+        Dict with metadata, engagement_timeline and summary_statistics
+    """
+    path = Path(path)
+    if path.suffix == '.npy':
+        return EngagementArchive(path).to_json()
+    with open(path, 'r') as f:
+        return json.load(f)
@@ -0,0 +1,251 @@
+"""
+Shared, batched emotion inference for frames sent by remote clients.
+
+Clients post JPEG frames to /api/engagement/frame. Running DeepFace once per
+request would cost a full model call per frame per student. Instead the
+request thread decodes the frame and crops the face (``decode_face``), and
+a single ``BatchedInference`` worker classifies the pending faces of all
+sessions together, in one model call per batch.
+
+    batching      the worker waits up to ``max_delay`` seconds for a batch
+                  to fill, then classifies up to ``max_batch`` faces at once
+    latest wins   a session has at most one pending frame; a newer frame
+                  replaces it (the older one is answered as superseded), so
+                  a busy model never builds a backlog of stale frames
+    routing       each result is handed to the callback submitted with the
+                  frame (the session monitor's record_emotions)
+"""
+
+import os
+import threading
+import time
+import traceback
+
+import numpy as np
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+
+# Output order of DeepFace's facial expression model
+EMOTION_LABELS = ('angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral')
+# The model's input is a FACE_SIZE x FACE_SIZE grayscale face
+FACE_SIZE = 48
+
+# Haar cascades are not safe to share between threads
+_detectors = threading.local()
+
+
+def _face_detector():
+    detector = getattr(_detectors, 'face', None)
+    if detector is None:
+        detector = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        _detectors.face = detector
+    return detector
+
+
+def decode_face(data):
+    """
+    Decode a JPEG frame and crop it to the emotion model's input.
+
+    Uses the largest detected face, or the whole frame when none is found
+    (as DeepFace.analyze does with enforce_detection=False).
+
+    Args:
+        data: Encoded image bytes
+
+    Returns:
+        (FACE_SIZE, FACE_SIZE) float32 grayscale array in [0, 1]
+
+    Raises:
+        RuntimeError: If OpenCV is not installed
+        ValueError: If the bytes are not a decodable image
+    """
+    if cv2 is None:
+        raise RuntimeError("OpenCV (opencv-python) is required to analyse frames")
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise ValueError("Frame is not a decodable image")
+    faces = _face_detector().detectMultiScale(image, scaleFactor=1.1, minNeighbors=5)
+    if len(faces):
+        x, y, w, h = max(faces, key=lambda face: face[2] * face[3])
+        image = image[y:y + h, x:x + w]
+    face = cv2.resize(image, (FACE_SIZE, FACE_SIZE), interpolation=cv2.INTER_AREA)
+    return face.astype(np.float32) / 255.0
+
+
+class EmotionModel:
+    """DeepFace's facial expression model, loaded on first use, classifying whole batches."""
+
+    def __init__(self):
+        self._model = None
+
+    def _load(self):
+        if self._model is None:
+            from deepface import DeepFace
+            try:
+                client = DeepFace.build_model(model_name='Emotion', task='facial_attribute')
+            except TypeError:
+                # deepface < 0.0.90 has no task argument
+                client = DeepFace.build_model('Emotion')
+            # Newer deepface wraps the Keras model in a client object
+            self._model = getattr(client, 'model', client)
+        return self._model
+
+    def __call__(self, faces):
+        """
+        Classify a batch of faces from decode_face.
+
+        Returns:
+            List of (emotions, dominant_emotion) per face; emotions maps each
+            label to a percentage, like DeepFace.analyze's 'emotion'
+        """
+        batch = np.stack(faces)[..., np.newaxis]
+        predictions = np.asarray(self._load().predict(batch, verbose=0))
+        results = []
+        for row in predictions:
+            total = float(row.sum()) or 1.0
+            emotions = {label: float(100 * p / total) for label, p in zip(EMOTION_LABELS, row)}
+            results.append((emotions, max(emotions, key=emotions.get)))
+        return results
+
+
+class PendingFrame:
+    """A frame waiting for classification. Resolved by the inference worker."""
+
+    def __init__(self, session_id, face, on_result):
+        self.session_id = session_id
+        self.face = face
+        self.on_result = on_result
+        self.submitted_at = time.monotonic()
+        self.emotions = None
+        self.dominant_emotion = None
+        self.error = None
+        self.superseded = False
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        """Block until the frame is classified or superseded; returns False on timeout."""
+        return self._done.wait(timeout)
+
+
+class BatchedInference:
+    """One worker classifying the pending frames of every session in batches."""
+
+    def __init__(self, classify, max_batch=16, max_delay=0.05):
+        """
+        Args:
+            classify: Callable(list of faces) -> list of (emotions, dominant_emotion)
+            max_batch: Most faces per model call
+            max_delay: Seconds the oldest pending frame may wait for the batch to fill
+        """
+        self.classify = classify
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread = None
+        self._stats = {'batches': 0, 'frames': 0, 'superseded': 0, 'failed': 0}
+
+    def submit(self, session_id, face, on_result):
+        """
+        Queue a session's face for the next batch.
+
+        Args:
+            session_id: Session the frame belongs to
+            face: Array from decode_face
+            on_result: Callable(emotions, dominant_emotion), called by the worker
+
+        Returns:
+            PendingFrame to wait on
+        """
+        frame = PendingFrame(session_id, face, on_result)
+        with self._cond:
+            previous = self._pending.get(session_id)
+            # Replacing keeps the session's place in the queue
+            self._pending[session_id] = frame
+            if previous is not None:
+                self._stats['superseded'] += 1
+            self._cond.notify()
+        if previous is not None:
+            previous.superseded = True
+            previous._done.set()
+        return frame
+
+    def stats(self):
+        """Counters for /api/metrics."""
+        with self._cond:
+            stats = dict(self._stats, pending=len(self._pending))
+        stats['mean_batch_size'] = round(stats['frames'] / stats['batches'], 2) if stats['batches'] else None
+        return stats
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending and not self._stop:
+                self._cond.wait()
+            if self._stop:
+                return None
+            # Give other sessions' frames a moment to join the batch
+            deadline = min(frame.submitted_at for frame in self._pending.values()) + self.max_delay
+            while len(self._pending) < self.max_batch and not self._stop:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            session_ids = list(self._pending)[:self.max_batch]
+            return [self._pending.pop(session_id) for session_id in session_ids]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                results = self.classify([frame.face for frame in batch])
+            except Exception as e:
+                print(f"⚠️  Emotion inference failed for a batch of {len(batch)}: {e}")
+                traceback.print_exc()
+                results = [None] * len(batch)
+                for frame in batch:
+                    frame.error = str(e)
+            for frame, result in zip(batch, results):
+                if result is not None:
+                    frame.emotions, frame.dominant_emotion = result
+                    try:
+                        frame.on_result(frame.emotions, frame.dominant_emotion)
+                    except Exception as e:
+                        frame.error = str(e)
+                frame._done.set()
+            with self._cond:
+                self._stats['batches'] += 1
+                self._stats['frames'] += len(batch)
+                self._stats['failed'] += sum(1 for frame in batch if frame.error)
+
+    def start(self):
+        """Start the worker in a daemon thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='emotion-inference', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the worker; frames still pending are not classified."""
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+
+
+def inference_from_env(classify=None):
+    """
+    BatchedInference configured from the environment.
+
+    INFERENCE_BATCH_SIZE (default 16), INFERENCE_MAX_DELAY (seconds, default 0.05)
+    """
+    return BatchedInference(
+        classify or EmotionModel(),
+        max_batch=int(os.getenv('INFERENCE_BATCH_SIZE', '16')),
+        max_delay=float(os.getenv('INFERENCE_MAX_DELAY', '0.05')),
+    )
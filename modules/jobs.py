@@ -0,0 +1,260 @@
+"""
+Background jobs for long-running request work.
+
+A request that would hold a server thread for minutes (e.g. stopping a
+session: audio conversion, transcription, summarisation) submits a job
+instead and returns ``202 Accepted`` with the job id. The job runs on a
+bounded worker pool as a sequence of named stages; each stage records its
+status, progress and duration, and stages may publish partial results,
+so clients can poll ``/api/jobs/<id>`` and show progress.
+"""
+
+import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class Job:
+    """State of one background job. Updated by its worker, read by pollers."""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+    def __init__(self, kind, stages=(), metadata=None):
+        """
+        Args:
+            kind: Job type, e.g. 'engagement_stop'
+            stages: Names of the stages the job will run, in order
+            metadata: Extra JSON-serialisable info shown to pollers (e.g. session_id)
+        """
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.metadata = dict(metadata or {})
+        self.status = self.QUEUED
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.result = {}
+        self.stages = [{'name': name, 'status': 'pending', 'progress': None,
+                        'started_at': None, 'duration_seconds': None} for name in stages]
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._callbacks = []
+
+    @property
+    def finished(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the job has finished; returns False on timeout."""
+        return self._done.wait(timeout)
+
+    def add_done_callback(self, fn):
+        """Call ``fn(job)`` when the job finishes (at once if it already has)."""
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _finish(self):
+        with self._lock:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn(self)
+
+    def _stage(self, name):
+        for stage in self.stages:
+            if stage['name'] == name:
+                return stage
+        stage = {'name': name, 'status': 'pending', 'progress': None,
+                 'started_at': None, 'duration_seconds': None}
+        self.stages.append(stage)
+        return stage
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Run a block as the named stage, recording its status and duration.
+
+        Example:
+            with job.stage('transcribe'):
+                transcript = transcribe(...)
+        """
+        with self._lock:
+            stage = self._stage(name)
+            stage['status'] = 'running'
+            stage['started_at'] = datetime.now().isoformat()
+        started = time.monotonic()
+        try:
+            yield stage
+        except Exception:
+            with self._lock:
+                stage['status'] = 'failed'
+                stage['duration_seconds'] = round(time.monotonic() - started, 3)
+            raise
+        with self._lock:
+            stage['status'] = 'succeeded'
+            stage['progress'] = 1.0
+            stage['duration_seconds'] = round(time.monotonic() - started, 3)
+
+    def skip(self, name, reason=None):
+        """Mark a stage as skipped (e.g. nothing to convert)."""
+        with self._lock:
+            stage = self._stage(name)
+            stage['status'] = 'skipped'
+            if reason:
+                stage['reason'] = reason
+
+    def progress(self, name, done, total):
+        """Record progress of a running stage as done/total."""
+        with self._lock:
+            self._stage(name)['progress'] = round(done / total, 3) if total else None
+
+    def publish(self, **partial):
+        """Expose partial results to pollers before the job finishes."""
+        with self._lock:
+            self.result.update(partial)
+
+    def to_dict(self, include_result=True):
+        """JSON-serialisable snapshot of the job."""
+        with self._lock:
+            data = {
+                'jobId': self.id,
+                'kind': self.kind,
+                'status': self.status,
+                'createdAt': self.created_at,
+                'startedAt': self.started_at,
+                'finishedAt': self.finished_at,
+                'stages': [dict(stage) for stage in self.stages],
+                'error': self.error,
+                **self.metadata,
+            }
+            if include_result:
+                data['result'] = dict(self.result)
+            return data
+
+
+class JobManager:
+    """Run jobs on a bounded thread pool and keep them for polling."""
+
+    def __init__(self, max_workers=2, retention_seconds=3600, name='job'):
+        """
+        Args:
+            max_workers: Jobs run concurrently; further jobs wait in the queue
+            retention_seconds: Finished jobs are forgotten after this long
+            name: Worker thread name prefix
+        """
+        self.max_workers = max_workers
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, job, fn, *args, **kwargs):
+        """
+        Queue ``fn(job, *args, **kwargs)`` to run in the background.
+
+        The function's return value (a dict) is merged into ``job.result``;
+        an exception marks the job failed with its message.
+
+        Returns:
+            The job
+        """
+        self._prune()
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = Job.RUNNING
+        job.started_at = datetime.now().isoformat()
+        try:
+            result = fn(job, *args, **kwargs)
+            if result:
+                job.publish(**result)
+            job.status = Job.SUCCEEDED
+        except Exception as e:
+            print(f"❌ Job {job.id} ({job.kind}) failed: {e}")
+            traceback.print_exc()
+            job.error = str(e)
+            job.status = Job.FAILED
+        finally:
+            job.finished_at = datetime.now().isoformat()
+            job.finished_monotonic = time.monotonic()
+            job._finish()
+
+    def get(self, job_id):
+        """Return the job with this id, or None."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active(self, kind=None, **metadata):
+        """Queued or running jobs, optionally filtered by kind and metadata values."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job for job in jobs
+                if job.status in (Job.QUEUED, Job.RUNNING)
+                and (kind is None or job.kind == kind)
+                and all(job.metadata.get(k) == v for k, v in metadata.items())]
+
+    def pending(self):
+        """Number of jobs queued or running."""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.status in (Job.QUEUED, Job.RUNNING))
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.retention_seconds
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if getattr(job, 'finished_monotonic', None) is not None
+                       and job.finished_monotonic < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+
+def as_completed(jobs, timeout=None):
+    """
+    Yield jobs as they finish, like concurrent.futures.as_completed.
+
+    Args:
+        jobs: Jobs to wait for
+        timeout: Seconds to wait for all of them (None for no limit)
+
+    Raises:
+        TimeoutError: If some jobs are still unfinished after ``timeout``
+    """
+    jobs = list(jobs)
+    finished = queue.Queue()
+    for job in jobs:
+        job.add_done_callback(finished.put)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for _ in jobs:
+        remaining = None if deadline is None else max(0, deadline - time.monotonic())
+        try:
+            yield finished.get(timeout=remaining)
+        except queue.Empty:
+            raise TimeoutError(f"{sum(not job.finished for job in jobs)} of {len(jobs)} jobs unfinished")
+
+
+def manager_from_env():
+    """JobManager sized by JOB_WORKERS (default 2) and JOB_RETENTION_SECONDS (3600)."""
+    return JobManager(
+        max_workers=int(os.getenv('JOB_WORKERS', '2')),
+        retention_seconds=float(os.getenv('JOB_RETENTION_SECONDS', '3600')),
+    )
+
+
+# Shared by every endpoint in the process
+job_manager = manager_from_env()
@@ -0,0 +1,334 @@
+"""
+Tolerant, incremental extraction of JSON values from LLM output.
+
+Claude does not always return bare JSON: answers can start with a prose
+preamble, wrap the payload in a markdown fence, leave trailing commas, use
+Python literals, or be cut off by ``max_tokens``. The helpers here scan for
+the first balanced JSON value (optionally of an expected type, so a
+bracketed citation in the preamble is not mistaken for the answer), repair
+the common defects and can be fed a token stream so parsing completes as
+soon as the outermost value closes.
+"""
+
+import json
+import re
+
+_OPENERS = {'{': '}', '[': ']'}
+_CLOSERS = {'}', ']'}
+_PY_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+_JSON_LITERALS = ('true', 'false', 'null')
+_PARTIAL_WORD = re.compile(r'[A-Za-z]+$')
+_PARTIAL_NUMBER = re.compile(r'(^|[\s:,\[])-?\d*\.?\d*[eE]?[+-]?$')
+
+
+class JSONStreamExtractor:
+    """
+    Incrementally locate the first complete JSON object or array in text.
+
+    Text is pushed with ``feed``; scanning only looks at characters it has not
+    seen yet, so feeding a response token by token costs O(total length).
+    Once the outermost value closes and parses, ``done`` is set and ``value``
+    holds the result. ``finish`` repairs and parses a truncated value.
+    With ``expect`` set (e.g. ``dict``), values of another type are skipped.
+
+    Example:
+        extractor = JSONStreamExtractor(expect=dict)
+        for chunk in text_stream:
+            if extractor.feed(chunk):
+                break
+        data = extractor.finish()
+    """
+
+    def __init__(self, expect=None):
+        """
+        Args:
+            expect: Optional type (or tuple of types) the value must have,
+                    e.g. dict to ignore a "[1]" before the object
+        """
+        self.expect = expect
+        self._text = ''
+        self._pos = 0
+        self._start = None
+        self._depth = 0
+        self._quote = None
+        self._escape = False
+        self.done = False
+        self.value = None
+
+    def feed(self, chunk):
+        """
+        Add text and scan it.
+
+        Args:
+            chunk: Next piece of the response text
+
+        Returns:
+            True once a complete JSON value has been parsed, False otherwise
+        """
+        if self.done or not chunk:
+            return self.done
+        self._text += chunk
+        self._scan()
+        return self.done
+
+    def finish(self):
+        """
+        Return the parsed value, repairing a truncated tail if necessary.
+
+        Returns:
+            Parsed JSON object (dict or list)
+
+        Raises:
+            json.JSONDecodeError: If no JSON value (of the expected type) can
+                be recovered
+        """
+        if self.done:
+            return self.value
+        if self._start is None:
+            # No container found: fall back to the whole text (e.g. a bare string)
+            return self._checked(json.loads(self._text.strip(), strict=False))
+        candidate = self._text[self._start:]
+        self.value = self._checked(json.loads(repair_json(candidate), strict=False))
+        self.done = True
+        return self.value
+
+    def _checked(self, value):
+        if self.expect is not None and not isinstance(value, self.expect):
+            raise json.JSONDecodeError(
+                f"Expected a JSON value of type {_type_names(self.expect)}, got {type(value).__name__}",
+                self._text, self._start or 0)
+        return value
+
+    def _scan(self):
+        text = self._text
+        i = self._pos
+        n = len(text)
+        while i < n:
+            ch = text[i]
+            if self._start is None:
+                if ch in _OPENERS:
+                    self._start = i
+                    self._depth = 1
+                i += 1
+                continue
+            if self._quote:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == self._quote:
+                    self._quote = None
+            elif ch == '"' or (ch == "'" and not _is_word_char(text, i - 1)):
+                self._quote = ch
+            elif ch in _OPENERS:
+                self._depth += 1
+            elif ch in _CLOSERS:
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = text[self._start:i + 1]
+                    try:
+                        value = json.loads(repair_json(candidate), strict=False)
+                    except json.JSONDecodeError:
+                        # Balanced but not JSON (e.g. "[note]" in a preamble): keep looking
+                        i = self._start + 1
+                        self._reset_candidate()
+                        continue
+                    if self.expect is not None and not isinstance(value, self.expect):
+                        # Valid JSON of the wrong type (e.g. a "[1]" citation): skip it
+                        i += 1
+                        self._reset_candidate()
+                        continue
+                    self.value = value
+                    self.done = True
+                    self._pos = i + 1
+                    return
+            i += 1
+        self._pos = i
+
+    def _reset_candidate(self):
+        self._start = None
+        self._depth = 0
+        self._quote = None
+        self._escape = False
+
+
+def _type_names(expect):
+    types = expect if isinstance(expect, tuple) else (expect,)
+    return ' or '.join(t.__name__ for t in types)
+
+
+def _is_word_char(text, i):
+    """True if text[i] is a letter or digit (so an apostrophe is inside a word)."""
+    return 0 <= i < len(text) and text[i].isalnum()
+
+
+def repair_json(text):
+    """
+    Repair common defects in a JSON fragment produced by an LLM.
+
+    Handles trailing commas, single-quoted strings, Python literals
+    (True/False/None), and truncation: unterminated strings are closed, a
+    dangling key, comma, colon or partial literal is dropped or nulled, and
+    open containers are closed in order.
+
+    Args:
+        text: JSON text starting at the opening brace or bracket
+
+    Returns:
+        Repaired JSON text (not guaranteed to parse if the input is garbage)
+    """
+    out = []
+    stack = []          # one entry per open container: [closer, expecting_key]
+    quote = None
+    escape = False
+    i = 0
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if quote:
+            if escape:
+                escape = False
+                if ch == "'":
+                    out[-1] = "'"       # \' is not a valid JSON escape
+                else:
+                    out.append(ch)
+            elif ch == '\\':
+                escape = True
+                out.append(ch)
+            elif ch == quote:
+                quote = None
+                out.append('"')
+            elif ch == '"':
+                # Double quote inside a single-quoted string
+                out.append('\\"')
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        if ch == '"' or ch == "'":
+            quote = ch
+            out.append('"')
+        elif ch in _OPENERS:
+            stack.append([_OPENERS[ch], ch == '{'])
+            out.append(ch)
+        elif ch in _CLOSERS:
+            _strip_trailing_comma(out)
+            if stack:
+                stack.pop()
+            out.append(ch)
+            if not stack:
+                break
+        elif ch == ':':
+            if stack:
+                stack[-1][1] = False
+            out.append(ch)
+        elif ch == ',':
+            if stack and stack[-1][0] == '}':
+                stack[-1][1] = True
+            out.append(ch)
+        elif ch.isalpha():
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == '_'):
+                j += 1
+            word = text[i:j]
+            out.append(_PY_LITERALS.get(word, word))
+            i = j
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    if stack or quote:
+        _close_truncated(out, stack, quote)
+    return ''.join(out)
+
+
+def _strip_trailing_comma(out):
+    """Remove a comma (and whitespace after it) at the end of ``out``."""
+    k = len(out) - 1
+    while k >= 0 and out[k].isspace():
+        k -= 1
+    if k >= 0 and out[k] == ',':
+        del out[k:]
+
+
+def _close_truncated(out, stack, quote):
+    """Terminate a value that was cut off mid-stream."""
+    if quote:
+        if out and out[-1] == '\\':
+            out.pop()
+        out.append('"')
+        if stack and stack[-1][0] == '}' and stack[-1][1]:
+            # The truncated string was an object key with no value yet
+            out.append(': null')
+            stack[-1][1] = False
+
+    tail = ''.join(out).rstrip()
+    # Partial literal (``tru``) or number (``1.``, ``-``) at the very end
+    match = _PARTIAL_WORD.search(tail)
+    if match and match.group(0) not in _JSON_LITERALS:
+        if any(lit.startswith(match.group(0).lower()) for lit in _JSON_LITERALS):
+            tail = tail[:match.start()].rstrip()
+    if _PARTIAL_NUMBER.search(tail):
+        tail = tail.rstrip('+-.eE').rstrip()
+
+    if tail.endswith(','):
+        tail = tail[:-1].rstrip()
+    if tail.endswith(':'):
+        tail += ' null'
+    elif stack and stack[-1][0] == '}' and stack[-1][1] and tail.endswith('"'):
+        # Dangling key without a colon: drop it
+        key_start = tail.rfind('"', 0, len(tail) - 1)
+        if key_start != -1:
+            tail = tail[:key_start].rstrip()
+            if tail.endswith(','):
+                tail = tail[:-1].rstrip()
+
+    closers = ''.join(frame[0] for frame in reversed(stack))
+    out[:] = [tail, closers]
+
+
+def extract_json(text, expect=None):
+    """
+    Extract the first JSON object or array from a complete response.
+
+    Args:
+        text: Raw response text (may include prose, fences or be truncated)
+        expect: Optional type (or tuple of types) to look for, e.g. dict;
+                values of other types are skipped
+
+    Returns:
+        Parsed JSON object (dict or list)
+
+    Raises:
+        json.JSONDecodeError: If no JSON value can be recovered
+    """
+    extractor = JSONStreamExtractor(expect)
+    extractor.feed(text)
+    return extractor.finish()
+
+
+def extract_json_from_stream(chunks, expect=None):
+    """
+    Parse JSON from an iterable of text chunks, stopping at the closing brace.
+
+    The iterable is not consumed past the end of the first complete value, so
+    a streaming response can be closed early instead of waiting for trailing
+    prose.
+
+    Args:
+        chunks: Iterable of text pieces (e.g. ``stream.text_stream``)
+        expect: Optional type (or tuple of types) to look for, as for extract_json
+
+    Returns:
+        Parsed JSON object (dict or list)
+
+    Raises:
+        json.JSONDecodeError: If no JSON value can be recovered
+    """
+    extractor = JSONStreamExtractor(expect)
+    for chunk in chunks:
+        if extractor.feed(chunk):
+            break
+    return extractor.finish()
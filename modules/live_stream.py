@@ -0,0 +1,112 @@
+"""
+Push channel for live engagement scores.
+
+Every analysed frame yields a new score snapshot. Instead of clients
+polling /api/engagement/current, the monitor publishes each snapshot to a
+per-session ``ScoreChannel`` and the stream endpoint pushes it as a
+Server-Sent Event.
+
+    sequence numbers   every snapshot gets the next seq (the SSE event id),
+                       so a reconnecting client resumes with Last-Event-ID
+    bounded backlog    a channel keeps only the last ``backlog`` snapshots;
+                       publishing never blocks and never grows memory
+    coalescing         a subscriber that has fallen more than
+                       ``coalesce_after`` snapshots behind (slow consumer,
+                       or resuming past the backlog) gets only the latest
+                       snapshot, with the number it skipped
+    backpressure       subscribers pull at their own pace; a stalled one
+                       holds no queue, it simply coalesces when it reads
+"""
+
+import threading
+from collections import deque
+
+
+class ScoreChannel:
+    """Broadcast of one session's score snapshots."""
+
+    def __init__(self, backlog=256, coalesce_after=32):
+        """
+        Args:
+            backlog: Snapshots kept for resuming subscribers
+            coalesce_after: Subscribers further behind than this get only the latest snapshot
+        """
+        self.seq = 0
+        self.closed = False
+        self.coalesce_after = coalesce_after
+        self._events = deque(maxlen=backlog)
+        self._cond = threading.Condition()
+
+    def publish(self, snapshot):
+        """Append a snapshot and wake waiting subscribers. Returns its seq."""
+        with self._cond:
+            self.seq += 1
+            self._events.append((self.seq, snapshot))
+            self._cond.notify_all()
+            return self.seq
+
+    def close(self):
+        """End the channel; subscribers receive what is left, then stop."""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def latest(self):
+        """(seq, snapshot) of the newest snapshot, or None."""
+        with self._cond:
+            return self._events[-1] if self._events else None
+
+    def wait(self, last_seq, timeout):
+        """
+        Wait for snapshots newer than ``last_seq``.
+
+        Args:
+            last_seq: Sequence number the subscriber has seen (0 for none)
+            timeout: Seconds to wait when nothing is pending
+
+        Returns:
+            List of (seq, snapshot, skipped) tuples in order (empty on
+            timeout or when the channel is closed); ``skipped`` counts the
+            snapshots coalesced away before this one
+        """
+        with self._cond:
+            if self.seq <= last_seq and not self.closed:
+                self._cond.wait(timeout)
+            if self.seq <= last_seq:
+                return []
+            pending = [(seq, snapshot) for seq, snapshot in self._events if seq > last_seq]
+            behind = self.seq - last_seq
+            if behind > len(pending) or behind > self.coalesce_after:
+                seq, snapshot = self._events[-1]
+                return [(seq, snapshot, behind - 1)]
+            return [(seq, snapshot, 0) for seq, snapshot in pending]
+
+
+class LiveScoreHub:
+    """Score channels of all live sessions in this process."""
+
+    def __init__(self, backlog=256, coalesce_after=32):
+        self.backlog = backlog
+        self.coalesce_after = coalesce_after
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def channel(self, session_id, create=True):
+        """The session's channel (created on first use unless create=False)."""
+        with self._lock:
+            channel = self._channels.get(session_id)
+            if channel is None and create:
+                channel = ScoreChannel(self.backlog, self.coalesce_after)
+                self._channels[session_id] = channel
+            return channel
+
+    def publish(self, session_id, snapshot):
+        """Publish a snapshot to the session's channel. Returns its seq."""
+        return self.channel(session_id).publish(snapshot)
+
+    def close(self, session_id):
+        """Close and forget the session's channel (e.g. when recording stops)."""
+        with self._lock:
+            channel = self._channels.pop(session_id, None)
+        if channel is not None:
+            channel.close()
@@ -0,0 +1,476 @@
+"""
+Pluggable LLM backends behind send_message / create_summary.
+
+``get_llm_client`` returns the client selected by the ``LLM_BACKEND``
+environment variable. ``anthropic`` (the default) is the real API; ``stub``
+is a deterministic local stand-in that needs no API key or network and
+returns schema-valid summaries, MCQs, lecture summaries, reports and study
+plans with configurable latency and error rate, so the whole pipeline can be
+run, load-tested and profiled offline.
+
+Stub settings (environment variables):
+    LLM_STUB_LATENCY_MS     median simulated latency per call (default 0)
+    LLM_STUB_LATENCY_SIGMA  log-normal shape of the latency distribution (default 0.5)
+    LLM_STUB_ERROR_RATE     probability a call fails with a 529 overload (default 0)
+    LLM_STUB_SEED           seed mixed into every per-prompt RNG (default 0)
+    LLM_STUB_BATCH_SECONDS  time a message batch stays in progress (default 0)
+
+The stub client is one instance per process (built from these settings on
+first use), so its simulated prompt cache and batches outlive the callers
+that fetch a client per request.
+"""
+
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from anthropic import Anthropic
+
+
+class StubOverloadedError(Exception):
+    """Simulated 529 "overloaded" response from the stub backend."""
+
+    status_code = 529
+
+    def __init__(self, message="Simulated overload from stub LLM backend"):
+        super().__init__(message)
+        self.response = None
+
+
+def _env_float(name, default):
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _prompt_text(messages, system=None):
+    """Flatten system and user content into one string."""
+    parts = []
+    if isinstance(system, str):
+        parts.append(system)
+    elif system:
+        parts.extend(block.get('text', '') for block in system)
+    for message in messages:
+        content = message.get('content', '')
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(block.get('text', '') for block in content if isinstance(block, dict))
+    return "\n".join(parts)
+
+
+def _user_text(messages):
+    return _prompt_text(messages[-1:]) if messages else ''
+
+
+def _content_words(text):
+    """Words of the longest line of the prompt, which is normally the payload."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines:
+        return ['lecture']
+    longest = max(lines, key=len)
+    words = re.findall(r"[A-Za-z][A-Za-z'-]*", longest)
+    return words or ['lecture']
+
+
+def _take(words, n, rng):
+    if len(words) >= n:
+        start = rng.randrange(len(words) - n + 1)
+        return words[start:start + n]
+    return (words * (n // len(words) + 1))[:n]
+
+
+class StubLLMClient:
+    """
+    Deterministic stand-in for ``anthropic.Anthropic``.
+
+    Implements the subset of the client used by this repo:
+    ``messages.create(...)``, ``messages.stream(...)`` and
+    ``messages.batches.create/retrieve/results``. The same prompt
+    always yields the same response (and the same simulated latency draw).
+    """
+
+    def __init__(self, latency_ms=0.0, latency_sigma=0.5, error_rate=0.0, seed=0,
+                 stream_chunk_chars=16, batch_seconds=0.0):
+        """
+        Args:
+            latency_ms: Median simulated latency per call in milliseconds
+            latency_sigma: Log-normal shape parameter (0 = constant latency)
+            error_rate: Probability in [0, 1] that a call raises StubOverloadedError
+            seed: Seed mixed into every per-prompt random generator
+            stream_chunk_chars: Size of text chunks yielded by messages.stream
+            batch_seconds: How long a submitted batch reports 'in_progress'
+        """
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.seed = seed
+        self.stream_chunk_chars = stream_chunk_chars
+        self.batch_seconds = batch_seconds
+        self.messages = _StubMessages(self)
+        self._cached_prefixes = set()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            latency_ms=_env_float('LLM_STUB_LATENCY_MS', 0.0),
+            latency_sigma=_env_float('LLM_STUB_LATENCY_SIGMA', 0.5),
+            error_rate=_env_float('LLM_STUB_ERROR_RATE', 0.0),
+            seed=int(_env_float('LLM_STUB_SEED', 0)),
+            batch_seconds=_env_float('LLM_STUB_BATCH_SECONDS', 0.0),
+        )
+
+    def _rng(self, prompt, salt=''):
+        digest = hashlib.sha256(f"{self.seed}:{salt}:{prompt}".encode('utf-8')).digest()
+        return random.Random(int.from_bytes(digest[:8], 'big'))
+
+    def _simulate_call(self, prompt, timeout=None):
+        """Sleep for the sampled latency and maybe raise a simulated error."""
+        rng = self._rng(prompt, 'latency')
+        latency = 0.0
+        if self.latency_ms > 0:
+            latency = self.latency_ms / 1000 * math.exp(rng.gauss(0, self.latency_sigma))
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"Stub LLM call exceeded its {timeout:.2f}s timeout")
+        if latency:
+            time.sleep(latency)
+        # Errors are drawn from a fresh, unseeded generator so retries can succeed
+        if self.error_rate and random.random() < self.error_rate:
+            raise StubOverloadedError()
+
+    def _usage(self, system, prompt, text):
+        cache_read = 0
+        cache_write = 0
+        if system and not isinstance(system, str) and system[-1].get('cache_control'):
+            prefix = _prompt_text([], system)
+            tokens = len(prefix) // 4
+            if prefix in self._cached_prefixes:
+                cache_read = tokens
+            else:
+                self._cached_prefixes.add(prefix)
+                cache_write = tokens
+        return SimpleNamespace(
+            input_tokens=max(1, len(prompt) // 4 - cache_read - cache_write),
+            output_tokens=max(1, len(text) // 4),
+            cache_read_input_tokens=cache_read,
+            cache_creation_input_tokens=cache_write,
+        )
+
+    def respond(self, messages, system=None):
+        """Return the deterministic response text for a request."""
+        prompt = _prompt_text(messages, system)
+        user = _user_text(messages)
+        rng = self._rng(prompt)
+        words = _content_words(user)
+        builder = _pick_builder(user)
+        if builder is None:
+            return " ".join(_take(words, 8, rng)).capitalize()
+        return json.dumps(builder(words, rng), indent=2)
+
+
+class _StubMessages:
+    def __init__(self, client):
+        self._client = client
+        self.batches = _StubBatches(client)
+
+    def create(self, model=None, max_tokens=None, messages=(), system=None, timeout=None, **kwargs):
+        prompt = _prompt_text(messages, system)
+        self._client._simulate_call(prompt, timeout)
+        text = self._client.respond(messages, system)
+        return SimpleNamespace(
+            id='msg_stub_' + hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:16],
+            model=model,
+            role='assistant',
+            stop_reason='end_turn',
+            content=[SimpleNamespace(type='text', text=text)],
+            usage=self._client._usage(system, prompt, text),
+        )
+
+    def stream(self, model=None, max_tokens=None, messages=(), system=None, timeout=None, **kwargs):
+        response = self.create(model=model, max_tokens=max_tokens, messages=messages,
+                               system=system, timeout=timeout)
+        return _StubStream(response, self._client.stream_chunk_chars)
+
+
+class _StubStream:
+    """Context manager mirroring ``MessageStream``'s ``text_stream``."""
+
+    def __init__(self, response, chunk_chars):
+        self._response = response
+        self._chunk_chars = chunk_chars
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @property
+    def text_stream(self):
+        text = self._response.content[0].text
+        for i in range(0, len(text), self._chunk_chars):
+            yield text[i:i + self._chunk_chars]
+
+    def get_final_message(self):
+        return self._response
+
+
+class _StubBatches:
+    """In-memory Message Batches API: results are computed at submit time."""
+
+    def __init__(self, client):
+        self._client = client
+        self._batches = {}
+
+    def create(self, requests, timeout=None, **kwargs):
+        batch_id = 'msgbatch_stub_' + hashlib.sha1(
+            json.dumps([r['custom_id'] for r in requests]).encode('utf-8')).hexdigest()[:16]
+        results = []
+        for request in requests:
+            params = request['params']
+            messages = params.get('messages', [])
+            system = params.get('system')
+            if self._client.error_rate and random.random() < self._client.error_rate:
+                result = SimpleNamespace(type='errored', error=SimpleNamespace(
+                    type='error', error=SimpleNamespace(type='overloaded_error', message='Simulated overload')))
+            else:
+                text = self._client.respond(messages, system)
+                result = SimpleNamespace(type='succeeded', message=SimpleNamespace(
+                    content=[SimpleNamespace(type='text', text=text)]))
+            results.append(SimpleNamespace(custom_id=request['custom_id'], result=result))
+        self._batches[batch_id] = {'created': time.monotonic(), 'created_at': datetime.now(timezone.utc),
+                                   'results': results}
+        return self.retrieve(batch_id)
+
+    def retrieve(self, batch_id, timeout=None, **kwargs):
+        batch = self._batches[batch_id]
+        ended = time.monotonic() - batch['created'] >= self._client.batch_seconds
+        return SimpleNamespace(
+            id=batch_id,
+            created_at=batch['created_at'],
+            processing_status='ended' if ended else 'in_progress',
+            request_counts=SimpleNamespace(
+                processing=0 if ended else len(batch['results']),
+                succeeded=sum(r.result.type == 'succeeded' for r in batch['results']) if ended else 0,
+                errored=sum(r.result.type == 'errored' for r in batch['results']) if ended else 0,
+            ),
+        )
+
+    def results(self, batch_id, timeout=None, **kwargs):
+        return iter(self._batches[batch_id]['results'])
+
+    def list(self, limit=20, timeout=None, **kwargs):
+        """All batches, newest first (the real API pages through them the same way)."""
+        newest_first = sorted(self._batches, key=lambda batch_id: self._batches[batch_id]['created'], reverse=True)
+        return iter([self.retrieve(batch_id) for batch_id in newest_first])
+
+
+# --- Schema-valid payloads -------------------------------------------------
+
+def _summary(words, rng):
+    return {
+        "5_word_summary": " ".join(_take(words, 5, rng)),
+        "20_word_summary": " ".join(_take(words, 20, rng)),
+    }
+
+
+def _questions(words, rng):
+    questions = {}
+    for i in range(1, 4):
+        options = [f"{chr(65 + j)}. " + " ".join(_take(words, 4, rng)) for j in range(4)]
+        answer = rng.randrange(4)
+        questions[f"question_{i}"] = {
+            "question": "Which statement about " + " ".join(_take(words, 3, rng)) + " is correct?",
+            "options": options,
+            "answer": answer,
+            "explanation": "Option " + chr(65 + answer) + " matches the lecture: " + " ".join(_take(words, 8, rng)),
+        }
+    return questions
+
+
+def _score(rng):
+    return rng.randrange(0, 101)
+
+
+def _lecture_summary(words, rng):
+    sections = []
+    for i in range(rng.randint(2, 4)):
+        sections.append({
+            "title": " ".join(_take(words, 3, rng)).title(),
+            "duration": f"{rng.randint(2, 15)} minutes",
+            "keyPoints": [" ".join(_take(words, 6, rng)) for _ in range(3)],
+            "concepts": [{"term": _take(words, 1, rng)[0], "definition": " ".join(_take(words, 8, rng))}],
+            "examples": [" ".join(_take(words, 5, rng))],
+        })
+    return {
+        "title": "Lecture Summary",
+        "lectureTitle": " ".join(_take(words, 4, rng)).title(),
+        "date": time.strftime('%Y-%m-%d'),
+        "duration": f"{rng.randint(10, 90)} minutes",
+        "instructor": "Unknown",
+        "sections": sections,
+        "overallTakeaways": [" ".join(_take(words, 7, rng)) for _ in range(3)],
+        "nextSteps": [" ".join(_take(words, 5, rng)) for _ in range(2)],
+    }
+
+
+def _level(rng):
+    return rng.choice(["High", "Medium", "Low"])
+
+
+def _report(words, rng):
+    sections = []
+    for i in range(rng.randint(2, 4)):
+        sections.append({
+            "title": " ".join(_take(words, 3, rng)).title(),
+            "duration": f"{rng.randint(2, 15)} minutes",
+            "startTime": f"10:{10 * i:02d}",
+            "endTime": f"10:{10 * i + 9:02d}",
+            "metrics": {k: _score(rng) for k in
+                        ("engagement", "confusion", "focus", "bored", "frustrated", "excited")},
+            "analysis": {
+                "focusLevel": _level(rng),
+                "confusionLevel": _level(rng),
+                "recommendation": " ".join(_take(words, 8, rng)),
+            },
+            "highlights": [" ".join(_take(words, 5, rng)) for _ in range(2)],
+        })
+    return {
+        "title": "Your Learning Report",
+        "lectureTitle": " ".join(_take(words, 4, rng)).title(),
+        "date": time.strftime('%Y-%m-%d'),
+        "overallStats": {
+            "averageEngagement": _score(rng),
+            "averageConfusion": _score(rng),
+            "averageFocus": _score(rng),
+            "totalTime": f"{rng.randint(10, 90)} minutes",
+        },
+        "sections": sections,
+        "insights": [
+            {"type": kind, "title": " ".join(_take(words, 3, rng)).title(),
+             "description": " ".join(_take(words, 10, rng))}
+            for kind in ("strength", "weakness", "improvement")
+        ],
+    }
+
+
+def _plan(words, rng):
+    return {
+        "title": "Post-Lecture Study Plan",
+        "lectureTitle": " ".join(_take(words, 4, rng)).title(),
+        "date": time.strftime('%Y-%m-%d'),
+        "recommendations": [
+            {
+                "topic": " ".join(_take(words, 3, rng)).title(),
+                "priority": _level(rng),
+                "timeEstimate": f"{rng.randint(10, 20)}-{rng.randint(25, 45)} minutes",
+                "activities": [" ".join(_take(words, 5, rng)) for _ in range(2)],
+                "resources": [" ".join(_take(words, 4, rng)) for _ in range(2)],
+            }
+            for _ in range(rng.randint(2, 4))
+        ],
+        "weeklyGoals": [" ".join(_take(words, 6, rng)) for _ in range(2)],
+        "studySchedule": [
+            {"day": day, "tasks": [" ".join(_take(words, 5, rng)) for _ in range(2)]}
+            for day in ("Today", "Tomorrow", "This Week")
+        ],
+    }
+
+
+def _transcript_entry(words, rng):
+    now = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(0))
+    return [{
+        "start_time": now,
+        "end_time": now,
+        "text": " ".join(words),
+        "summary": _summary(words, rng),
+    }]
+
+
+# Checked in order; the first marker found in the user turn picks the payload
+_BUILDERS = (
+    ('question_1', _questions),
+    ('overallStats', _report),
+    ('studySchedule', _plan),
+    ('overallTakeaways', _lecture_summary),
+    ("'start_time'", _transcript_entry),
+    ('5_word_summary', _summary),
+)
+
+
+def _pick_builder(user_text):
+    for marker, builder in _BUILDERS:
+        if marker in user_text:
+            return builder
+    return None
+
+
+# --- Backend registry -------------------------------------------------------
+
+def _anthropic_client():
+    api_key = os.getenv("ANTHROPIC_API_KEY")
+    if not api_key:
+        raise ValueError("ANTHROPIC_API_KEY not found in environment variables. "
+                         "Please set it in .env file, or set LLM_BACKEND=stub to run offline.")
+    # Retries are handled by modules.resilience
+    return Anthropic(api_key=api_key, max_retries=0)
+
+
+_stub_client = None
+_stub_client_lock = threading.Lock()
+
+
+def _shared_stub_client():
+    # Callers build a client per request; the prompt cache must outlive them
+    global _stub_client
+    with _stub_client_lock:
+        if _stub_client is None:
+            _stub_client = StubLLMClient.from_env()
+        return _stub_client
+
+
+LLM_BACKENDS = {
+    'anthropic': _anthropic_client,
+    'stub': _shared_stub_client,
+}
+
+
+def register_backend(name, factory):
+    """
+    Register an additional backend.
+
+    Args:
+        name: Value of LLM_BACKEND that selects it
+        factory: Zero-argument callable returning a client exposing
+                 ``messages.create`` (and ``messages.stream``) like Anthropic's
+    """
+    LLM_BACKENDS[name] = factory
+
+
+def get_llm_client(backend=None):
+    """
+    Create the LLM client for the configured backend.
+
+    The stub backend returns the same process-wide instance on every call.
+
+    Args:
+        backend: Backend name; defaults to the LLM_BACKEND environment variable
+                 or 'anthropic'
+
+    Returns:
+        Client instance
+
+    Raises:
+        ValueError: If the backend is unknown or not configured
+    """
+    name = (backend or os.getenv('LLM_BACKEND') or 'anthropic').lower()
+    if name not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM_BACKEND '{name}'. Available: {', '.join(sorted(LLM_BACKENDS))}")
+    return LLM_BACKENDS[name]()
@@ -0,0 +1,142 @@
+"""
+Fast serialisation and compression of API response bodies.
+
+Engagement timelines, transcripts and stop results run to megabytes of
+JSON. ``dumps`` uses orjson when it is installed (several times faster than
+the json module, and it serialises numpy arrays and scalars natively) and
+falls back to json otherwise. ``FastJSONProvider`` plugs it into Flask so
+every ``jsonify`` benefits.
+
+``negotiate_encoding`` and ``compress`` implement Accept-Encoding
+negotiation (brotli when the brotli module is installed, else gzip) for
+bodies above a size threshold; ``CompressedBodyCache`` keeps the encoded
+bytes of bodies with an ETag, so immutable session artifacts are
+compressed once rather than on every request.
+"""
+
+import gzip
+import json
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from pathlib import Path
+
+import numpy as np
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Bodies smaller than this are sent uncompressed (framing overhead outweighs the gain)
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _default(obj):
+    """Serialise the non-JSON types the pipeline produces."""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Path):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """
+    Serialise to compact JSON bytes.
+
+    Returns:
+        UTF-8 encoded JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data):
+    """Parse JSON from bytes or str."""
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by ``dumps``/``loads``."""
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # Explicit json.dumps options (indent, sort_keys, ...) keep the stdlib path
+            return super().dumps(obj, **kwargs)
+        return dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype=self.mimetype)
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Pick the content coding for a response from the Accept-Encoding header.
+
+    Args:
+        accept_encoding: werkzeug MIMEAccept/Accept for Accept-Encoding
+                         (request.accept_encodings)
+
+    Returns:
+        'br', 'gzip' or None
+    """
+    candidates = (['br'] if brotli is not None else []) + ['gzip']
+    best = accept_encoding.best_match(candidates)
+    return best if best and accept_encoding[best] > 0 else None
+
+
+def compress(body, encoding):
+    """Encode bytes with 'br' or 'gzip'."""
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    raise ValueError(f"Unsupported content coding: {encoding}")
+
+
+class CompressedBodyCache:
+    """
+    Bounded LRU of compressed bodies, keyed by (ETag, encoding).
+
+    A strong ETag identifies the exact body bytes, so entries never go
+    stale: a changed artifact gets a new ETag and the old entry ages out.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compress(self, etag, encoding, body):
+        key = (etag, encoding)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                return cached
+        compressed = compress(body, encoding)
+        with self._lock:
+            self._entries[key] = compressed
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return compressed
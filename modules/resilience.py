@@ -0,0 +1,366 @@
+"""
+Resilience layer for LLM calls: deadlines, retries, hedging and circuit breaking.
+
+Every Claude request goes through a ``ResilientCaller``. A call gets an overall
+deadline, retryable failures (timeouts, connection errors, 429/5xx/529) are
+retried with jittered exponential backoff, a duplicate "hedged" request can be
+fired when the first one is slower than a latency percentile, and a circuit
+breaker fails fast while the upstream keeps failing. All of it is counted so
+the behaviour can be inspected through ``/api/metrics``.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import anthropic
+
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a call is rejected because the circuit breaker is open."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call did not complete within its deadline."""
+
+
+def is_retryable(exc):
+    """
+    Decide whether an exception from the Anthropic SDK is worth retrying.
+
+    Args:
+        exc: Exception raised by the call
+
+    Returns:
+        True for timeouts, connection errors and 408/409/429/5xx/529 responses
+    """
+    if isinstance(exc, (anthropic.APIConnectionError, TimeoutError, ConnectionError)):
+        return True
+    status = getattr(exc, 'status_code', None)
+    return status in RETRYABLE_STATUS_CODES
+
+
+def _retry_after(exc):
+    """Return the server's Retry-After hint in seconds, if any."""
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Jittered exponential backoff ("full jitter")."""
+
+    def __init__(self, max_attempts=4, base_delay=0.5, max_delay=8.0):
+        """
+        Args:
+            max_attempts: Total attempts including the first one
+            base_delay: Backoff cap for the first retry, in seconds
+            max_delay: Upper bound on any single backoff, in seconds
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt, exc=None):
+        """
+        Seconds to sleep before retry number ``attempt`` (1-based).
+
+        A Retry-After header on the error takes precedence, capped at max_delay.
+        """
+        hint = _retry_after(exc) if exc is not None else None
+        if hint is not None:
+            return min(hint, self.max_delay)
+        cap = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, cap)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker with a half-open probe.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls are rejected for ``reset_timeout`` seconds. The first call after
+    that is let through as a probe; its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return True if a call may proceed now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        """Record a failure; returns True if this failure tripped the circuit."""
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or (
+                    self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies."""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, p):
+        """Return the p-th percentile (0-100) of the window, or None if empty."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        k = min(len(samples) - 1, max(0, int(round(p / 100 * (len(samples) - 1)))))
+        return samples[k]
+
+
+class ResilientCaller:
+    """
+    Wrap a callable with a deadline, retries, optional hedging and a breaker.
+
+    The wrapped callable must accept a ``timeout`` keyword (seconds), which is
+    how the Anthropic SDK bounds a single request; it is set to the time left
+    before the overall deadline.
+    """
+
+    def __init__(self, retry_policy=None, breaker=None, deadline=60.0,
+                 hedge_percentile=None, hedge_min_samples=20, max_workers=16):
+        """
+        Args:
+            retry_policy: RetryPolicy instance (default: RetryPolicy())
+            breaker: CircuitBreaker instance (default: CircuitBreaker())
+            deadline: Overall time budget per call in seconds, across retries
+            hedge_percentile: Fire a duplicate request once the first has run
+                longer than this latency percentile (e.g. 95); None disables
+            hedge_min_samples: Latency samples needed before hedging kicks in
+            max_workers: Thread pool size used for hedged requests
+        """
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.deadline = deadline
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.latency = LatencyTracker()
+        self.counters = Counter()
+        self._counter_lock = threading.Lock()
+        self._max_workers = max_workers
+        self._executor = None
+
+    def _count(self, name, n=1):
+        with self._counter_lock:
+            self.counters[name] += n
+
+    def call(self, fn, *args, deadline=None, **kwargs):
+        """
+        Call ``fn(*args, timeout=..., **kwargs)`` resiliently.
+
+        Args:
+            fn: Callable accepting a ``timeout`` keyword
+            deadline: Override the caller's default deadline for this call
+
+        Returns:
+            Whatever ``fn`` returns
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+            DeadlineExceeded: If the deadline passed before a successful attempt
+            Exception: The last error if it is not retryable or attempts ran out
+        """
+        self._count('calls')
+        budget = self.deadline if deadline is None else deadline
+        give_up_at = time.monotonic() + budget
+        last_exc = None
+
+        for attempt in range(1, self.retry_policy.max_attempts + 1):
+            if not self.breaker.allow():
+                self._count('circuit_rejected')
+                raise CircuitOpenError('LLM circuit breaker is open; upstream is unhealthy') from last_exc
+
+            remaining = give_up_at - time.monotonic()
+            if remaining <= 0:
+                self._count('deadline_exceeded')
+                raise DeadlineExceeded(f'LLM call exceeded its {budget:.0f}s deadline') from last_exc
+
+            self._count('attempts')
+            if attempt > 1:
+                self._count('retries')
+            started = time.monotonic()
+            try:
+                result = self._attempt(fn, args, kwargs, remaining)
+            except Exception as e:
+                last_exc = e
+                if isinstance(e, (TimeoutError, anthropic.APITimeoutError)):
+                    self._count('timeouts')
+                retryable = is_retryable(e)
+                if not retryable:
+                    # The upstream answered (e.g. 400); that says nothing about its health
+                    self.breaker.record_success()
+                elif self.breaker.record_failure():
+                    self._count('circuit_trips')
+                if not retryable or attempt == self.retry_policy.max_attempts:
+                    self._count('failures')
+                    raise
+                delay = self.retry_policy.backoff(attempt, e)
+                if time.monotonic() + delay >= give_up_at:
+                    self._count('failures')
+                    self._count('deadline_exceeded')
+                    raise DeadlineExceeded(f'LLM call exceeded its {budget:.0f}s deadline') from e
+                time.sleep(delay)
+                continue
+
+            self.latency.add(time.monotonic() - started)
+            self.breaker.record_success()
+            self._count('successes')
+            return result
+
+        raise last_exc
+
+    def _hedge_delay(self):
+        if self.hedge_percentile is None or len(self.latency) < self.hedge_min_samples:
+            return None
+        return self.latency.percentile(self.hedge_percentile)
+
+    def _attempt(self, fn, args, kwargs, remaining):
+        hedge_after = self._hedge_delay()
+        if hedge_after is None or hedge_after >= remaining:
+            return fn(*args, timeout=remaining, **kwargs)
+
+        with self._counter_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers,
+                                                    thread_name_prefix='llm-hedge')
+        started = time.monotonic()
+        primary = self._executor.submit(fn, *args, timeout=remaining, **kwargs)
+        done, _ = wait([primary], timeout=hedge_after)
+        if done:
+            return primary.result()
+
+        self._count('hedges_fired')
+        left = remaining - (time.monotonic() - started)
+        hedge = self._executor.submit(fn, *args, timeout=max(left, 0.001), **kwargs)
+        pending = {primary, hedge}
+        last_exc = None
+        while pending:
+            left = remaining - (time.monotonic() - started)
+            if left <= 0:
+                break
+            done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_exc = e
+                    continue
+                if future is hedge:
+                    self._count('hedges_won')
+                # The losing request cannot be cancelled mid-flight; it finishes in the pool
+                return result
+        if last_exc is not None:
+            raise last_exc
+        raise DeadlineExceeded('LLM call and its hedge both exceeded the deadline')
+
+    def snapshot(self):
+        """Return counters, breaker state and latency percentiles as a dict."""
+        with self._counter_lock:
+            counters = dict(self.counters)
+        p50 = self.latency.percentile(50)
+        p95 = self.latency.percentile(95)
+        p99 = self.latency.percentile(99)
+        return {
+            'counters': counters,
+            'circuit': {
+                'state': self.breaker.state,
+                'consecutive_failures': self.breaker.failures,
+            },
+            'latency_seconds': {
+                'p50': round(p50, 3) if p50 is not None else None,
+                'p95': round(p95, 3) if p95 is not None else None,
+                'p99': round(p99, 3) if p99 is not None else None,
+                'samples': len(self.latency),
+            },
+            'hedge_percentile': self.hedge_percentile,
+            'deadline_seconds': self.deadline,
+        }
+
+
+def _env_float(name, default):
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def caller_from_env():
+    """
+    Build a ResilientCaller configured from environment variables.
+
+    LLM_DEADLINE_SECONDS (default 60), LLM_MAX_ATTEMPTS (4),
+    LLM_BACKOFF_BASE_SECONDS (0.5), LLM_BACKOFF_MAX_SECONDS (8),
+    LLM_HEDGE_PERCENTILE (unset = no hedging), LLM_BREAKER_FAILURES (5),
+    LLM_BREAKER_RESET_SECONDS (30).
+    """
+    hedge = os.getenv('LLM_HEDGE_PERCENTILE')
+    return ResilientCaller(
+        retry_policy=RetryPolicy(
+            max_attempts=int(_env_float('LLM_MAX_ATTEMPTS', 4)),
+            base_delay=_env_float('LLM_BACKOFF_BASE_SECONDS', 0.5),
+            max_delay=_env_float('LLM_BACKOFF_MAX_SECONDS', 8.0),
+        ),
+        breaker=CircuitBreaker(
+            failure_threshold=int(_env_float('LLM_BREAKER_FAILURES', 5)),
+            reset_timeout=_env_float('LLM_BREAKER_RESET_SECONDS', 30.0),
+        ),
+        deadline=_env_float('LLM_DEADLINE_SECONDS', 60.0),
+        hedge_percentile=float(hedge) if hedge else None,
+    )
+
+
+# Shared by every LLM call in the process
+llm_caller = caller_from_env()
@@ -0,0 +1,164 @@
+"""
+Session lifecycle: TTL expiry, spilling idle sessions out of memory, and
+releasing the recorders of abandoned sessions.
+
+A ``SessionReaper`` thread sweeps the session store periodically:
+
+    spill    sessions without live objects that have not been used for
+             SESSION_SPILL_AFTER seconds leave the in-memory hot cache;
+             their durable fields stay in the database and come back on
+             the next request
+    expire   sessions idle for SESSION_IDLE_TTL seconds, or older than
+             SESSION_MAX_TTL seconds, are deleted from the store. A session
+             that was never stopped has its audio recorder stopped (the
+             audio recorded so far is still written to its WAV file) and
+             its PyAudio handle terminated first
+    orphans  live objects of sessions another process deleted are released
+
+Whenever a session's live objects are released the ``on_release`` hook runs
+too (the API closes the session's live score channel with it).
+
+Files under data/ (audio, engagement archives, transcripts) are kept; only
+the session entries and in-memory state are reclaimed.
+"""
+
+import os
+import threading
+import time
+import traceback
+
+
+def release_live_objects(live):
+    """
+    Stop and release a session's monitor and audio recorder.
+
+    Args:
+        live: Dict of live objects (as returned by SessionStore.pop_live)
+    """
+    recorder = live.get('audio_recorder')
+    if recorder is not None:
+        try:
+            if getattr(recorder, 'is_recording', False):
+                recorder.stop_recording()
+            if hasattr(recorder, 'cleanup'):
+                recorder.cleanup()
+        except Exception as e:
+            print(f"⚠️  Error releasing audio recorder: {e}")
+    monitor = live.get('monitor')
+    if getattr(monitor, 'is_recording', False):
+        monitor.stop_recording()
+    live.clear()
+
+
+class SessionReaper:
+    """Periodically expire, spill and reclaim sessions of a SessionStore."""
+
+    def __init__(self, store, idle_ttl=2 * 3600, max_ttl=24 * 3600, spill_after=600,
+                 interval=60, is_busy=None, on_release=None):
+        """
+        Args:
+            store: The SessionStore to sweep
+            idle_ttl: Delete sessions unused for this many seconds
+            max_ttl: Delete sessions older than this many seconds, used or not
+            spill_after: Drop finished sessions from memory after this many idle seconds
+            interval: Seconds between sweeps
+            is_busy: Optional callable(session_id) -> bool; busy sessions
+                     (e.g. with a running job) are left alone
+            on_release: Optional callable(session_id), run after a session's
+                        live objects are released
+        """
+        self.store = store
+        self.idle_ttl = idle_ttl
+        self.max_ttl = max_ttl
+        self.spill_after = spill_after
+        self.interval = interval
+        self.is_busy = is_busy or (lambda session_id: False)
+        self.on_release = on_release or (lambda session_id: None)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sweep(self):
+        """
+        Run one pass over the store.
+
+        Returns:
+            Dict with the ids of the sessions 'expired', 'spilled' and
+            'released' (orphaned live objects)
+        """
+        now = time.time()
+        report = {'expired': [], 'spilled': [], 'released': []}
+
+        expired = set(self.store.backend.expired(now - self.idle_ttl, now - self.max_ttl))
+        # Live sessions this process hasn't seen a request for are idle too,
+        # even if they were written recently (e.g. by the recorder's owner)
+        for session_id in self.store.live_session_ids():
+            idle = self.store.idle_seconds(session_id)
+            if idle is not None and idle > self.idle_ttl:
+                expired.add(session_id)
+
+        for session_id in expired:
+            if self.is_busy(session_id):
+                continue
+            release_live_objects(self.store.pop_live(session_id))
+            self.on_release(session_id)
+            try:
+                del self.store[session_id]
+            except KeyError:
+                pass
+            report['expired'].append(session_id)
+
+        live = set(self.store.live_session_ids())
+        for session_id in self.store.hot_session_ids():
+            idle = self.store.idle_seconds(session_id)
+            if (session_id not in live and idle is not None and idle > self.spill_after
+                    and not self.is_busy(session_id) and self.store.spill(session_id)):
+                report['spilled'].append(session_id)
+
+        for session_id in live:
+            if session_id not in self.store:
+                release_live_objects(self.store.pop_live(session_id))
+                self.on_release(session_id)
+                self.store.discard(session_id)
+                report['released'].append(session_id)
+
+        if any(report.values()):
+            print(f"🧹 Session sweep: {len(report['expired'])} expired, "
+                  f"{len(report['spilled'])} spilled, {len(report['released'])} released")
+        return report
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"⚠️  Session sweep failed: {e}")
+                traceback.print_exc()
+
+    def start(self):
+        """Start sweeping in a daemon thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='session-reaper', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the sweeping thread."""
+        self._stop.set()
+
+
+def reaper_from_env(store, is_busy=None, on_release=None):
+    """
+    SessionReaper configured from the environment (all values in seconds).
+
+    SESSION_IDLE_TTL (default 7200), SESSION_MAX_TTL (86400),
+    SESSION_SPILL_AFTER (600), SESSION_REAP_INTERVAL (60)
+    """
+    return SessionReaper(
+        store,
+        idle_ttl=float(os.getenv('SESSION_IDLE_TTL', '7200')),
+        max_ttl=float(os.getenv('SESSION_MAX_TTL', '86400')),
+        spill_after=float(os.getenv('SESSION_SPILL_AFTER', '600')),
+        interval=float(os.getenv('SESSION_REAP_INTERVAL', '60')),
+        is_busy=is_busy,
+        on_release=on_release,
+    )
@@ -0,0 +1,413 @@
+"""
+Persistent session storage for the API server.
+
+Sessions used to live in a module-level dict, so a restart lost them and
+only one server process could run. ``SessionStore`` keeps the same
+dict-like interface (``sessions[id]``, ``id in sessions``,
+``session['key'] = value``) on top of three layers:
+
+    SQLite (WAL mode)   durable fields: metadata, engagement data,
+                        transcript, summary, MCQs, report, plan. Shared by
+                        every worker process using the same database file.
+    LRU hot cache       recently used sessions with their decoded fields and
+                        derived per-process caches (alignment, LLM context,
+                        cached responses), bounded by SESSION_CACHE_SIZE.
+    live objects        EngagementMonitor / AudioRecorder instances. They
+                        belong to the process that started the session and
+                        are never written to the database or evicted.
+
+Writes go straight through to SQLite. Every write bumps the session's
+revision; a process that finds a newer revision than the one it has cached
+reloads the session, so workers see each other's updates.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from pathlib import Path
+
+
+# Objects tied to this process: kept until the session is deleted
+LIVE_KEYS = frozenset({'monitor', 'audio_recorder'})
+# Derived from the durable fields and rebuilt on demand; dropped with the hot cache entry
+CACHE_KEYS = frozenset({'engagement_archive', 'alignment', 'llm_context', 'response_cache'})
+
+_MISSING = object()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    revision INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    accessed_at REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS session_fields (
+    session_id TEXT NOT NULL REFERENCES sessions(session_id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (session_id, key)
+);
+"""
+
+
+class SQLiteBackend:
+    """Durable session fields in one SQLite database in WAL mode."""
+
+    def __init__(self, path):
+        """
+        Args:
+            path: Database file (created if missing)
+        """
+        self.path = str(path)
+        if self.path != ':memory:':
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(sessions)')}
+        if 'accessed_at' not in columns:
+            # Databases created before sessions tracked reads
+            conn.execute('ALTER TABLE sessions ADD COLUMN accessed_at REAL NOT NULL DEFAULT 0')
+
+    def _connect(self):
+        # sqlite3 connections can't be shared between threads; keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+        return conn
+
+    def revision(self, session_id):
+        """Current revision of a session, or None if it doesn't exist."""
+        row = self._connect().execute(
+            'SELECT revision FROM sessions WHERE session_id = ?', (session_id,)).fetchone()
+        return row[0] if row else None
+
+    def keys(self, session_id):
+        """Names of the session's stored fields."""
+        rows = self._connect().execute(
+            'SELECT key FROM session_fields WHERE session_id = ?', (session_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    def load(self, session_id, key):
+        """Decoded value of one field, or _MISSING."""
+        row = self._connect().execute(
+            'SELECT value FROM session_fields WHERE session_id = ? AND key = ?', (session_id, key)).fetchone()
+        return json.loads(row[0]) if row else _MISSING
+
+    def save(self, session_id, fields, deleted=()):
+        """
+        Write fields (and delete keys) of a session in one transaction.
+
+        Creates the session if needed.
+
+        Returns:
+            The session's new revision
+        """
+        now = time.time()
+        encoded = [(session_id, key, json.dumps(value, default=str)) for key, value in fields.items()]
+        conn = self._connect()
+        with _transaction(conn):
+            conn.execute(
+                'INSERT INTO sessions (session_id, revision, created_at, updated_at) VALUES (?, 1, ?, ?) '
+                'ON CONFLICT(session_id) DO UPDATE SET revision = revision + 1, updated_at = excluded.updated_at',
+                (session_id, now, now))
+            conn.executemany(
+                'INSERT INTO session_fields (session_id, key, value) VALUES (?, ?, ?) '
+                'ON CONFLICT(session_id, key) DO UPDATE SET value = excluded.value', encoded)
+            conn.executemany(
+                'DELETE FROM session_fields WHERE session_id = ? AND key = ?',
+                [(session_id, key) for key in deleted])
+            return conn.execute('SELECT revision FROM sessions WHERE session_id = ?', (session_id,)).fetchone()[0]
+
+    def delete(self, session_id):
+        """Remove a session and all its fields."""
+        conn = self._connect()
+        with _transaction(conn):
+            conn.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+
+    def touch(self, session_id, when=None):
+        """Record that a session was used (read), for idle expiry."""
+        self._connect().execute('UPDATE sessions SET accessed_at = ? WHERE session_id = ?',
+                                (time.time() if when is None else when, session_id))
+
+    def expired(self, idle_before, created_before):
+        """
+        Sessions last used before ``idle_before`` or created before ``created_before``.
+
+        Args:
+            idle_before: Epoch seconds; sessions neither written nor read since are idle
+            created_before: Epoch seconds; older sessions have outlived the absolute TTL
+        """
+        rows = self._connect().execute(
+            'SELECT session_id FROM sessions WHERE MAX(updated_at, accessed_at) < ? OR created_at < ?',
+            (idle_before, created_before)).fetchall()
+        return [row[0] for row in rows]
+
+    def session_ids(self):
+        """Every stored session id, oldest first."""
+        rows = self._connect().execute('SELECT session_id FROM sessions ORDER BY created_at').fetchall()
+        return [row[0] for row in rows]
+
+    def count(self):
+        """Number of stored sessions."""
+        return self._connect().execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+
+class _transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK on an autocommit connection."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
+
+
+class StoredSession(MutableMapping):
+    """
+    One session, as a dict whose durable fields are written through to the backend.
+
+    Durable fields are loaded on first access and kept decoded; keys in
+    LIVE_KEYS and CACHE_KEYS never leave the process.
+    """
+
+    def __init__(self, store, session_id, revision):
+        self._store = store
+        self.session_id = session_id
+        self.revision = revision
+        self._values = {}
+        self._caches = {}
+        self._lock = threading.RLock()
+
+    @property
+    def _live(self):
+        return self._store._live.setdefault(self.session_id, {})
+
+    def _section(self, key):
+        if key in LIVE_KEYS:
+            return self._live
+        if key in CACHE_KEYS:
+            return self._caches
+        return None
+
+    def __getitem__(self, key):
+        section = self._section(key)
+        if section is not None:
+            return section[key]
+        with self._lock:
+            value = self._values.get(key, _MISSING)
+            if value is _MISSING:
+                value = self._store.backend.load(self.session_id, key)
+                if value is _MISSING:
+                    raise KeyError(key)
+                self._values[key] = value
+            return value
+
+    def __setitem__(self, key, value):
+        self.update({key: value})
+
+    def update(self, other=(), **kwargs):
+        """Set several fields with a single backend write."""
+        fields = dict(other, **kwargs)
+        durable = {}
+        for key, value in fields.items():
+            section = self._section(key)
+            if section is not None:
+                section[key] = value
+            else:
+                durable[key] = value
+        if durable:
+            with self._lock:
+                self.revision = self._store.backend.save(self.session_id, durable)
+                self._values.update(durable)
+
+    def __delitem__(self, key):
+        section = self._section(key)
+        if section is not None:
+            del section[key]
+            return
+        with self._lock:
+            if key not in self:
+                raise KeyError(key)
+            self.revision = self._store.backend.save(self.session_id, {}, deleted=(key,))
+            self._values.pop(key, None)
+
+    def __contains__(self, key):
+        section = self._section(key)
+        if section is not None:
+            return key in section
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        return iter(self._store.backend.keys(self.session_id) + list(self._live) + list(self._caches))
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def drop_caches(self):
+        """Forget decoded fields and derived caches (reloaded/rebuilt on demand)."""
+        with self._lock:
+            self._values.clear()
+            self._caches.clear()
+
+
+class SessionStore(MutableMapping):
+    """
+    Dict-like store of sessions: SQLite for durability, an LRU of hot sessions in front.
+
+    Example:
+        sessions = SessionStore(SQLiteBackend('data/sessions/sessions.sqlite3'))
+        sessions[session_id] = {'lecture_name': 'Intro', 'monitor': monitor}
+        session = sessions[session_id]
+        session['transcript_data'] = transcript     # written through
+    """
+
+    # Reads are recorded in the database at most this often per session
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, backend, cache_size=128):
+        """
+        Args:
+            backend: SQLiteBackend holding the durable fields
+            cache_size: Sessions kept decoded in memory (least recently used are dropped)
+        """
+        self.backend = backend
+        self.cache_size = cache_size
+        self._hot = OrderedDict()
+        self._live = {}
+        self._accessed = {}
+        self._touched = {}
+        self._lock = threading.Lock()
+
+    def _record_access(self, session_id):
+        now = time.time()
+        self._accessed[session_id] = now
+        if now - self._touched.get(session_id, 0) >= self.TOUCH_INTERVAL:
+            self._touched[session_id] = now
+            self.backend.touch(session_id, now)
+
+    def __getitem__(self, session_id):
+        revision = self.backend.revision(session_id)
+        with self._lock:
+            session = self._hot.get(session_id)
+            if revision is None:
+                # Unknown, or deleted by another process; live objects are
+                # left for the reaper to release
+                self._forget(session_id, keep_live=True)
+                raise KeyError(session_id)
+            self._record_access(session_id)
+            if session is None:
+                session = self._remember(StoredSession(self, session_id, revision))
+            elif session.revision != revision:
+                # Updated by another process since we cached it
+                session.drop_caches()
+                session.revision = revision
+            self._hot.move_to_end(session_id)
+            return session
+
+    def __setitem__(self, session_id, fields):
+        """Create (or replace) a session from a dict of fields."""
+        if session_id in self:
+            del self[session_id]
+        revision = self.backend.save(session_id, {})
+        with self._lock:
+            session = self._remember(StoredSession(self, session_id, revision))
+            self._accessed[session_id] = time.time()
+        session.update(fields)
+
+    def _remember(self, session):
+        self._hot[session.session_id] = session
+        while len(self._hot) > self.cache_size:
+            self._hot.popitem(last=False)
+        return session
+
+    def __delitem__(self, session_id):
+        if self.backend.revision(session_id) is None and session_id not in self._live:
+            raise KeyError(session_id)
+        self.backend.delete(session_id)
+        with self._lock:
+            self._forget(session_id)
+
+    def _forget(self, session_id, keep_live=False):
+        self._hot.pop(session_id, None)
+        if not keep_live:
+            self._live.pop(session_id, None)
+        self._accessed.pop(session_id, None)
+        self._touched.pop(session_id, None)
+
+    def __contains__(self, session_id):
+        return self.backend.revision(session_id) is not None
+
+    def __iter__(self):
+        return iter(self.backend.session_ids())
+
+    def __len__(self):
+        return self.backend.count()
+
+    def live_session_ids(self):
+        """Sessions with live objects (monitor, recorder) in this process."""
+        with self._lock:
+            return [sid for sid, live in self._live.items() if live]
+
+    def hot_session_ids(self):
+        """Sessions currently decoded in this process's hot cache."""
+        with self._lock:
+            return list(self._hot)
+
+    def idle_seconds(self, session_id):
+        """Seconds since this process last used the session (None if it never did)."""
+        accessed = self._accessed.get(session_id)
+        return None if accessed is None else time.time() - accessed
+
+    def pop_live(self, session_id):
+        """Detach and return a session's live objects (empty dict if none)."""
+        with self._lock:
+            return self._live.pop(session_id, None) or {}
+
+    def discard(self, session_id):
+        """Drop all of this process's state for a session another process deleted."""
+        with self._lock:
+            self._forget(session_id)
+
+    def spill(self, session_id):
+        """
+        Drop a session from the hot cache.
+
+        Its durable fields stay in the database and are decoded again, and
+        its caches rebuilt, on next use. Live objects are kept.
+        """
+        with self._lock:
+            session = self._hot.pop(session_id, None)
+        if session is not None:
+            session.drop_caches()
+        return session is not None
+
+
+def open_session_store():
+    """
+    SessionStore configured from the environment.
+
+    SESSION_DB: SQLite database path (default data/sessions/sessions.sqlite3);
+                point every worker process at the same file
+    SESSION_CACHE_SIZE: sessions kept in the in-memory hot cache (default 128)
+    """
+    backend = SQLiteBackend(os.getenv('SESSION_DB', 'data/sessions/sessions.sqlite3'))
+    return SessionStore(backend, cache_size=int(os.getenv('SESSION_CACHE_SIZE', '128')))
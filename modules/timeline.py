@@ -0,0 +1,272 @@
+"""
+Vectorised operations on engagement timelines.
+
+The engagement timeline (one sample per analysed frame) and the transcript
+(one entry per audio chunk) are both time series. Functions here work on them
+as arrays instead of looping over rows in Python.
+"""
+
+import numpy as np
+import pandas as pd
+
+from modules.engagement_store import epoch_to_iso
+from modules.utils import TranscriptIndex
+
+
+# Keys of a timeline record that are not emotion scores
+NON_SCORE_KEYS = ('timestamp', 'elapsed_seconds', 'lectureContent', 'segment_id')
+
+
+def parse_timestamps(timestamps):
+    """
+    Parse ISO timestamps (or epoch seconds) into a datetime64 (UTC) Series.
+
+    Naive timestamps are read as UTC, matching modules.utils.iso_to_epoch.
+
+    Args:
+        timestamps: Iterable of ISO 8601 strings, or of epoch seconds
+
+    Returns:
+        pandas Series of dtype datetime64 (UTC)
+    """
+    if isinstance(timestamps, pd.Series) and pd.api.types.is_datetime64_any_dtype(timestamps):
+        return timestamps if timestamps.dt.tz is not None else timestamps.dt.tz_localize('UTC')
+    values = np.asarray(timestamps)
+    if values.dtype.kind in 'fiu':
+        # Round to whole microseconds so float noise doesn't leak into the times
+        micros = np.round(values.astype(np.float64) * 1e6).astype('datetime64[us]')
+        return pd.Series(pd.to_datetime(micros, utc=True))
+    return pd.to_datetime(pd.Series(values, dtype=object), utc=True, format='ISO8601')
+
+
+def timestamps_to_epoch(timestamps):
+    """
+    Convert ISO timestamps to epoch seconds in one vectorised parse.
+
+    Naive timestamps are read as UTC, matching modules.utils.iso_to_epoch.
+
+    Args:
+        timestamps: Iterable of ISO 8601 strings, or a datetime64 Series
+                    (e.g. the 'time' column of engagement_frame)
+
+    Returns:
+        float64 numpy array of seconds since the epoch
+    """
+    parsed = parse_timestamps(timestamps)
+    return (parsed - pd.Timestamp(0, tz='UTC')).dt.total_seconds().to_numpy()
+
+
+def engagement_frame(timeline, score_columns=None, categorical_content=False):
+    """
+    Build a typed DataFrame from an engagement timeline in one pass.
+
+    Replaces the ``df['scores'].apply(pd.Series)`` expansion, which builds a
+    Series per row: every score becomes a float32 column filled straight from
+    the records, and timestamps are parsed once into a datetime64 column.
+
+    Accepts the three shapes the pipeline produces:
+        - engagement_timeline records: {'timestamp', 'elapsed_seconds', 'scores': {...}}
+        - flat records (sentimentTimeline): {'timestamp', 'bored', ..., 'lectureContent'}
+        - columnar mapping: {'timestamp': [...], 'scores': {emotion: [...]},
+          'lectureContent': [...] (optional)}, timestamps as ISO strings or epoch seconds
+
+    Args:
+        timeline: Timeline in one of the shapes above
+        score_columns: Score columns to produce, in order (missing ones are NaN);
+                       default is every score found in the timeline
+        categorical_content: Store lectureContent as a category column
+
+    Returns:
+        DataFrame with 'timestamp' (the original ISO strings), 'time'
+        (datetime64, UTC), one float32 column per score and, when present
+        in the input, 'lectureContent'
+    """
+    if isinstance(timeline, dict):
+        raw_times = timeline.get('timestamp', [])
+        scores = {k: np.asarray(v, dtype=np.float32) for k, v in timeline.get('scores', {}).items()}
+        contents = timeline.get('lectureContent')
+        n = len(raw_times)
+    else:
+        records = timeline if isinstance(timeline, list) else list(timeline)
+        n = len(records)
+        raw_times = [r['timestamp'] for r in records]
+        nested = n > 0 and isinstance(records[0].get('scores'), dict)
+        rows = [r['scores'] for r in records] if nested else records
+        if score_columns is None:
+            # dict.fromkeys keeps first-seen order across all rows
+            keys = dict.fromkeys(k for row in rows for k in row)
+            score_columns = [k for k in keys if nested or k not in NON_SCORE_KEYS]
+        scores = {
+            col: np.fromiter((row.get(col, np.nan) for row in rows), dtype=np.float32, count=n)
+            for col in score_columns
+        }
+        contents = [r.get('lectureContent') for r in records] if n and 'lectureContent' in records[0] else None
+
+    time = parse_timestamps(raw_times)
+    if np.asarray(raw_times).dtype.kind in 'fiu':
+        # Columnar input carries epoch seconds; derive the ISO strings the JSON views expose
+        timestamps = epoch_to_iso(raw_times).astype(object)
+    else:
+        timestamps = np.asarray(raw_times, dtype=object)
+
+    columns = {'timestamp': timestamps, 'time': time.array}
+    for col in (score_columns if score_columns is not None else scores):
+        columns[col] = scores.get(col, np.full(n, np.nan, dtype=np.float32))
+    if contents is not None:
+        columns['lectureContent'] = pd.Categorical(contents) if categorical_content else np.asarray(contents, dtype=object)
+    return pd.DataFrame(columns)
+
+
+def _five_word_summary(entry):
+    summary = entry.get('summary', {})
+    return summary.get('5_word_summary', '') if isinstance(summary, dict) else ''
+
+
+def align_to_transcript(epochs, transcript_index):
+    """
+    Assign every engagement sample to the transcript segment that contains it.
+
+    Uses one ``searchsorted`` over the index's running max of end times plus a
+    start-time check, so the whole timeline is aligned in O((T + S) log S)
+    instead of one overlap scan per sample. The match is the first segment
+    (in original list order, like find_transcripts_for_period) whose
+    [start, end] contains the sample.
+
+    Args:
+        epochs: Sample times as epoch seconds (see timestamps_to_epoch)
+        transcript_index: TranscriptIndex (or list of transcript entries)
+
+    Returns:
+        Tuple of (segment_ids, lecture_contents): an int64 array of original
+        transcript indices (-1 where no segment matches) and an object array
+        with each sample's 5-word summary ('' where unmatched)
+    """
+    if not isinstance(transcript_index, TranscriptIndex):
+        transcript_index = TranscriptIndex(transcript_index)
+    epochs = np.asarray(epochs, dtype=np.float64)
+    n_segments = len(transcript_index)
+    if n_segments == 0:
+        return np.full(len(epochs), -1, dtype=np.int64), np.full(len(epochs), '', dtype=object)
+
+    starts = np.asarray(transcript_index.starts)
+    ends = np.asarray(transcript_index.ends)
+    max_ends = np.asarray(transcript_index.max_ends)
+    order = np.asarray(transcript_index.order, dtype=np.int64)
+
+    if np.all(np.diff(order) > 0):
+        # First segment whose running max end reaches t; it contains t iff it starts by t
+        k = np.searchsorted(max_ends, epochs, side='left')
+        k_clipped = np.minimum(k, n_segments - 1)
+        hit = (k < n_segments) & (starts[k_clipped] <= epochs) & (ends[k_clipped] >= epochs)
+        segment_ids = np.where(hit, order[k_clipped], -1)
+    else:
+        # Transcript is not in time order: paint segments from last to first so
+        # the earliest listed segment wins where several contain a sample
+        segment_ids = np.full(len(epochs), -1, dtype=np.int64)
+        for k in np.argsort(order)[::-1]:
+            segment_ids[(starts[k] <= epochs) & (ends[k] >= epochs)] = order[k]
+
+    # Last slot is the '' used for unmatched samples (segment id -1)
+    summaries = np.array([_five_word_summary(e) for e in transcript_index.entries] + [''], dtype=object)
+    return segment_ids, summaries[segment_ids]
+
+
+def exceedance_runs(scores, thresholds):
+    """
+    Find runs of consecutive samples above threshold for several emotions at once.
+
+    One 2-D comparison gives the exceedance mask of every emotion; the
+    rising and falling edges of each column (via ``np.diff``) are the run
+    boundaries. Runs are returned as row index ranges, so callers slice the
+    timeline directly instead of searching for timestamps.
+
+    Args:
+        scores: Array of shape (samples, emotions); NaN never exceeds
+        thresholds: Sequence of one threshold per emotion column
+
+    Returns:
+        List (one entry per emotion column) of lists of inclusive
+        (start_row, end_row) tuples, in time order
+    """
+    scores = np.asarray(scores)
+    if scores.dtype.kind != 'f':
+        scores = scores.astype(np.float64)
+    n_emotions = len(thresholds)
+    if scores.size == 0:
+        return [[] for _ in range(n_emotions)]
+    # Compare in the scores' own precision: a float32 0.3 must not count as above 0.3
+    mask = scores.reshape(len(scores), n_emotions) > np.asarray(thresholds, dtype=scores.dtype)
+    padded = np.zeros((len(mask) + 2, n_emotions), dtype=np.int8)
+    padded[1:-1] = mask
+    edges = np.diff(padded, axis=0)
+    # Transposed nonzero walks column by column, so each emotion's edges come out in row order
+    start_cols, start_rows = np.nonzero(edges.T == 1)
+    end_cols, end_rows = np.nonzero(edges.T == -1)
+    runs = [[] for _ in range(n_emotions)]
+    for col, start, end in zip(start_cols.tolist(), start_rows.tolist(), (end_rows - 1).tolist()):
+        runs[col].append((start, end))
+    return runs
+
+
+class SessionAlignment:
+    """
+    Engagement samples matched to transcript segments, computed once per session.
+
+    Built when a session stops (or on first use) and shared by every
+    endpoint: the typed engagement frame, each sample's transcript segment,
+    and per-segment aggregate scores, so no request repeats the matching.
+
+    Attributes:
+        frame: engagement_frame of the session's timeline
+        epochs: Sample times as epoch seconds
+        transcript_index: TranscriptIndex over the transcript
+        segment_ids: Per-sample original transcript index (-1 if unmatched)
+        lecture_contents: Per-sample 5-word summary ('' if unmatched)
+        score_columns: Names of the score columns
+        segment_counts: Samples per transcript segment
+        segment_means: Dict score -> mean score per segment (NaN if no samples)
+    """
+
+    def __init__(self, timeline, transcript_data):
+        """
+        Args:
+            timeline: Engagement timeline in any shape engagement_frame accepts
+            transcript_data: List of transcript segments (may be empty)
+        """
+        self.frame = engagement_frame(timeline)
+        self.transcript_index = TranscriptIndex(transcript_data or [], skip_invalid=True)
+        self.epochs = timestamps_to_epoch(self.frame['time'])
+        self.segment_ids, self.lecture_contents = align_to_transcript(self.epochs, self.transcript_index)
+        self.score_columns = [c for c in self.frame.columns if c not in ('timestamp', 'time', 'lectureContent')]
+
+        n_segments = len(self.transcript_index.entries)
+        matched = self.segment_ids >= 0
+        ids = self.segment_ids[matched]
+        self.segment_counts = np.bincount(ids, minlength=n_segments)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.segment_means = {
+                col: np.bincount(ids, weights=np.nan_to_num(self.frame[col].to_numpy()[matched]),
+                                 minlength=n_segments) / self.segment_counts
+                for col in self.score_columns
+            }
+
+    def __len__(self):
+        return len(self.frame)
+
+    def segment_summary(self):
+        """
+        Per-segment engagement, in transcript order.
+
+        Returns:
+            List with one dict per transcript segment: {'samples': int,
+            'scores': {name: mean rounded to 2 decimals}} ('scores' is empty
+            for segments without samples)
+        """
+        means = {col: np.round(values, 2).tolist() for col, values in self.segment_means.items()}
+        return [
+            {
+                'samples': count,
+                'scores': {col: means[col][i] for col in self.score_columns} if count else {},
+            }
+            for i, count in enumerate(self.segment_counts.tolist())
+        ]
@@ -0,0 +1,119 @@
+"""
+Batched least-squares trends over windows of an engagement score matrix.
+
+Every exceedance context window is a row range [start, stop) over one
+(samples x emotions) matrix. Prefix sums of y, i*y and y*y (and of the
+sample count, i and i*i, as missing samples are left out) are built once,
+after which the slope (and optionally its t statistic) of every window and
+every emotion comes out of a handful of array operations, however many
+windows there are and however long they are.
+"""
+
+import numpy as np
+
+
+TREND_LABELS = ["Increasing", "Decreasing", "No trend"]
+
+_EPS = np.finfo(np.float64).eps
+
+
+def window_slopes(values, starts, stops):
+    """
+    Least-squares slope of every column over every row window.
+
+    The x axis is the row number, so slopes are in score units per sample.
+    Non-finite values are missing samples: each column is fitted to its
+    finite values only, at their own row numbers.
+
+    Args:
+        values: Array of shape (samples, columns)
+        starts: Window start rows (inclusive), one per window
+        stops: Window stop rows (exclusive), one per window
+
+    Returns:
+        Tuple (slopes, t_stats, counts):
+            slopes: (windows, columns) float64 array; exactly 0.0 where the
+                    slope is within floating-point error of zero, NaN where
+                    the column has fewer than 2 samples in the window
+            t_stats: (windows, columns) slope / standard error; NaN where
+                     there are fewer than 3 samples, +/-inf for a perfect fit
+            counts: (windows, columns) number of finite samples per window
+    """
+    y = np.asarray(values, dtype=np.float64)
+    if y.ndim == 1:
+        y = y[:, None]
+    a = np.asarray(starts, dtype=np.int64)
+    b = np.asarray(stops, dtype=np.int64)
+
+    finite = np.isfinite(y)
+    y = np.where(finite, y, 0.0)
+    # Row numbers of the finite samples; integer sums keep sx and sxx exact
+    idx = np.arange(len(y), dtype=np.int64)[:, None] * finite
+
+    def prefix(v):
+        return np.vstack([np.zeros((1, y.shape[1]), dtype=v.dtype), np.cumsum(v, axis=0)])
+
+    cn, cx, cxx = prefix(finite.astype(np.int64)), prefix(idx), prefix(idx * idx)
+    cy, cxy, cyy = prefix(y), prefix(idx * y), prefix(y * y)
+
+    counts = cn[b] - cn[a]
+    n = counts.astype(np.float64)
+    sx = (cx[b] - cx[a]).astype(np.float64)
+    sxx = (cxx[b] - cxx[a]).astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ss_xx = sxx - sx * sx / n
+        sy = cy[b] - cy[a]
+        sxy = cxy[b] - cxy[a]
+        syy = cyy[b] - cyy[a]
+        ss_xy = sxy - sx * sy / n
+        ss_yy = syy - sy * sy / n
+
+        # The window sums are differences of running totals; anything within
+        # their rounding error is a flat window, not a trend
+        noise = 8 * _EPS * (np.abs(cxy[b]) + np.abs(cxy[a])
+                            + np.abs(sx) * (np.abs(cy[b]) + np.abs(cy[a])) / n)
+        ss_xy = np.where(np.abs(ss_xy) <= noise, 0.0, ss_xy)
+
+        slopes = ss_xy / ss_xx
+        sse = np.maximum(ss_yy - slopes * ss_xy, 0.0)
+        stderr = np.sqrt(sse / (n - 2) / ss_xx)
+        t_stats = slopes / stderr
+    t_stats = np.where(slopes == 0, 0.0, t_stats)
+
+    slopes[counts < 2] = np.nan
+    t_stats[counts < 3] = np.nan
+    return slopes, t_stats, counts
+
+
+def window_trends(values, starts, stops, columns, min_abs_t=None):
+    """
+    Label the trend of every column over every row window.
+
+    Args:
+        values: Array of shape (samples, columns)
+        starts: Window start rows (inclusive)
+        stops: Window stop rows (exclusive)
+        columns: Column names, in the order of the value columns
+        min_abs_t: If set, only slopes whose |t statistic| reaches this value
+                   count as Increasing/Decreasing (e.g. 2.0 for roughly 95%);
+                   windows too short to test report No trend
+
+    Returns:
+        List with one dict per window mapping each of TREND_LABELS to the
+        column names with that trend; columns with fewer than 2 samples in
+        a window are not listed for it
+    """
+    slopes, t_stats, counts = window_slopes(values, starts, stops)
+    trending = np.ones(slopes.shape, dtype=bool)
+    if min_abs_t is not None:
+        trending = np.abs(np.nan_to_num(t_stats)) >= min_abs_t
+    labels = np.where(~trending | (slopes == 0), 2, np.where(slopes > 0, 0, 1))
+
+    trends = []
+    for row, row_counts in zip(labels.tolist(), counts.tolist()):
+        trend = {label: [] for label in TREND_LABELS}
+        for column, label, count in zip(columns, row, row_counts):
+            if count >= 2:
+                trend[TREND_LABELS[label]].append(column)
+        trends.append(trend)
+    return trends
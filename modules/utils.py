@@ -2,100 +2,276 @@
 Supporting functions for content extraction and analysis.
 """
 
-import re
 import json
-import os
-from datetime import datetime
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
 from typing import List, Dict, Tuple
-from anthropic import Anthropic
+
+import numpy as np
+
+from modules.json_stream import extract_json, extract_json_from_stream
+from modules.resilience import llm_caller
+from modules.llm_backends import get_llm_client
+from modules.trend import window_trends
 
 
 def init_anthropic_client():
     """
-    Initialize and return an Anthropic client using API key from environment.
+    Initialize and return the LLM client for the configured backend.
+    
+    With LLM_BACKEND unset (or 'anthropic') this is an Anthropic client using
+    the API key from environment. The SDK's own retries are disabled; retries,
+    deadlines and circuit breaking are handled by modules.resilience in
+    send_message. LLM_BACKEND=stub returns the deterministic offline stand-in
+    from modules.llm_backends.
     
     Returns:
-        Anthropic client instance
+        Client instance exposing messages.create / messages.stream
         
     Raises:
-        ValueError: If ANTHROPIC_API_KEY is not set in environment
+        ValueError: If ANTHROPIC_API_KEY is not set for the anthropic backend
     """
-    api_key = os.getenv("ANTHROPIC_API_KEY")
-    if not api_key:
-        raise ValueError("ANTHROPIC_API_KEY not found in environment variables. Please set it in .env file.")
-    return Anthropic(api_key=api_key)
+    return get_llm_client()
 
 
-def cal_trend(df_chunk):
+def cal_trend(df_chunk, min_abs_t=None):
     """
     Calculate trends for all numerical columns in a dataframe chunk.
     
+    Each column's trend is the sign of its least-squares slope over the chunk
+    (see modules.trend.window_trends, which does this for many chunks at once).
+    
     Args:
-        df_chunk: DataFrame containing timestamp, lectureContent and numerical columns
+        df_chunk: DataFrame containing timestamp, lectureContent (optionally time
+                  and segment_id) and numerical columns
+        min_abs_t: Optional |t statistic| a slope needs to count as a trend
         
     Returns:
         Dictionary with trend labels as keys and lists of column names as values
     """
-    df_edit = df_chunk.drop(columns=["timestamp", "lectureContent"])
-    remaining_columns = df_edit.columns.tolist()
-    trend_results = {col: _cal_trend(df_edit[col].tolist()) for col in remaining_columns}
-    labels = ["Increasing", "Decreasing", "No trend"]
-    trend_ft = {lab: [k for k, v in trend_results.items() if v == lab] for lab in labels}
-    return trend_ft
+    df_edit = df_chunk.drop(columns=["timestamp", "time", "lectureContent", "segment_id"], errors="ignore")
+    columns = df_edit.columns.tolist()
+    return window_trends(df_edit.to_numpy(dtype=np.float64), [0], [len(df_edit)], columns, min_abs_t)[0]
 
 
-def _cal_trend(data):
+def build_system_blocks(system=None, context=None):
     """
-    Calculate the trend of a list of numerical data.
+    Build the structured system prompt for a Claude request.
+    
+    The instruction text comes first, followed by the shared context blocks.
+    The last block is marked with ``cache_control`` so the provider caches the
+    whole prefix; follow-up requests that send the same system/context pay
+    neither the input cost nor the time-to-first-token for it again.
     
     Args:
-        data: List of numerical values
+        system: Instruction text (str) or None
+        context: Context text (str), list of texts, or None
         
     Returns:
-        String indicating "Increasing", "Decreasing", or "No trend"
+        List of system content blocks, or None if there is nothing to send
     """
-    if len(data) < 2:
-        return "Not enough data to determine trend."
-    if data[-1] > data[0]:
-        return "Increasing"
-    elif data[-1] < data[0]:
-        return "Decreasing"
-    else:
-        return "No trend"
+    texts = []
+    if system:
+        texts.append(system)
+    if isinstance(context, str):
+        texts.append(context)
+    elif context:
+        texts.extend(context)
+    if not texts:
+        return None
+    blocks = [{"type": "text", "text": text} for text in texts]
+    blocks[-1]["cache_control"] = {"type": "ephemeral"}
+    return blocks
 
 
-def send_message(client, message, model="claude-haiku-4-5", max_tokens=1000):
+def build_request_params(message, model="claude-haiku-4-5", max_tokens=1000, system=None, context=None):
+    """
+    Build the Messages API parameters shared by send_message and batch requests.
+    
+    Args:
+        message: User message text
+        model: Model name
+        max_tokens: Maximum tokens in response
+        system: Optional instruction text
+        context: Optional cached context, see build_system_blocks
+        
+    Returns:
+        Dict of keyword arguments for messages.create
+    """
+    kwargs = {
+        "model": model,
+        "max_tokens": max_tokens,
+        "messages": [
+            {
+                "role": "user",
+                "content": message
+            }
+        ]
+    }
+    system_blocks = build_system_blocks(system, context)
+    if system_blocks:
+        kwargs["system"] = system_blocks
+    return kwargs
+
+
+def send_message(client, message, model="claude-haiku-4-5", max_tokens=1000, deadline=None,
+                 system=None, context=None):
     """
     Send a message to Claude API and get response.
     
+    The request runs through the shared resilience layer: it is bounded by a
+    deadline, retried with backoff on overload/timeouts and rejected fast while
+    the circuit breaker is open.
+    
     Args:
         client: Anthropic client instance
         message: Message text to send
         model: Model name to use (default: claude-haiku-4-5)
         max_tokens: Maximum tokens in response (default: 1000)
+        deadline: Overall time budget in seconds (default: LLM_DEADLINE_SECONDS)
+        system: Optional instruction text sent as a system block
+        context: Optional shared context (str or list of str) sent as cached
+                 system blocks, see build_system_blocks
         
     Returns:
         Response text from Claude
+        
+    Raises:
+        CircuitOpenError: If the upstream is currently considered unhealthy
+        DeadlineExceeded: If no attempt succeeded within the deadline
     """
-    response = client.messages.create(
-        model=model,
-        max_tokens=max_tokens,
-        messages=[
-            {
-                "role": "user",
-                "content": message
-            }
-        ]
+    response = llm_caller.call(
+        client.messages.create,
+        deadline=deadline,
+        **build_request_params(message, model, max_tokens, system, context)
     )
     return response.content[0].text
 
 
-def extract_json_from_claude_response(response_text):
+def send_message_json(client, message, model="claude-haiku-4-5", max_tokens=1000, deadline=None,
+                      system=None, context=None, expect=dict):
     """
-    Extract JSON from Claude's response, handling markdown code blocks.
+    Stream a message to Claude API and parse the JSON value in the response.
+    
+    The stream is closed as soon as the first JSON object or array closes, so
+    trailing prose is never waited for. Truncated output (e.g. a max_tokens
+    cut-off) is repaired where possible. Runs through the resilience layer
+    like send_message.
+    
+    Args:
+        client: Anthropic client instance
+        message: Message text to send
+        model: Model name to use (default: claude-haiku-4-5)
+        max_tokens: Maximum tokens in response (default: 1000)
+        deadline: Overall time budget in seconds (default: LLM_DEADLINE_SECONDS)
+        system: Optional instruction text sent as a system block
+        context: Optional shared context (str or list of str) sent as cached
+                 system blocks, see build_system_blocks
+        expect: Type of the JSON value to return (default: dict, so e.g. a
+                "[1]" citation in a preamble is skipped); None accepts any
+        
+    Returns:
+        Parsed JSON value of the expected type
+        
+    Raises:
+        json.JSONDecodeError: If no JSON value can be recovered
+    """
+    kwargs = build_request_params(message, model, max_tokens, system, context)
+
+    def _stream_json(timeout):
+        with client.messages.stream(timeout=timeout, **kwargs) as stream:
+            return extract_json_from_stream(stream.text_stream, expect)
+
+    return llm_caller.call(_stream_json, deadline=deadline)
+
+
+LECTURE_CONTEXT_SYSTEM = (
+    "You are Listant, a study assistant. The lecture context that follows "
+    "(transcript segments and the student's engagement data) is shared by "
+    "every request about this lecture. Use it to answer the user's request. "
+    "When asked for JSON, return only valid JSON with no additional text."
+)
+
+
+def format_lecture_context(transcript_data, engagement_data=None, lecture_name=None,
+                           max_transcript_chars=20000, max_timeline_rows=300,
+                           segment_engagement=None):
+    """
+    Render one lecture's transcript and engagement data as a context string.
+    
+    The output is deterministic for the same inputs, so it can be sent as a
+    cached prompt prefix by every endpoint of a session.
+    
+    Args:
+        transcript_data: List of transcript segments (start_time, end_time, text, summary)
+        engagement_data: Engagement export dict (metadata, engagement_timeline,
+                         summary_statistics) or None
+        lecture_name: Lecture title, if known
+        max_transcript_chars: Cap on total transcript text included
+        max_timeline_rows: Cap on engagement samples included (evenly thinned)
+        segment_engagement: Optional per-segment engagement, parallel to
+                            transcript_data (see SessionAlignment.segment_summary)
+        
+    Returns:
+        Context text
+    """
+    lines = ["# Lecture context"]
+    if lecture_name:
+        lines.append(f"Lecture: {lecture_name}")
+
+    lines.append("")
+    lines.append("## Transcript segments")
+    budget = max_transcript_chars
+    for i, segment in enumerate(transcript_data or []):
+        summary = segment.get('summary', {})
+        topic = summary.get('5_word_summary', '') if isinstance(summary, dict) else ''
+        text = segment.get('text', '')
+        if budget <= 0:
+            text = '[omitted]'
+        elif len(text) > budget:
+            text = text[:budget] + ' [truncated]'
+        budget -= len(text)
+        header = f"[{i}] {segment.get('start_time', '')} - {segment.get('end_time', '')} | {topic}"
+        if segment_engagement and i < len(segment_engagement) and segment_engagement[i]['scores']:
+            scores = segment_engagement[i]['scores']
+            header += " | mean engagement: " + ", ".join(f"{k} {v}" for k, v in scores.items())
+        lines.append(header)
+        lines.append(text)
+    if not transcript_data:
+        lines.append("(no transcript available)")
+
+    if engagement_data:
+        metadata = engagement_data.get('metadata', {})
+        stats = engagement_data.get('summary_statistics', {})
+        timeline = engagement_data.get('engagement_timeline', [])
+        lines.append("")
+        lines.append("## Engagement")
+        lines.append(f"Start: {metadata.get('start_time', '')}  Duration (s): {metadata.get('duration_seconds', '')}")
+        lines.append(f"Summary statistics: {json.dumps(stats, sort_keys=True)}")
+        step = max(1, -(-len(timeline) // max_timeline_rows))
+        lines.append("Timeline (elapsed_seconds, concentrated, engaged, confused, bored; scores 0-100):")
+        for entry in timeline[::step]:
+            scores = entry.get('scores', {})
+            lines.append(
+                f"{entry.get('elapsed_seconds', '')}, {scores.get('concentrated', '')}, "
+                f"{scores.get('engaged', '')}, {scores.get('confused', '')}, {scores.get('bored', '')}"
+            )
+
+    return "\n".join(lines)
+
+
+def extract_json_from_claude_response(response_text, expect=None):
+    """
+    Extract JSON from Claude's response, tolerating common formatting defects.
+    
+    Finds the first balanced JSON object or array anywhere in the text
+    (markdown fences and prose preambles are skipped) and repairs trailing
+    commas, single quotes, Python literals and truncated output.
     
     Args:
         response_text: The raw text from Claude's response
+        expect: Optional type of the value to look for, e.g. dict so a "[1]"
+                citation in a preamble is skipped (see extract_json)
         
     Returns:
         Parsed JSON object (dict or list)
@@ -103,23 +279,11 @@ def extract_json_from_claude_response(response_text):
     Raises:
         json.JSONDecodeError: If JSON parsing fails
     """
-    # Method 1: Try to extract from markdown code blocks
-    # Pattern matches ```json ... ``` or ``` ... ```
-    json_pattern = r'```(?:json)?\s*\n(.*?)\n```'
-    match = re.search(json_pattern, response_text, re.DOTALL)
-    
-    if match:
-        json_str = match.group(1)
-    else:
-        # Method 2: If no code blocks, assume entire response is JSON
-        json_str = response_text
-    
-    # Parse and return the JSON
     try:
-        return json.loads(json_str)
+        return extract_json(response_text, expect)
     except json.JSONDecodeError as e:
         print(f"Error parsing JSON: {e}")
-        print(f"Attempted to parse: {json_str[:200]}...")
+        print(f"Attempted to parse: {response_text[:200]}...")
         raise
 
 
@@ -155,23 +319,107 @@ def overlaps(a_start: datetime, a_end: datetime, b_start: datetime, b_end: datet
     return (a_start <= b_end) and (b_start <= a_end)
 
 
-def find_transcripts_for_period(exceedance: Tuple[str, str], transcripts: List[Dict]) -> List[Dict]:
+def iso_to_epoch(ts: str) -> float:
+    """
+    Convert an ISO 8601 timestamp to epoch seconds.
+    
+    Naive timestamps (engagement exports) are read as UTC, the same wall clock
+    as the "Z"-suffixed transcript times, so both timelines compare directly.
+    
+    Args:
+        ts: ISO timestamp string
+        
+    Returns:
+        Seconds since the epoch as a float
+    """
+    dt = parse_iso_z(ts)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+class TranscriptIndex:
+    """
+    Sorted interval index over transcript segments.
+    
+    Built once per transcript: start/end times are parsed a single time into
+    epoch floats and kept sorted by start, together with a running maximum of
+    end times. Overlap queries then bisect both arrays instead of re-parsing
+    and scanning every segment, and return matches in original list order.
+    
+    Example:
+        index = TranscriptIndex(transcript_data)
+        index.find(('2025-01-15T10:26:00Z', '2025-01-15T10:28:00Z'))
+    """
+    
+    def __init__(self, transcripts: List[Dict], skip_invalid: bool = False):
+        """
+        Args:
+            transcripts: List of dicts with 'start_time' and 'end_time' ISO strings
+            skip_invalid: Ignore entries whose times are missing or unparsable
+                          instead of raising
+        """
+        self.entries = list(transcripts)
+        spans = []
+        for i, entry in enumerate(self.entries):
+            try:
+                spans.append((iso_to_epoch(entry['start_time']), iso_to_epoch(entry['end_time']), i))
+            except (KeyError, TypeError, ValueError):
+                if not skip_invalid:
+                    raise
+        spans.sort()
+        self.starts = [span[0] for span in spans]
+        self.ends = [span[1] for span in spans]
+        self.order = [span[2] for span in spans]
+        # Running max of end times is non-decreasing, so it can be bisected
+        self.max_ends = []
+        running = float('-inf')
+        for end in self.ends:
+            running = max(running, end)
+            self.max_ends.append(running)
+    
+    def __len__(self):
+        return len(self.order)
+    
+    def overlapping_indices(self, start: float, end: float) -> List[int]:
+        """
+        Original list indices of segments overlapping [start, end] (epoch seconds).
+        """
+        hi = bisect_right(self.starts, end)         # segments starting no later than end
+        lo = bisect_left(self.max_ends, start)      # first segment that could reach start
+        return sorted(self.order[k] for k in range(lo, hi) if self.ends[k] >= start)
+    
+    def overlapping(self, start: float, end: float) -> List[Dict]:
+        """Segments overlapping [start, end] (epoch seconds), in original order."""
+        return [self.entries[i] for i in self.overlapping_indices(start, end)]
+    
+    def find(self, period: Tuple[str, str]) -> List[Dict]:
+        """Segments overlapping a (start_time, end_time) pair of ISO strings."""
+        start, end = map(iso_to_epoch, period)
+        return self.overlapping(start, end)
+    
+    def first_containing(self, t: float):
+        """
+        Original index of the first segment containing epoch time t, or None.
+        """
+        indices = self.overlapping_indices(t, t)
+        return indices[0] if indices else None
+
+
+def find_transcripts_for_period(exceedance: Tuple[str, str], transcripts) -> List[Dict]:
     """
     Find transcript entries that overlap with an exceedance period.
     
     Args:
         exceedance: Tuple of (start_time, end_time) as ISO strings
                    e.g., ('2025-01-15T10:26:00Z','2025-01-15T10:28:00Z')
-        transcripts: List of dicts with 'start_time' and 'end_time' ISO strings
+        transcripts: TranscriptIndex, or list of dicts with 'start_time' and
+                     'end_time' ISO strings (indexed on the fly; build a
+                     TranscriptIndex once when querying repeatedly)
         
     Returns:
         List of transcript entries that overlap the exceedance period
     """
-    es, ee = map(parse_iso_z, exceedance)
-    matches = []
-    for entry in transcripts:
-        ts = parse_iso_z(entry['start_time'])
-        te = parse_iso_z(entry['end_time'])
-        if overlaps(es, ee, ts, te):
-            matches.append(entry)
-    return matches
+    if not isinstance(transcripts, TranscriptIndex):
+        transcripts = TranscriptIndex(transcripts)
+    return transcripts.find(exceedance)
@@ -7,15 +7,43 @@ lecture data and generating questions based on student engagement metrics.
 
 import os
 import json
-import pandas as pd
 from anthropic import Anthropic
 from modules.utils import (
     init_anthropic_client,
-    cal_trend,
     send_message,
+    send_message_json,
     extract_json_from_claude_response,
-    find_transcripts_for_period
+    find_transcripts_for_period,
+    TranscriptIndex,
+    LECTURE_CONTEXT_SYSTEM
 )
+from modules.timeline import align_to_transcript, engagement_frame, exceedance_runs, timestamps_to_epoch
+from modules.trend import window_trends
+
+
+# Prompt used for every question-generation request; the segment text is appended
+QUESTION_PROMPT = """This is the part of the lecture transcript during an emotional exceedance period. 
+            Based on this text, generate three multiple choice questions to test whether the student understood the material covered.
+            Provide only the questions without any additional explanation. Output the questions in the following dictionary:
+            {
+                "question_1": 
+                    {"question": "First question here?",
+                    "options": ["option0", "option1", "option2", "option3"],
+                    "answer": 1,
+                    "explanation": "explanation for the answer here"
+                    },
+                "question_2": {"question": "Second question here?",
+                    "options": ["option0", "option1", "option2", "option3"],
+                    "answer": 0,
+                    "explanation": "explanation for the answer here"
+                    },
+                "question_3": {"question": "Third question here?",
+                    "options": ["option0", "option1", "option2", "option3"],
+                    "answer": 2,
+                    "explanation": "explanation for the answer here"
+                    },
+            }    
+            """
 
 
 def pose_questions(
@@ -23,7 +51,12 @@ def pose_questions(
     data: dict, 
     transcript_dict: dict, 
     target: dict, 
-    nos_entry_before: int = 1
+    nos_entry_before: int = 1,
+    llm_context: str = None,
+    generate_questions: bool = True,
+    max_question_segments: int = 2,
+    trend_min_abs_t: float = None,
+    alignment=None
     ):
     """
     The main function to run content extraction and analysis.
@@ -52,6 +85,15 @@ def pose_questions(
         }
         - target: dictionary of emotion thresholds
         - nos_entry_before (optional): Number of entries to look back for context
+        - llm_context (optional): shared lecture context sent as a cached system prefix
+          (see modules.utils.format_lecture_context)
+        - generate_questions (optional): if False, skip the LLM calls and return the matched
+          segments without 'questions' (used by the batch backfill in wrapper.py)
+        - max_question_segments (optional): number of matched segments that get questions
+        - trend_min_abs_t (optional): |t statistic| a context-window slope needs to count as
+          Increasing/Decreasing (see modules.trend.window_trends); None uses the slope sign only
+        - alignment (optional): modules.timeline.SessionAlignment already built from data and
+          transcript_dict; its frame, transcript index and sample-to-segment matching are reused
     
     Outputs:
         - things_happened: List of dictionaries containing details about what happened before and during exceedance periods
@@ -84,82 +126,61 @@ def pose_questions(
 
     """
 
-    # Load data into DataFrame
-    df = pd.DataFrame(data)
-
-    # Expand the 'scores' column (dict) into separate columns for each emotion
-    if 'scores' in df.columns:
-        scores_df = df['scores'].apply(pd.Series)
-        df = pd.concat([df.drop('scores', axis=1), scores_df], axis=1)
-    
-    # Check if lectureContent is the df. If not, import it from transcript_dict based on timestamp
-    if 'lectureContent' not in df.columns:
-        lecture_contents = []
-        for ts in df['timestamp']:
-            matched = find_transcripts_for_period((ts, ts), transcript_dict)
-            if matched:
-                lecture_contents.append(matched[0].get('summary', {}).get('5_word_summary', ''))
-            else:
-                lecture_contents.append('')
-        df['lectureContent'] = lecture_contents
-
-    # find the timestamp when emotions exceed thresholds
-    results, periods = {}, {}
-    for emotion, threshold in target.items():
-        exceed_times_df = df.loc[df[emotion] > threshold, 'timestamp']
-        results[emotion] = exceed_times_df.tolist()
+    if alignment is not None:
+        # Reuse the session's precomputed frame, transcript index and matching
+        df = alignment.frame
+        transcript_index = alignment.transcript_index
+        if 'lectureContent' not in df.columns:
+            df = df.assign(segment_id=alignment.segment_ids, lectureContent=alignment.lecture_contents)
+    else:
+        # Load data into a typed DataFrame (float32 score columns, parsed 'time' column)
+        df = engagement_frame(data)
 
-        # group consecutive indices into runs (break when idx != prev+1)
-        exceed_idx = sorted(exceed_times_df.index.tolist())
-        if not exceed_idx:
-            periods[emotion] = []
-        else:
-            runs = []
-            start = prev = exceed_idx[0]
-            for idx in exceed_idx[1:]:
-                if idx == prev + 1:
-                    prev = idx
-                else:
-                    runs.append((start, prev))
-                    start = prev = idx
-            runs.append((start, prev))
+        # Parse the transcript times once; every lookup below bisects this index
+        transcript_index = TranscriptIndex(transcript_dict)
 
-            # convert index runs to timestamp (start_time, end_time)
-            periods[emotion] = [(df.loc[s, 'timestamp'], df.loc[e, 'timestamp']) for s, e in runs]
+        # Check if lectureContent is the df. If not, import it from transcript_dict based on timestamp
+        # (one vectorised as-of alignment of both timelines instead of a lookup per row)
+        if 'lectureContent' not in df.columns:
+            segment_ids, lecture_contents = align_to_transcript(timestamps_to_epoch(df['time']), transcript_index)
+            df['segment_id'] = segment_ids
+            df['lectureContent'] = lecture_contents
 
+    # find the runs of consecutive samples where each emotion exceeds its threshold,
+    # as row ranges (all target emotions in one vectorised pass)
+    emotions = list(target)
+    runs = exceedance_runs(df[emotions].to_numpy(), [target[e] for e in emotions])
+    timestamps = df['timestamp'].tolist()
+    periods = {emotion: [(timestamps[s], timestamps[e]) for s, e in emotion_runs]
+               for emotion, emotion_runs in zip(emotions, runs)}
 
     print(f"Periods of consecutive exceedance: {periods}\n")
 
     # Task 1 - find what happened before and during the exceedance
-    things_happened = []
-    for emotion, times in periods.items():
-        for t in times:
-            idx = df.index[df['timestamp'] == t[0]][0]      # find the start time of each period
-            context_start = max(0, idx - nos_entry_before)  # n entries before
-            context = df.iloc[context_start: idx+1]         # from the context start to the exceedance time
+    # (i) trends of every score over every context window (n entries before up to
+    # the exceedance start), fitted in one batch over the score matrix
+    events = [(emotion, start, end) for emotion, emotion_runs in zip(emotions, runs) for start, end in emotion_runs]
+    context_starts = [max(0, start - nos_entry_before) for _, start, _ in events]
+    score_columns = [c for c in df.columns if c not in ('timestamp', 'time', 'lectureContent', 'segment_id')]
+    trends = window_trends(df[score_columns].to_numpy(), context_starts, [start + 1 for _, start, _ in events],
+                           score_columns, trend_min_abs_t)
 
-            # (i) find the trend of emotion values
-            trend = cal_trend(context) if not context.empty else "Not enough data"
-            # print(f"Context before {emotion} exceedance at {t}: {trend}")
-
-            # (ii) find the lectureContent before the exceedance
-            lecture_contents = set(context['lectureContent'].dropna().tolist())
-            # print(f"Lecture contents before {emotion} exceedance at {t}: {lecture_contents}")
+    lecture_content = df['lectureContent']
+    things_happened = []
+    for (emotion, start, end), context_start, trend in zip(events, context_starts, trends):
+        # (ii) find the lectureContent before the exceedance
+        lecture_contents = set(lecture_content.iloc[context_start: start + 1].dropna().tolist())
 
-            # (iii) find the lectureContent during the exceedance
-            exceedance_context = df.loc[df['timestamp'].between(t[0], t[1]), 'lectureContent'].dropna().tolist()
-            exceedance_contents = set(exceedance_context)
-            # print(f"Lecture contents during {emotion} exceedance from {t[0]} to {t[1]}: {exceedance_contents}")
-            # print()
+        # (iii) find the lectureContent during the exceedance
+        exceedance_contents = set(lecture_content.iloc[start: end + 1].dropna().tolist())
 
-            things_happened.append({
-                "emotion": emotion,
-                "exceedance_period": t,
-                "trend": trend,
-                "lecture_contents_before": list(lecture_contents),
-                "lecture_contents_during": list(exceedance_contents)
-            })
-            # print(f"Recorded exceedance event: {things_happened[-1]}")
+        things_happened.append({
+            "emotion": emotion,
+            "exceedance_period": (timestamps[start], timestamps[end]),
+            "trend": trend,
+            "lecture_contents_before": list(lecture_contents),
+            "lecture_contents_during": list(exceedance_contents)
+        })
 
     # Generate a couple of example questions based on the lecture contents
     session_matched = []
@@ -167,39 +188,18 @@ def pose_questions(
     for event in things_happened:
         exceedance_period = event["exceedance_period"]
         # output the dictionaries in the transcript that overlaps the exceedance
-        matched = find_transcripts_for_period(exceedance_period, transcript_dict)
+        matched = find_transcripts_for_period(exceedance_period, transcript_index)
         session_matched.extend(matched)
     # deduplicate session_matched based on (start_time, end_time)
     unique_sessions = list({(d['start_time'], d['end_time']): d for d in session_matched}.values())
 
-    if unique_sessions:
-        for content in unique_sessions[:2]:
+    if unique_sessions and generate_questions:
+        for content in unique_sessions[:max_question_segments]:
             print(f"Generating questions for transcript segment from {content['start_time']} to {content['end_time']}")
             taught_text = content.get("text", "")
-            question_prompt = """This is the part of the lecture transcript during an emotional exceedance period. 
-            Based on this text, generate three multiple choice questions to test whether the student understood the material covered.
-            Provide only the questions without any additional explanation. Output the questions in the following dictionary:
-            {
-                "question_1": 
-                    {"question": "First question here?",
-                    "options": ["option0", "option1", "option2", "option3"],
-                    "answer": 1,
-                    "explanation": "explanation for the answer here"
-                    },
-                "question_2": {"question": "Second question here?",
-                    "options": ["option0", "option1", "option2", "option3"],
-                    "answer": 0,
-                    "explanation": "explanation for the answer here"
-                    },
-                "question_3": {"question": "Third question here?",
-                    "options": ["option0", "option1", "option2", "option3"],
-                    "answer": 2,
-                    "explanation": "explanation for the answer here"
-                    },
-            }    
-            """
-            question_raw = send_message(client, message=question_prompt + taught_text, max_tokens=1000)
-            question = extract_json_from_claude_response(question_raw)
+            question = send_message_json(client, message=QUESTION_PROMPT + taught_text, max_tokens=1000,
+                                         system=LECTURE_CONTEXT_SYSTEM if llm_context else None,
+                                         context=llm_context)
             content['questions'] = question
             print(f"Topic: {content['summary']['5_word_summary']}\n Generated questions:\n{json.dumps(question, indent=2)}\n")
             # print(f"Generated questions for exceedance period {content['start_time']} to {content['end_time']}:\n{question}\n")
@@ -0,0 +1,104 @@
+"""
+Offline load test for the post-lecture LLM endpoints.
+
+Runs the summary, MCQ, report and plan endpoints against the stub LLM
+backend, so the timings measure our own code (plus the simulated latency you
+configure) rather than the network. Example:
+
+    LLM_STUB_LATENCY_MS=200 LLM_STUB_ERROR_RATE=0.05 \
+        python scripts/benchmark_pipeline.py --engagement data/engagement_Test1_2025-11-16_10-32-17.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('LLM_BACKEND', 'stub')
+
+import api_server  # noqa: E402
+
+
+def synthetic_transcript(engagement_data, segment_seconds=30):
+    """Build transcript segments covering the engagement recording."""
+    metadata = engagement_data['metadata']
+    start = datetime.fromisoformat(metadata['start_time'])
+    duration = metadata.get('duration_seconds') or 60
+    with open('data/ml_transcript.json', 'r', encoding='utf-8') as f:
+        texts = [entry['text'] for entry in json.load(f)]
+    segments = []
+    t = 0.0
+    i = 0
+    while t < duration:
+        seg_start = start + timedelta(seconds=t)
+        seg_end = seg_start + timedelta(seconds=segment_seconds)
+        text = texts[i % len(texts)]
+        words = text.split()
+        segments.append({
+            'start_time': seg_start.isoformat() + 'Z',
+            'end_time': seg_end.isoformat() + 'Z',
+            'text': text,
+            'summary': {'5_word_summary': ' '.join(words[:5]), '20_word_summary': ' '.join(words[:20])},
+        })
+        t += segment_seconds
+        i += 1
+    return segments
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark of the LLM endpoints')
+    parser.add_argument('--engagement', default='data/engagement_Test1_2025-11-16_10-32-17.json')
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    with open(args.engagement, 'r') as f:
+        engagement_data = json.load(f)
+    transcript = synthetic_transcript(engagement_data)
+
+    client = api_server.app.test_client()
+    endpoints = {
+        'summary': '/api/lecture/summary',
+        'mcqs': '/api/lecture/mcqs',
+        'report': '/api/report/generate',
+        'plan': '/api/plan/generate',
+    }
+    timings = {name: [] for name in endpoints}
+    failures = {name: 0 for name in endpoints}
+
+    for _ in range(args.iterations):
+        session_id = str(uuid.uuid4())
+        api_server.sessions[session_id] = {
+            'start_time': engagement_data['metadata']['start_time'],
+            'lecture_name': engagement_data['metadata'].get('lecture_name'),
+            'engagement_data': engagement_data,
+            'transcript_data': transcript,
+        }
+        for name, url in endpoints.items():
+            started = time.perf_counter()
+            # Wait for the result instead of taking the 202 + job id
+            response = client.post(url, json={'session_id': session_id, 'mcq_results': []},
+                                   headers={'Prefer': 'wait=25'})
+            timings[name].append(time.perf_counter() - started)
+            if response.status_code != 200:
+                failures[name] += 1
+
+    print(f"{'endpoint':<10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'failed':>8}")
+    for name, samples in timings.items():
+        print(f"{name:<10}{statistics.median(samples) * 1000:>10.1f}"
+              f"{percentile(samples, 95) * 1000:>10.1f}{max(samples) * 1000:>10.1f}{failures[name]:>8}")
+    print(json.dumps(api_server.llm_caller.snapshot(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+BatchRunner against the stub LLM backend's Message Batches API.
+
+Run from the repository root: python -m pytest tests
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.batch import BatchRunner, make_custom_id
+from modules.llm_backends import StubLLMClient
+
+
+class CountingBatches:
+    """Wrap the stub's batches API, counting create calls."""
+
+    def __init__(self, batches, fail_after_create=False):
+        self._batches = batches
+        self.fail_after_create = fail_after_create
+        self.created = 0
+
+    def create(self, **kwargs):
+        self.created += 1
+        batch = self._batches.create(**kwargs)
+        if self.fail_after_create:
+            self.fail_after_create = False
+            raise TimeoutError("Simulated timeout after the batch was created")
+        return batch
+
+    def __getattr__(self, name):
+        return getattr(self._batches, name)
+
+
+@pytest.fixture
+def client():
+    stub = StubLLMClient()
+    stub.messages.batches = CountingBatches(stub.messages.batches)
+    return stub
+
+
+def add_requests(runner, names):
+    return [runner.add(make_custom_id(name, 'q', 0), f"Questions about {name}", max_tokens=100)
+            for name in names]
+
+
+def test_custom_ids_are_valid_and_distinct():
+    assert make_custom_id('lec1', 'q', 0) == 'lec1-q-0'
+    dotted, comma = make_custom_id('Week 1.2'), make_custom_id('Week 1,2')
+    assert dotted != comma
+    long_id = make_custom_id('x' * 100, 'q', 3)
+    assert len(long_id) <= 64
+    for custom_id in (dotted, comma, long_id):
+        assert len(custom_id) <= 64 and all(c.isalnum() or c in '_-' for c in custom_id)
+
+
+def test_submit_checkpoint_and_result_mapping(tmp_path, client):
+    checkpoint = tmp_path / 'checkpoint.json'
+    runner = BatchRunner(client, checkpoint, poll_interval=0, max_requests_per_batch=2)
+    assert add_requests(runner, ['lec1', 'lec2', 'lec3']) == [True, True, True]
+
+    results = runner.run()
+
+    assert client.messages.batches.created == 2
+    assert set(results) == {make_custom_id(name, 'q', 0) for name in ['lec1', 'lec2', 'lec3']}
+    assert all(result.get('text') for result in results.values())
+    state = json.loads(checkpoint.read_text())
+    assert len(state['batches']) == 2
+    assert all(batch['id'] and batch['collected'] for batch in state['batches'])
+    assert state['results'] == results
+
+
+def test_resume_does_not_resubmit(tmp_path, client):
+    checkpoint = tmp_path / 'checkpoint.json'
+    first = BatchRunner(client, checkpoint, poll_interval=0)
+    add_requests(first, ['lec1', 'lec2'])
+    first.submit()  # interrupted before waiting
+
+    resumed = BatchRunner(client, checkpoint, poll_interval=0)
+    assert add_requests(resumed, ['lec1', 'lec2']) == [False, False]
+    results = resumed.run()
+
+    assert client.messages.batches.created == 1
+    assert len(results) == 2
+
+
+def test_failed_create_is_reconciled_not_repeated(tmp_path, client):
+    client.messages.batches.fail_after_create = True
+    runner = BatchRunner(client, tmp_path / 'checkpoint.json', poll_interval=0)
+    add_requests(runner, ['lec1', 'lec2'])
+
+    results = runner.run()
+
+    assert client.messages.batches.created == 1
+    assert len(results) == 2
+
+
+def test_unconfirmed_submission_is_recovered_on_resume(tmp_path, client):
+    checkpoint = tmp_path / 'checkpoint.json'
+    runner = BatchRunner(client, checkpoint, poll_interval=0)
+    add_requests(runner, ['lec1', 'lec2'])
+    runner.submit()
+    # Simulate a crash between creating the batch and recording its id
+    state = json.loads(checkpoint.read_text())
+    state['batches'][0].update(id=None, status='submitting')
+    checkpoint.write_text(json.dumps(state))
+
+    resumed = BatchRunner(client, checkpoint, poll_interval=0)
+    assert add_requests(resumed, ['lec1', 'lec2']) == [True, True]
+    results = resumed.run()
+
+    assert client.messages.batches.created == 1
+    assert len(results) == 2
+
+
+def test_colliding_lecture_names_get_separate_results(tmp_path, client):
+    runner = BatchRunner(client, tmp_path / 'checkpoint.json', poll_interval=0)
+    assert add_requests(runner, ['Week 1.2', 'Week 1,2']) == [True, True]
+
+    results = runner.run()
+
+    # Neither lecture is skipped as "already handled" or handed the other's result
+    assert {make_custom_id('Week 1.2', 'q', 0), make_custom_id('Week 1,2', 'q', 0)} == set(results)
@@ -0,0 +1,40 @@
+"""
+Extracting JSON from LLM replies with prose, citations and truncation.
+
+Run from the repository root: python -m pytest tests
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.json_stream import extract_json, extract_json_from_stream
+from modules.utils import extract_json_from_claude_response
+
+
+CITED = 'Sure! See [1] for the source. {"title": "Photosynthesis", "points": [1, 2]}'
+
+
+def test_citation_before_object_is_skipped():
+    assert extract_json(CITED) == [1]
+    expected = {'title': 'Photosynthesis', 'points': [1, 2]}
+    assert extract_json(CITED, expect=dict) == expected
+    assert extract_json_from_claude_response(CITED, expect=dict) == expected
+    # Token by token, as send_message_json reads a stream
+    assert extract_json_from_stream(iter(CITED), expect=dict) == expected
+
+
+def test_value_cut_off_by_max_tokens_is_repaired():
+    truncated = 'Here is the plan:\n```json\n{"weeks": [{"topic": "Cells", "hours": 2}, {"topic": "Ener'
+    assert extract_json_from_claude_response(truncated, expect=dict) == {
+        'weeks': [{'topic': 'Cells', 'hours': 2}, {'topic': 'Ener'}]
+    }
+
+
+def test_wrong_type_only_raises():
+    with pytest.raises(json.JSONDecodeError):
+        extract_json_from_claude_response('The answers are [1, 2, 3].', expect=dict)
@@ -0,0 +1,173 @@
+"""
+ResilientCaller retries, circuit breaking and hedging against a fake LLM call.
+
+Run from the repository root: python -m pytest tests
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.llm_backends import StubOverloadedError
+from modules.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ResilientCaller,
+    RetryPolicy,
+)
+
+
+class BadRequestError(Exception):
+    """A 400 from the upstream: the request is wrong, retrying will not help."""
+
+    status_code = 400
+
+
+class FakeCall:
+    """
+    Callable standing in for client.messages.create.
+
+    Each call pops the next outcome: an exception is raised, a number is
+    slept (seconds) before answering, anything else is returned.
+    """
+
+    def __init__(self, *outcomes, default='ok'):
+        self.outcomes = list(outcomes)
+        self.default = default
+        self.calls = 0
+        self.timeouts = []
+        self._lock = threading.Lock()
+
+    def __call__(self, timeout=None):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+            self.timeouts.append(timeout)
+            outcome = self.outcomes.pop(0) if self.outcomes else self.default
+        if isinstance(outcome, Exception):
+            raise outcome
+        if isinstance(outcome, (int, float)):
+            time.sleep(outcome)
+            return f'answer {call}'
+        return outcome
+
+
+def make_caller(max_attempts=4, breaker=None, **kwargs):
+    return ResilientCaller(retry_policy=RetryPolicy(max_attempts=max_attempts, base_delay=0),
+                           breaker=breaker or CircuitBreaker(failure_threshold=100),
+                           deadline=5.0, **kwargs)
+
+
+def test_retries_then_succeeds():
+    caller = make_caller()
+    fn = FakeCall(StubOverloadedError(), TimeoutError('read timed out'), 'summary')
+
+    assert caller.call(fn) == 'summary'
+
+    assert fn.calls == 3
+    assert caller.counters['retries'] == 2
+    assert caller.counters['successes'] == 1
+    # Every attempt is bounded by the time left before the deadline
+    assert all(0 < timeout <= 5.0 for timeout in fn.timeouts)
+
+
+def test_gives_up_after_max_attempts():
+    caller = make_caller(max_attempts=3)
+    fn = FakeCall(default=StubOverloadedError())
+
+    with pytest.raises(StubOverloadedError):
+        caller.call(fn)
+
+    assert fn.calls == 3
+    assert caller.counters['failures'] == 1
+
+
+def test_non_retryable_error_is_not_retried():
+    breaker = CircuitBreaker(failure_threshold=1)
+    caller = make_caller(breaker=breaker)
+    fn = FakeCall(BadRequestError('prompt too long'))
+
+    with pytest.raises(BadRequestError):
+        caller.call(fn)
+
+    assert fn.calls == 1
+    assert caller.counters['retries'] == 0
+    # The upstream answered, so its health is not in question
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_opens_and_recovers_through_half_open_probe():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    caller = make_caller(max_attempts=1, breaker=breaker)
+    fn = FakeCall(StubOverloadedError(), StubOverloadedError())
+
+    for _ in range(2):
+        with pytest.raises(StubOverloadedError):
+            caller.call(fn)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # Open: rejected without reaching the upstream
+    with pytest.raises(CircuitOpenError):
+        caller.call(fn)
+    assert fn.calls == 2
+
+    time.sleep(0.06)
+    # The first call after reset_timeout is the probe; its success closes the circuit
+    assert caller.call(fn) == 'ok'
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    caller = make_caller(max_attempts=1, breaker=breaker)
+    fn = FakeCall(StubOverloadedError(), StubOverloadedError())
+
+    with pytest.raises(StubOverloadedError):
+        caller.call(fn)
+    time.sleep(0.06)
+    with pytest.raises(StubOverloadedError):
+        caller.call(fn)
+
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        caller.call(fn)
+
+
+def test_half_open_lets_a_single_probe_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_hedged_call_returns_the_first_result():
+    caller = make_caller(hedge_percentile=50, hedge_min_samples=1)
+    caller.latency.add(0.02)
+    # The primary request stalls; the hedge fired after ~20 ms answers at once
+    fn = FakeCall(1.0, 0)
+
+    started = time.monotonic()
+    result = caller.call(fn)
+    elapsed = time.monotonic() - started
+
+    assert result == 'answer 2'
+    assert elapsed < 0.5
+    assert caller.counters['hedges_fired'] == 1
+    assert caller.counters['hedges_won'] == 1
+
+
+def test_fast_primary_fires_no_hedge():
+    caller = make_caller(hedge_percentile=50, hedge_min_samples=1)
+    caller.latency.add(0.5)
+    fn = FakeCall(0)
+
+    assert caller.call(fn) == 'answer 1'
+    assert fn.calls == 1
+    assert caller.counters['hedges_fired'] == 0
@@ -0,0 +1,147 @@
+"""
+SessionStore on a temporary SQLite database, including two stores sharing one file.
+
+Run from the repository root: python -m pytest tests
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.session_store import SessionStore, SQLiteBackend
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return tmp_path / 'sessions.sqlite3'
+
+
+def open_store(db_path, cache_size=128):
+    return SessionStore(SQLiteBackend(db_path), cache_size=cache_size)
+
+
+class Monitor:
+    """Stands in for an EngagementMonitor, which can't be serialised."""
+
+
+def test_round_trip_keeps_live_and_cache_keys_in_process(db_path):
+    store = open_store(db_path)
+    monitor = Monitor()
+    store['s1'] = {'lecture_name': 'Intro', 'transcript_data': [{'text': 'hi'}], 'monitor': monitor}
+    session = store['s1']
+    session['alignment'] = object()
+    session.update({'lecture_summary': {'title': 'Intro'}, 'data_version': 2})
+
+    assert session['monitor'] is monitor
+    assert set(session) == {'lecture_name', 'transcript_data', 'lecture_summary', 'data_version',
+                            'monitor', 'alignment'}
+
+    # A fresh process sees the durable fields only
+    other = open_store(db_path)
+    reopened = other['s1']
+    assert reopened['lecture_name'] == 'Intro'
+    assert reopened['transcript_data'] == [{'text': 'hi'}]
+    assert reopened['lecture_summary'] == {'title': 'Intro'}
+    assert 'monitor' not in reopened and 'alignment' not in reopened
+    assert set(store.backend.keys('s1')) == {'lecture_name', 'transcript_data', 'lecture_summary', 'data_version'}
+
+    del session['lecture_summary']
+    assert 'lecture_summary' not in other['s1']
+
+
+def test_spill_drops_decoded_fields_and_caches_but_not_live_objects(db_path):
+    store = open_store(db_path, cache_size=1)
+    monitor = Monitor()
+    store['s1'] = {'lecture_name': 'Intro', 'monitor': monitor}
+    store['s1']['alignment'] = object()
+
+    assert store.spill('s1')
+    session = store['s1']
+    assert 'alignment' not in session
+    assert session['monitor'] is monitor and session['lecture_name'] == 'Intro'
+
+    # The LRU keeps cache_size sessions decoded; live objects survive eviction
+    store['s2'] = {'lecture_name': 'Other'}
+    assert store.hot_session_ids() == ['s2']
+    assert store['s1']['monitor'] is monitor
+
+
+def test_reads_touch_the_database_at_most_once_per_interval(db_path, monkeypatch):
+    store = open_store(db_path)
+    store['s1'] = {'lecture_name': 'Intro'}
+    touches = []
+    monkeypatch.setattr(store.backend, 'touch', lambda session_id, when=None: touches.append(session_id))
+
+    for _ in range(5):
+        store['s1']
+    assert touches == ['s1']
+    assert store.idle_seconds('s1') < 1
+
+    store.TOUCH_INTERVAL = 0
+    store['s1']
+    assert touches == ['s1', 's1']
+
+
+def test_expired_uses_the_latest_of_write_and_read(db_path):
+    backend = SQLiteBackend(db_path)
+    for session_id in ('written', 'read', 'idle', 'old'):
+        backend.save(session_id, {'lecture_name': session_id})
+    now = time.time()
+    hour_ago = now - 3600
+    conn = backend._connect()
+    conn.execute('UPDATE sessions SET updated_at = ?, accessed_at = ?', (hour_ago, hour_ago))
+    conn.execute("UPDATE sessions SET updated_at = ? WHERE session_id = 'written'", (now,))
+    backend.touch('read', now)
+    conn.execute("UPDATE sessions SET created_at = ? WHERE session_id = 'old'", (now - 7 * 86400,))
+
+    idle = backend.expired(idle_before=now - 60, created_before=now - 86400)
+
+    assert sorted(idle) == ['idle', 'old']
+    # The absolute TTL applies however recently a session was used
+    backend.touch('old', now)
+    assert 'old' in backend.expired(idle_before=now - 60, created_before=now - 86400)
+
+
+def test_two_stores_on_one_file_see_each_others_writes(db_path):
+    first = open_store(db_path)
+    second = open_store(db_path)
+    first['s1'] = {'lecture_name': 'Intro'}
+
+    assert 's1' in second
+    cached = second['s1']
+    assert cached['lecture_name'] == 'Intro'
+    cached['llm_context'] = 'built from v1'
+
+    # A newer revision from the other process invalidates the decoded copy and caches
+    first['s1'].update({'lecture_name': 'Intro (edited)', 'data_version': 1})
+    reread = second['s1']
+    assert reread is cached
+    assert reread['lecture_name'] == 'Intro (edited)' and reread['data_version'] == 1
+    assert 'llm_context' not in reread
+
+    # Writes from the second process reach the first
+    second['s1']['user_report'] = {'title': 'Report'}
+    assert first['s1']['user_report'] == {'title': 'Report'}
+    assert sorted(first) == sorted(second) == ['s1']
+
+
+def test_session_deleted_by_another_store_is_forgotten(db_path):
+    owner = open_store(db_path)
+    other = open_store(db_path)
+    monitor = Monitor()
+    owner['s1'] = {'lecture_name': 'Intro', 'monitor': monitor}
+    owner['s1']
+
+    del other['s1']
+
+    with pytest.raises(KeyError):
+        owner['s1']
+    assert 's1' not in owner and len(owner) == 0
+    assert owner.hot_session_ids() == [] and owner.idle_seconds('s1') is None
+    # The monitor stays for the reaper to release
+    assert owner.live_session_ids() == ['s1']
+    assert owner.pop_live('s1') == {'monitor': monitor}
@@ -0,0 +1,127 @@
+"""
+Batched window trends against a per-window np.polyfit reference.
+
+Run from the repository root: python -m pytest tests
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.trend import window_slopes, window_trends
+from modules.utils import cal_trend
+
+
+def reference_slopes(values, starts, stops):
+    """Slope of every column over every window, fitted one at a time."""
+    slopes = np.full((len(starts), values.shape[1]), np.nan)
+    for w, (a, b) in enumerate(zip(starts, stops)):
+        rows = np.arange(a, b)
+        for c in range(values.shape[1]):
+            y = values[a:b, c]
+            finite = np.isfinite(y)
+            if finite.sum() >= 2:
+                slopes[w, c] = np.polyfit(rows[finite], y[finite], 1)[0]
+    return slopes
+
+
+def random_windows(rng, n_rows, n_windows, max_len=40):
+    starts = rng.integers(0, n_rows - 1, n_windows)
+    stops = np.minimum(starts + rng.integers(0, max_len, n_windows), n_rows)
+    return starts, stops
+
+
+def test_slopes_match_polyfit():
+    rng = np.random.default_rng(0)
+    values = rng.normal(50, 10, size=(1000, 4))
+    starts, stops = random_windows(rng, len(values), 300)
+
+    slopes, _, counts = window_slopes(values, starts, stops)
+
+    assert np.allclose(slopes, reference_slopes(values, starts, stops), equal_nan=True)
+    assert (counts == (stops - starts)[:, None]).all()
+
+
+def test_nan_gaps_are_left_out_of_the_fit():
+    rng = np.random.default_rng(1)
+    values = rng.normal(50, 10, size=(500, 3))
+    values[::5, 0] = np.nan
+    values[100:160, 1] = np.nan
+    values[7, 2] = np.inf
+    starts, stops = random_windows(rng, len(values), 200)
+
+    slopes, _, counts = window_slopes(values, starts, stops)
+
+    assert np.allclose(slopes, reference_slopes(values, starts, stops), equal_nan=True)
+    assert (counts == [np.isfinite(values[a:b]).sum(axis=0) for a, b in zip(starts, stops)]).all()
+    # A rising series with a gap is still rising, not pulled towards zero
+    gap = np.array([[10.0], [11.0], [np.nan], [np.nan], [14.0], [15.0]])
+    assert window_trends(gap, [0], [6], ['engaged'])[0]['Increasing'] == ['engaged']
+
+
+def test_short_windows_have_no_slope_or_t_statistic():
+    values = np.arange(10, dtype=np.float64)[:, None] * [1.0, -1.0]
+    values[3, 1] = np.nan
+
+    slopes, t_stats, counts = window_slopes(values, [0, 2, 2, 0], [1, 4, 5, 0])
+
+    # One sample, or none: no slope
+    assert np.isnan(slopes[0]).all() and np.isnan(slopes[3]).all()
+    # Two samples: a slope, but too few to estimate its error
+    assert slopes[1, 0] == 1.0 and np.isnan(t_stats[1, 0])
+    # The gap leaves the second column a single sample in rows 2..3
+    assert counts[1].tolist() == [2, 1] and np.isnan(slopes[1, 1])
+    assert counts[2].tolist() == [3, 2] and slopes[2, 1] == -1.0 and np.isnan(t_stats[2, 1])
+    trend = window_trends(values, [2], [4], ['concentrated', 'bored'])[0]
+    assert trend == {'Increasing': ['concentrated'], 'Decreasing': [], 'No trend': []}
+
+
+def test_flat_windows_are_exactly_zero():
+    # Large offsets far into a long recording stress the prefix-sum cancellation
+    values = np.full((100000, 2), 87.3)
+    values[:, 1] = 1e6
+    starts = np.array([0, 50000, 99990])
+    stops = starts + 10
+
+    slopes, t_stats, _ = window_slopes(values, starts, stops)
+
+    assert (slopes == 0.0).all()
+    assert (t_stats == 0.0).all()
+    assert window_trends(values, starts, stops, ['a', 'b'])[0]['No trend'] == ['a', 'b']
+
+
+def test_min_abs_t_gates_noisy_slopes():
+    rng = np.random.default_rng(2)
+    rows = np.arange(30, dtype=np.float64)
+    clear = 2.0 * rows + rng.normal(0, 0.5, 30)
+    noisy = 0.05 * rows + rng.normal(0, 5, 30)
+    values = np.column_stack([clear, noisy])
+
+    ungated = window_trends(values, [0], [30], ['clear', 'noisy'])[0]
+    gated = window_trends(values, [0], [30], ['clear', 'noisy'], min_abs_t=2.0)[0]
+
+    assert 'noisy' not in ungated['No trend']
+    assert gated['Increasing'] == ['clear']
+    assert gated['No trend'] == ['noisy']
+    # Too short to test: reported as no trend
+    assert window_trends(values, [0], [2], ['clear', 'noisy'], min_abs_t=2.0)[0]['No trend'] == ['clear', 'noisy']
+
+
+def test_cal_trend_labels_dataframe_columns():
+    chunk = pd.DataFrame({
+        'timestamp': ['t0', 't1', 't2', 't3'],
+        'lectureContent': ['a', 'b', 'c', 'd'],
+        'engaged': [10.0, 20.0, 30.0, 40.0],
+        'bored': [40.0, 30.0, 20.0, 10.0],
+        'confused': [5.0, 5.0, 5.0, 5.0],
+    })
+
+    assert cal_trend(chunk) == {
+        'Increasing': ['engaged'],
+        'Decreasing': ['bored'],
+        'No trend': ['confused'],
+    }
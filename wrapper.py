@@ -1,9 +1,10 @@
 # from engagement_monitor import main as eng_vid
 # from main import main as eng_vid
-from audiotranscription import audio_to_json
-from pose_question import pose_questions, parse_transcript
+from audiotranscription import audio_to_json, build_summary_prompt, SUMMARY_MODEL
+from pose_question import pose_questions, parse_transcript, QUESTION_PROMPT
 
 import os
+import sys
 import json
 import pandas as pd
 from anthropic import Anthropic
@@ -15,7 +16,13 @@ from modules.utils import (
     extract_json_from_claude_response,
     find_transcripts_for_period
 )
+from modules.batch import BatchRunner, make_custom_id
+from modules.engagement_store import EngagementArchive, read_engagement
 from datetime import datetime, timedelta
+from pathlib import Path
+
+TITLE_PROMPT = "Based on the transcript_data, can you generate me a short title of the lecture? The best output only, within 10 words please."
+QUESTION_SEGMENTS = 2
 
 def string_to_timestamp(ts_str: str) -> float:
     # Assuming ISO format; adjust if needed
@@ -31,8 +38,7 @@ def record_question(unique_sessions_file='output/questions.json',
 
     # Import sentiment recording - no webcam on my computer
     # emotion_data = face_data['engagement_timeline']
-    with open("data/engagement_Test1_2025-11-16_10-32-17.json", "r") as f:
-        engagement_data = json.load(f)
+    engagement_data = read_engagement("data/engagement_Test1_2025-11-16_10-32-17.json")
     metadata = engagement_data['metadata']
     emotion_data = engagement_data['engagement_timeline']
 
@@ -64,8 +70,7 @@ def record_question(unique_sessions_file='output/questions.json',
     with open(unique_sessions_file, 'w') as f:
         json.dump(unique_sessions, f, indent=2)
 
-    title_prompt = "Based on the transcript_data, can you generate me a short title of the lecture? The best output only, within 10 words please."
-    title_raw = send_message(client, message=title_prompt + str(transcript_data), max_tokens=100)
+    title_raw = send_message(client, message=TITLE_PROMPT + str(transcript_data), max_tokens=100)
 
     # Save to file
     os.makedirs('output', exist_ok=True)
@@ -74,5 +79,130 @@ def record_question(unique_sessions_file='output/questions.json',
                                         title=title_raw)
     
 
+def _load_lecture(lecture):
+    if Path(lecture['engagement_file']).suffix == '.npy':
+        # Columnar archive: hand pose_questions the memory-mapped columns directly
+        emotion_data = EngagementArchive(lecture['engagement_file']).columns()
+    else:
+        emotion_data = read_engagement(lecture['engagement_file'])['engagement_timeline']
+    with open(lecture['transcript_file'], 'r') as f:
+        transcript_data = json.load(f)
+    # audio_to_json returns a JSON string; saved copies may be double-encoded
+    if isinstance(transcript_data, str):
+        transcript_data = json.loads(transcript_data)
+    return emotion_data, transcript_data
+
+
+def _parsed_result(result):
+    """Parse the JSON payload of a batch result, or None if it failed."""
+    if not result or 'text' not in result:
+        return None
+    try:
+        return extract_json_from_claude_response(result['text'])
+    except json.JSONDecodeError:
+        return None
+
+
+def backfill_questions(lectures,
+                       checkpoint_file='output/backfill/checkpoint.json',
+                       output_dir='output/backfill',
+                       emotion_thresholds=None,
+                       poll_interval=30,
+                       retry_failed=True):
+    """
+    Generate MCQs for many recorded lectures through the Message Batches API.
+    
+    Instead of one synchronous request per segment, every summary, question
+    and title prompt across all lectures is submitted in batches (two rounds:
+    missing segment summaries first, since exceedance matching needs them,
+    then questions and titles). Progress is checkpointed, so re-running the
+    same call after an interruption resumes where it stopped.
+    
+    Args:
+        lectures: List of dicts with 'name', 'engagement_file' (engagement export: columnar .npy or legacy .json)
+                  and 'transcript_file' (audio_to_json output)
+        checkpoint_file: Batch checkpoint path
+        output_dir: Directory for <name>_questions.json and <name>_mcqData.js
+        emotion_thresholds: Emotion thresholds passed to pose_questions
+        poll_interval: Seconds between batch status polls
+        retry_failed: Resubmit requests that errored in a previous run
+        
+    Returns:
+        Dict lecture name -> mcq_data
+    """
+    client = init_anthropic_client()
+    runner = BatchRunner(client, checkpoint_file, poll_interval=poll_interval)
+    if retry_failed:
+        runner.forget_errors()
+    if emotion_thresholds is None:
+        emotion_thresholds = {"bored": 30, "confused": 30}
+
+    # Round 1: summaries for transcript segments that lack a parsed one
+    loaded = {}
+    for lecture in lectures:
+        emotion_data, transcript_data = _load_lecture(lecture)
+        loaded[lecture['name']] = (emotion_data, transcript_data)
+        for i, segment in enumerate(transcript_data):
+            summary = segment.get('summary')
+            if isinstance(summary, str):
+                summary = _parsed_result({'text': summary})
+                segment['summary'] = summary
+            if not isinstance(summary, dict):
+                runner.add(make_custom_id(lecture['name'], 'sum', i),
+                           build_summary_prompt(segment.get('text', '')),
+                           model=SUMMARY_MODEL, max_tokens=300)
+    results = runner.run()
+    for name, (emotion_data, transcript_data) in loaded.items():
+        for i, segment in enumerate(transcript_data):
+            if not isinstance(segment.get('summary'), dict):
+                summary = _parsed_result(results.get(make_custom_id(name, 'sum', i)))
+                if not isinstance(summary, dict):
+                    words = segment.get('text', '').split()
+                    summary = {"5_word_summary": " ".join(words[:5]), "20_word_summary": " ".join(words[:20])}
+                segment['summary'] = summary
+
+    # Round 2: questions for the segments around exceedances, plus a title per lecture
+    matched = {}
+    for name, (emotion_data, transcript_data) in loaded.items():
+        _, unique_sessions = pose_questions(
+            client=client,
+            data=emotion_data,
+            transcript_dict=transcript_data,
+            target=emotion_thresholds,
+            nos_entry_before=2,
+            generate_questions=False
+        )
+        matched[name] = unique_sessions
+        for j, content in enumerate(unique_sessions[:QUESTION_SEGMENTS]):
+            runner.add(make_custom_id(name, 'q', j), QUESTION_PROMPT + content.get("text", ""), max_tokens=1000)
+        runner.add(make_custom_id(name, 'title'), TITLE_PROMPT + str(transcript_data), max_tokens=100)
+    results = runner.run()
+
+    os.makedirs(output_dir, exist_ok=True)
+    all_mcq_data = {}
+    for name, unique_sessions in matched.items():
+        for j, content in enumerate(unique_sessions[:QUESTION_SEGMENTS]):
+            questions = _parsed_result(results.get(make_custom_id(name, 'q', j)))
+            if questions is not None:
+                content['questions'] = questions
+            else:
+                print(f"⚠️  No questions for {name} segment {content['start_time']}: {results.get(make_custom_id(name, 'q', j))}")
+        title = results.get(make_custom_id(name, 'title'), {}).get('text', name)
+
+        file_stem = make_custom_id(name)
+        questions_file = os.path.join(output_dir, f"{file_stem}_questions.json")
+        with open(questions_file, 'w') as f:
+            json.dump(unique_sessions, f, indent=2)
+        all_mcq_data[name] = convert_questions_to_mcq(input_file=questions_file,
+                                                      output_file=os.path.join(output_dir, f"{file_stem}_mcqData.js"),
+                                                      title=title.strip())
+    return all_mcq_data
+
+
 if __name__ == "__main__":
-    record_question()
\ No newline at end of file
+    if len(sys.argv) > 2 and sys.argv[1] == "--backfill":
+        # python wrapper.py --backfill lectures.json
+        with open(sys.argv[2], "r") as f:
+            backfill_questions(json.load(f))
+    else:
+        record_question()
\ No newline at end of file